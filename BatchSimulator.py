@@ -0,0 +1,252 @@
+from game_types import ALL_TILES, DOUBLE_SIX, NUMBER_OF_TILES
+import numpy as np
+import sys
+import time
+
+# Pips of each tile by index
+PIP_A = np.array([tile[0] for tile in ALL_TILES])
+PIP_B = np.array([tile[-1] for tile in ALL_TILES])
+PIP_SUM = PIP_A + PIP_B
+IS_DOUBLE = PIP_A == PIP_B
+
+# Bit of each tile in a hand bitmask, and the tiles containing each pip
+TILE_BIT = np.left_shift(np.int64(1), np.arange(NUMBER_OF_TILES, dtype=np.int64))
+PIP_TILES = np.array([TILE_BIT[(PIP_A == pip) | (PIP_B == pip)].sum() for pip in range(7)], dtype=np.int64)
+
+# Priority of each tile to start a round, unique (higher first): the reverse of its rank in the priority order used
+# by Match.deal, so that tiles with the same pips are ordered the same way (e.g. (3, 6) before (4, 5))
+PRIORITY = np.empty(NUMBER_OF_TILES, dtype=int)
+PRIORITY[[ALL_TILES.index(tile) for tile in DOUBLE_SIX.priority_order]] = np.arange(NUMBER_OF_TILES)[::-1]
+
+HAND_SIZE = 7
+
+# Policies: how a player picks among its legal moves
+POLICIES = ["random", "heaviest", "doubles"]
+
+
+def policy_scores(policy : str, rng : np.random.Generator, rows : int) -> np.ndarray:
+    """Score of every (tail, tile) move for a policy, the legal move with the highest score is played
+
+    Args:
+        policy (str): "random" (uniform over legal moves, like Player.move), "heaviest" (highest pip tile first)
+            or "doubles" (doubles first, then highest pips)
+        rng (np.random.Generator): Random generator for tie breaks
+        rows (int): Number of games
+
+    Returns:
+        np.ndarray: Scores of shape (rows, 2 * NUMBER_OF_TILES), tail 0 moves first
+    """
+    noise = rng.random((rows, 2 * NUMBER_OF_TILES))
+    if policy == "random":
+        return noise
+    if policy == "heaviest":
+        return np.tile(PIP_SUM, 2) + noise
+    if policy == "doubles":
+        return np.tile(PIP_SUM + 100 * IS_DOUBLE, 2) + noise
+    raise ValueError(f"Unknown policy {policy}")
+
+
+def lowest_bit_index(masks : np.ndarray) -> np.ndarray:
+    # Index of the lowest set bit of each (non-zero) mask
+    return np.log2(masks & -masks).astype(np.int64)
+
+
+def choose_moves(policy : str, rng : np.random.Generator, on_left : np.ndarray, on_right : np.ndarray) -> np.ndarray:
+    """Picks one legal move per game
+
+    Args:
+        policy (str): Policy name (see policy_scores)
+        rng (np.random.Generator): Random generator
+        on_left (np.ndarray): Bitmasks of tiles playable on the left
+        on_right (np.ndarray): Bitmasks of tiles playable on the right
+
+    Returns:
+        np.ndarray: Chosen move per game, the tile index plus NUMBER_OF_TILES when played on the right
+    """
+    moves = on_left | (on_right << NUMBER_OF_TILES)
+    if policy != "random":
+        scores = policy_scores(policy, rng, moves.size)
+        return np.argmax(np.where(expand_moves(moves), scores, -np.inf), axis=1)
+
+    # Uniform over legal moves: clear the k lowest set bits, for a random k below the number of moves
+    skip = (rng.random(moves.size) * np.bitwise_count(moves)).astype(np.int64)
+    while True:
+        clearing = skip > 0
+        if not clearing.any():
+            break
+        moves[clearing] &= moves[clearing] - 1
+        skip[clearing] -= 1
+    return lowest_bit_index(moves)
+
+
+def expand_moves(moves : np.ndarray) -> np.ndarray:
+    # Move bitmasks (left moves in the low bits, right moves in the high bits) to boolean arrays
+    return (moves[:, None] >> np.arange(2 * NUMBER_OF_TILES, dtype=np.int64)) & 1 != 0
+
+
+def simulate_rounds(rounds : int, policies : tuple[str, str] = ("random", "random"), seed : int | None = None) -> dict[str, np.ndarray]:
+    """Plays many rounds in lockstep with the same rules as Match.play
+
+    Every round's hands (as tile bitmasks), boneyard and board ends live in arrays, and each step
+    computes the legal moves of every unfinished round at once. Drawing a random tile from the
+    boneyard is the same as drawing the next tile of a shuffled deck, so each round is a random permutation.
+
+    Args:
+        rounds (int): Number of rounds
+        policies (tuple[str, str], optional): Policy of player 1 and player 2. Defaults to ("random", "random").
+        seed (int | None, optional): Random seed. Defaults to None.
+
+    Returns:
+        dict[str, np.ndarray]: Per round: "winner" (0 for player 1, 1 for player 2, -1 for a tie),
+            "points" (score earned by the winner), "first" (player who placed the starting tile),
+            "turns" (number of turns after the starting tile)
+    """
+    for policy in policies:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy}")
+    rng = np.random.default_rng(seed)
+    rows = np.arange(rounds)
+
+    # Deal: first 7 tiles of the deck to player 1, next 7 to player 2, the rest is the boneyard
+    # Deal again while a hand has 5 or more doubles
+    deck = np.argsort(rng.random((rounds, NUMBER_OF_TILES)), axis=1)
+    while True:
+        doubles = IS_DOUBLE[deck[:, :2 * HAND_SIZE]].reshape(rounds, 2, HAND_SIZE).sum(axis=2)
+        invalid = (doubles >= 5).any(axis=1)
+        if not invalid.any():
+            break
+        deck[invalid] = np.argsort(rng.random((invalid.sum(), NUMBER_OF_TILES)), axis=1)
+
+    hands = np.stack([
+        TILE_BIT[deck[:, :HAND_SIZE]].sum(axis=1),
+        TILE_BIT[deck[:, HAND_SIZE:2 * HAND_SIZE]].sum(axis=1),
+    ], axis=1)
+    next_draw = np.full(rounds, 2 * HAND_SIZE)
+
+    # The holder of the highest priority tile places it first
+    dealt = deck[:, :2 * HAND_SIZE]
+    best = np.argmax(PRIORITY[dealt], axis=1)
+    starting_tile = dealt[rows, best]
+    first = (best >= HAND_SIZE).astype(int)
+    hands[rows, first] &= ~TILE_BIT[starting_tile]
+    left = PIP_A[starting_tile].copy()
+    right = PIP_B[starting_tile].copy()
+
+    to_move = 1 - first
+    active = np.ones(rounds, dtype=bool)
+    turns = np.zeros(rounds, dtype=int)
+
+    def legal_moves(hand : np.ndarray, game : np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Tiles playable on the left and on the right, same as Player.possible_moves
+        on_left = hand & PIP_TILES[left[game]]
+        on_right = hand & PIP_TILES[right[game]] & np.where(left[game] != right[game], -1, 0)
+        return on_left, on_right
+
+    while active.any():
+        game = np.flatnonzero(active)
+        player = to_move[game]
+        hand = hands[game, player]
+        on_left, on_right = legal_moves(hand, game)
+        has_move = (on_left | on_right) != 0
+
+        # Players without a move draw until they can move or the boneyard is empty
+        drawing = np.flatnonzero(~has_move & (next_draw[game] < NUMBER_OF_TILES))
+        while drawing.size:
+            draw_game = game[drawing]
+            hand[drawing] |= TILE_BIT[deck[draw_game, next_draw[draw_game]]]
+            next_draw[draw_game] += 1
+            on_left[drawing], on_right[drawing] = legal_moves(hand[drawing], draw_game)
+            has_move[drawing] = (on_left[drawing] | on_right[drawing]) != 0
+            drawing = drawing[~has_move[drawing] & (next_draw[draw_game] < NUMBER_OF_TILES)]
+
+        # Each player picks a legal move according to their policy (players without a move pass)
+        playing = np.flatnonzero(has_move)
+        choice = np.empty(playing.size, dtype=np.int64)
+        for index in (0, 1):
+            own = np.flatnonzero(player[playing] == index)
+            if own.size:
+                choice[own] = choose_moves(policies[index], rng, on_left[playing[own]], on_right[playing[own]])
+
+        # Place the tiles
+        play_game = game[playing]
+        tile = choice % NUMBER_OF_TILES
+        placed_right = choice >= NUMBER_OF_TILES
+        hand[playing] &= ~TILE_BIT[tile]
+        end = np.where(placed_right, right[play_game], left[play_game])
+        new_end = np.where(PIP_A[tile] == end, PIP_B[tile], PIP_A[tile])
+        left[play_game] = np.where(placed_right, left[play_game], new_end)
+        right[play_game] = np.where(placed_right, new_end, right[play_game])
+        hands[game, player] = hand
+        turns[game] += 1
+
+        # Terminal: a hand is empty, or the boneyard is empty and nobody can move
+        other = hands[game, 1 - player]
+        empty_hand = (hand == 0) | (other == 0)
+        blocked = next_draw[game] >= NUMBER_OF_TILES
+        for check in (hand, other):
+            on_left, on_right = legal_moves(check, game)
+            blocked &= (on_left | on_right) == 0
+        active[game[empty_hand | blocked]] = False
+        to_move[game] = 1 - player
+
+    # Lowest hand wins the opponent's hand score
+    scores = (((hands[:, :, None] & TILE_BIT) != 0) * PIP_SUM).sum(axis=2)
+    winner = np.where(scores[:, 0] < scores[:, 1], 0, np.where(scores[:, 1] < scores[:, 0], 1, -1))
+    points = np.where(winner == 0, scores[:, 1], np.where(winner == 1, scores[:, 0], 0))
+    return {"winner": winner, "points": points, "first": first, "turns": turns}
+
+
+def summarize(results : dict[str, np.ndarray]) -> dict[str, float]:
+    # Win rates and mean points of a batch
+    winner = results["winner"]
+    return {
+        "p1_win_ratio": float(np.mean(winner == 0)),
+        "p2_win_ratio": float(np.mean(winner == 1)),
+        "tie_ratio": float(np.mean(winner == -1)),
+        "first_player_win_ratio": float(np.mean(winner == results["first"])),
+        "mean_points": float(np.mean(results["points"])),
+    }
+
+
+# Testing Section
+if __name__ == "__main__":
+    from Match import Match
+    from Player import Player
+    import random
+
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    reference_rounds = min(rounds, 20000)
+    print("------------------------")
+    print("Testing BatchSimulator (random vs random)")
+
+    start = time.perf_counter()
+    results = simulate_rounds(rounds, seed=0)
+    batch_time = time.perf_counter() - start
+    print(f"BatchSimulator: {rounds} rounds in {batch_time:.2f}s ({rounds / batch_time:.0f} rounds/s)")
+    print(summarize(results))
+
+    random.seed(0)
+    p1 = Player()
+    p2 = Player()
+    match = Match(p1, p2, False)
+    winners = []
+    points = []
+    start = time.perf_counter()
+    for _ in range(reference_rounds):
+        score_1, score_2 = p1.score, p2.score
+        result, _, _ = match.play()
+        winners.append(0 if result == p1.name else 1 if result == p2.name else -1)
+        points.append(p1.score - score_1 + p2.score - score_2)
+    match_time = time.perf_counter() - start
+    print(f"Match.play: {reference_rounds} rounds in {match_time:.2f}s ({reference_rounds / match_time:.0f} rounds/s)")
+    winners = np.array(winners)
+    print({
+        "p1_win_ratio": float(np.mean(winners == 0)),
+        "p2_win_ratio": float(np.mean(winners == 1)),
+        "tie_ratio": float(np.mean(winners == -1)),
+        "mean_points": float(np.mean(points)),
+    })
+
+    for policies in [("heaviest", "random"), ("doubles", "random"), ("heaviest", "doubles")]:
+        print(policies, summarize(simulate_rounds(rounds, policies, seed=1)))
+    print("------------------------")
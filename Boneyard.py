@@ -1,25 +1,33 @@
 import random 
-from game_types import Domino, Tail, Move
+from game_types import Domino, Tail, Move, DominoSet, DOUBLE_SIX, HAND_SIZE
 
 class Boneyard(): 
     """Class to represent the gamestate, boneyard, generate random hands, random tiles from a boneyard
     """
 
-    def __init__(self): 
-        self.boneyard : list[Domino] = [(0, 0), (0, 1), (0, 2), (0, 3), (0, 4), (0, 5), (0, 6), (1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6), (2, 2), (2, 3), (2, 4), (2, 5), (2, 6), (3, 3), (3, 4), (3, 5), (3, 6), (4, 4), (4, 5), (4, 6), (5, 5), (5, 6), (6, 6)]
+    def __init__(self, domino_set : DominoSet = DOUBLE_SIX): 
+        self.domino_set = domino_set
+        self.boneyard : list[Domino] = list(domino_set.tiles)
 
-    def generate_random_hand(self) -> list[Domino]:
-        """Generates random valid hand of 7 tiles and removes those tiles from the full boneyard of tiles
+    def generate_random_hand(self, hand_size : int = HAND_SIZE) -> list[Domino]:
+        """Generates random valid hand of hand_size tiles and removes those tiles from the full boneyard of tiles
+
+        Args:
+            hand_size (int, optional): Number of tiles in the hand. Defaults to 7.
 
         Returns:
-            [tuple]: Returns an array of tuples of size 7
+            [tuple]: Returns an array of tuples of size hand_size
         """
         hand : list[Domino] = []
-        for _ in range(7): 
-            random_tile = random.choice(self.boneyard)
-            self.boneyard.remove(random_tile)
-            hand.append(random_tile)
+        for _ in range(hand_size): 
+            hand.append(self.take_random_tile())
         return hand
+
+    def take_random_tile(self) -> Domino:
+        # Remove a random tile in O(1): it is swapped with the last tile, then popped
+        index = random.randrange(len(self.boneyard))
+        self.boneyard[index], self.boneyard[-1] = self.boneyard[-1], self.boneyard[index]
+        return self.boneyard.pop()
     
     def generate_random_tile(self): 
         """Generates a random tile from what is left in the boneyard
@@ -30,9 +38,7 @@ class Boneyard():
         if len(self.boneyard) == 0:
             print("Warning: Requested tile from an empty boneyard")
             return None
-        random_tile = random.choice(self.boneyard)
-        self.boneyard.remove(random_tile)
-        return random_tile
+        return self.take_random_tile()
 
     def print_boneyard_tiles(self): 
         """Prints the tiles in the boneyard
@@ -47,9 +53,16 @@ class Boneyard():
         """
         return len(self.boneyard) == 0 
     
+    def copy(self):
+        new_boneyard = Boneyard.__new__(Boneyard)
+        new_boneyard.domino_set = self.domino_set
+        # Copy of the tile list
+        new_boneyard.boneyard = self.boneyard.copy()
+        return new_boneyard
+
     def restart_boneyard(self):
         # Re-initialize Boneyard
-        self.__init__()
+        self.__init__(self.domino_set)
 
 # Testing Section   
 if __name__ == "__main__":
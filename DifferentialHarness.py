@@ -0,0 +1,266 @@
+from game_types import Domino, DominoSet, DOUBLE_SIX, HAND_SIZE, MatchEvent, RoundStarted, TilePlaced, Drew, Passed
+from Board import Board
+from Boneyard import Boneyard
+from Player import Player
+from MonteCarloPlayer import State
+from typing import Any, Callable, NamedTuple
+import math
+import random
+import sys
+
+
+class Implementation(NamedTuple):
+    # Classes (or factories) making up an engine, and the two agents playing the rounds
+    name : str
+    board : Callable = Board
+    boneyard : Callable = Boneyard
+    state : Callable = State
+    agents : tuple[Callable, Callable] = (Player, Player)
+
+
+# The engine as it is today
+REFERENCE = Implementation("reference")
+
+
+class Divergence(NamedTuple):
+    # First difference found between the reference and the candidate
+    seed : int
+    step : int
+    check : str
+    reference : Any
+    candidate : Any
+
+    def __str__(self) -> str:
+        return (f"Divergence in round seed {self.seed}, step {self.step}, {self.check}:\n"
+                f"  reference: {self.reference}\n  candidate: {self.candidate}")
+
+
+class Diverged(Exception):
+    # Raised by a check to stop the round at the first divergence
+    def __init__(self, divergence : Divergence):
+        super().__init__(str(divergence))
+        self.divergence = divergence
+
+
+class World():
+    # One implementation's copy of a round: board, boneyard and both agents
+    def __init__(self, implementation : Implementation, domino_set : DominoSet):
+        self.board = implementation.board()
+        self.boneyard = implementation.boneyard(domino_set)
+        self.agents = [factory() for factory in implementation.agents]
+        for index, agent in enumerate(self.agents):
+            # Same names in both worlds (the agents tell themselves apart from the opponent by name in the events)
+            agent.name = f"player_{index + 1}"
+            agent.set_domino_set(domino_set)
+        self.state_class = implementation.state
+
+    def publish(self, event : MatchEvent):
+        # Send an event to both agents, as the Match does
+        for agent in self.agents:
+            agent.observe(event)
+
+
+class DifferentialHarness():
+    """Class to check that an alternative (e.g. optimized) implementation behaves exactly like the reference
+
+    Seeded rounds are played with both implementations in lockstep. At every step the harness compares the hands
+    dealt, the legal moves, the state of the board, terminal detection and utility (State), the tiles drawn, the
+    move and value chosen by the agent, and the final scores. Every step that uses random numbers starts both
+    implementations from the same random state, and they must also consume the same random numbers. The first
+    divergence is reported with the seed of its round, which play_round replays.
+    """
+
+    def __init__(self, reference : Implementation, candidate : Implementation, domino_set : DominoSet = DOUBLE_SIX, hand_size : int = HAND_SIZE, value_tolerance : float = 1e-9):
+        """Init Function for the harness
+
+        Args:
+            reference (Implementation): Reference implementation
+            candidate (Implementation): Implementation checked against it
+            domino_set (DominoSet, optional): Domino set of the rounds. Defaults to DOUBLE_SIX.
+            hand_size (int, optional): Tiles dealt to each player. Defaults to 7.
+            value_tolerance (float, optional): Largest difference allowed between search values (agents' last_value). Defaults to 1e-9.
+        """
+        self.reference = reference
+        self.candidate = candidate
+        self.domino_set = domino_set
+        self.hand_size = hand_size
+        self.value_tolerance = value_tolerance
+
+        # Statistics
+        self.rounds = 0
+        self.steps = 0
+
+    def run(self, rounds : int, seed : int = 0) -> Divergence | None:
+        """Play seeded rounds until the first divergence
+
+        Args:
+            rounds (int): Number of rounds (seeds seed, seed + 1, ...)
+            seed (int, optional): Seed of the first round. Defaults to 0.
+
+        Returns:
+            Divergence | None: First divergence, or None if every round matched
+        """
+        for round_seed in range(seed, seed + rounds):
+            divergence = self.play_round(round_seed)
+            if divergence:
+                return divergence
+        return None
+
+    def play_round(self, seed : int) -> Divergence | None:
+        """Play one seeded round with both implementations in lockstep
+
+        Args:
+            seed (int): Seed of the round
+
+        Returns:
+            Divergence | None: First divergence in the round, or None
+        """
+        random.seed(seed)
+        self.seed = seed
+        self.step = 0
+        try:
+            self.lockstep_round(World(self.reference, self.domino_set), World(self.candidate, self.domino_set))
+        except Diverged as diverged:
+            return diverged.divergence
+        self.rounds += 1
+        return None
+
+    def compare(self, check : str, reference : Any, candidate : Any):
+        # Stop at the first difference
+        if isinstance(reference, float) or isinstance(candidate, float):
+            equal = reference is not None and candidate is not None and math.isclose(reference, candidate, rel_tol=0, abs_tol=self.value_tolerance)
+        else:
+            equal = reference == candidate
+        if not equal:
+            raise Diverged(Divergence(self.seed, self.step, check, reference, candidate))
+
+    def both(self, check : str, call : Callable[['World'], Any], worlds : tuple[World, World]) -> Any:
+        """Run a step that may use random numbers in both worlds, from the same random state
+
+        Args:
+            check (str): Name of the step
+            call (Callable[[World], Any]): The step, applied to a world
+            worlds (tuple[World, World]): Reference and candidate worlds
+
+        Returns:
+            Any: Result of the step (the same in both worlds)
+        """
+        start = random.getstate()
+        reference = call(worlds[0])
+        after = random.getstate()
+        random.setstate(start)
+        candidate = call(worlds[1])
+        self.compare(check, reference, candidate)
+        self.compare(f"{check} (random numbers used)", True, random.getstate() == after)
+        return reference
+
+    def lockstep_round(self, reference : World, candidate : World):
+        # Deal, then play until the round is over, comparing every step (same rules as Match.play_round)
+        worlds = (reference, candidate)
+
+        def deal(world : World) -> list[list[Domino]]:
+            # Deal until no hand holds 5 doubles or more (Match.valid_hands)
+            while True:
+                world.boneyard.restart_boneyard()
+                hands = [world.boneyard.generate_random_hand(self.hand_size) for _ in world.agents]
+                if all(sum(tile[0] == tile[-1] for tile in hand) < 5 for hand in hands):
+                    return hands
+        hands = self.both("deal", deal, worlds)
+        for world in worlds:
+            for agent, hand in zip(world.agents, hands):
+                agent.set_hand(list(hand))
+            world.publish(RoundStarted(("player_1", "player_2"), self.hand_size, len(world.boneyard.boneyard), self.domino_set.max_pip))
+        self.compare("boneyard after the deal", sorted(reference.boneyard.boneyard), sorted(candidate.boneyard.boneyard))
+
+        # The holder of the first tile in priority order places it
+        tile = next(tile for tile in self.domino_set.priority_order if tile in hands[0] or tile in hands[1])
+        mover = 0 if tile in hands[0] else 1
+        self.place(worlds, mover, (tile, 0))
+        mover = 1 - mover
+
+        while True:
+            self.step += 1
+            self.steps += 1
+            self.compare("board", reference.board.get_board_tiles(), candidate.board.get_board_tiles())
+            self.compare("tails", reference.board.get_tails(), candidate.board.get_tails())
+            self.compare("hands", [agent.get_hand() for agent in reference.agents], [agent.get_hand() for agent in candidate.agents])
+            states = [world.state_class(list(world.agents[mover].get_hand()), list(world.agents[1 - mover].get_hand()), world.boneyard, world.board, 0) for world in worlds]
+            self.compare("terminal", states[0].is_terminal(), states[1].is_terminal())
+            if states[0].is_terminal():
+                self.compare("utility", states[0].utility(), states[1].utility())
+                self.compare("scores", [agent.hand_score() for agent in reference.agents], [agent.hand_score() for agent in candidate.agents])
+                return
+            self.compare("possible actions", sorted(map(str, states[0].possible_actions())), sorted(map(str, states[1].possible_actions())))
+
+            moves = sorted(reference.agents[mover].possible_moves(reference.board))
+            self.compare("legal moves", moves, sorted(candidate.agents[mover].possible_moves(candidate.board)))
+            if moves:
+                move = self.both("chosen move", lambda world: world.agents[mover].move(world.board, len(world.boneyard.boneyard)), worlds)
+                self.compare("chosen move is legal", True, move in moves)
+                self.compare("search value", getattr(reference.agents[mover], "last_value", None), getattr(candidate.agents[mover], "last_value", None))
+                self.place(worlds, mover, move)
+            elif reference.boneyard.boneyard:
+                # Draw one tile per step, until the player can move
+                tails = reference.board.get_tails()
+                drawn = self.both("drawn tile", lambda world: world.boneyard.generate_random_tile(), worlds)
+                for world in worlds:
+                    world.agents[mover].add_hand(drawn)
+                    for index, agent in enumerate(world.agents):
+                        agent.observe(Drew(f"player_{mover + 1}", drawn if index == mover else None, tails, len(world.boneyard.boneyard)))
+                self.compare("boneyard", sorted(reference.boneyard.boneyard), sorted(candidate.boneyard.boneyard))
+                continue
+            else:
+                for world in worlds:
+                    world.publish(Passed(f"player_{mover + 1}", world.board.get_tails()))
+            mover = 1 - mover
+
+    def place(self, worlds : tuple[World, World], mover : int, move):
+        # Play a move in both worlds
+        for world in worlds:
+            world.board.add_to_board(move)
+            world.agents[mover].use_tile(move[0])
+            world.publish(TilePlaced(f"player_{mover + 1}", move[0], move[1]))
+
+
+if __name__ == "__main__":
+    # Usage: python DifferentialHarness.py [rounds]
+    # Testing Section
+    from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer
+    from MonteCarloPlayer import MonteCarloPlayer
+    from game_types import DOUBLE_NINE
+    from functools import partial
+    import time
+
+    class UnflippedBoard(Board):
+        # Deliberately wrong board: tiles played on the left end are stored the wrong way around
+        def append_tile(self, tail, tile):
+            if tail == 0 and not self.is_empty():
+                tile = (tile[-1], tile[0])
+            super().append_tile(tail, tile)
+
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    checks = [
+        ("Engine vs itself, random agents", REFERENCE, REFERENCE._replace(name="copy"), rounds, DOUBLE_SIX),
+        ("Engine vs itself, double-9", REFERENCE, REFERENCE._replace(name="copy"), rounds, DOUBLE_NINE),
+        ("ExpectiMinimax depth 5, node by node vs batched frontier",
+         REFERENCE._replace(agents=(partial(ExpectiMinimaxPlayer, depth=5, batch_leaves=False), Player)),
+         REFERENCE._replace(name="batched", agents=(partial(ExpectiMinimaxPlayer, depth=5), Player)), rounds // 10, DOUBLE_SIX),
+        ("MonteCarlo n=100, default vs explicit random rollouts",
+         REFERENCE._replace(agents=(partial(MonteCarloPlayer, n=100), Player)),
+         REFERENCE._replace(name="rollout", agents=(partial(MonteCarloPlayer, n=100, rollout="random"), Player)), rounds // 10, DOUBLE_SIX),
+        ("ExpectiMinimax depth 5, full vs sparse chance nodes (expected to diverge)",
+         REFERENCE._replace(agents=(partial(ExpectiMinimaxPlayer, depth=5), Player)),
+         REFERENCE._replace(name="sparse", agents=(partial(ExpectiMinimaxPlayer, depth=5, chance_samples=2), Player)), rounds // 10, DOUBLE_SIX),
+        ("Board with a bug (expected to diverge)", REFERENCE, REFERENCE._replace(name="unflipped", board=UnflippedBoard), rounds, DOUBLE_SIX),
+    ]
+    print("------------------------")
+    print("Testing DifferentialHarness Class")
+    for label, reference, candidate, check_rounds, domino_set in checks:
+        harness = DifferentialHarness(reference, candidate, domino_set)
+        start = time.perf_counter()
+        divergence = harness.run(check_rounds)
+        print(f"{label}: {harness.rounds} rounds, {harness.steps} steps checked in {time.perf_counter() - start:.2f}s")
+        if divergence:
+            print(divergence)
+            print(f"  replay: DifferentialHarness(...).play_round({divergence.seed})")
+    print("------------------------")
@@ -0,0 +1,387 @@
+from Evaluation import Evaluation
+from multiprocessing.connection import Listener, Client, Connection, wait
+from multiprocessing import AuthenticationError
+from collections import deque
+from time import perf_counter
+import os
+import queue
+import random
+import secrets
+import socket
+import sys
+import threading
+import time
+
+# Protocol: pickled messages over multiprocessing.connection (authenticated with a key shared by every host)
+#   worker -> coordinator: ("ready",) to ask for a batch, ("heartbeat",) while playing one, ("result", batch id, Evaluation)
+#   coordinator -> worker: ("batch", batch id, p1 factory, p2 factory, (score to win, domino set, hand size), games, seed),
+#                          ("done",) once the evaluation is over
+# The agent factories are pickled by reference, so every host must run the same version of the code
+
+# Shared key: set DOMINOES_AUTHKEY to the same secret on the coordinator and on every worker host. Messages are
+# pickles, so anyone holding the key can run code on the coordinator and the workers: it must stay secret
+LOOPBACK = ("127.0.0.1", "localhost", "::1")
+
+
+def authkey_for(address : tuple[str, int]) -> bytes:
+    """Key of the coordinator (or of the workers started from the same process)
+
+    Uses DOMINOES_AUTHKEY. Without it, a coordinator on this host only (loopback address) gets a random key for
+    the session, which worker processes started from this process inherit; any other address is refused.
+
+    Args:
+        address (tuple[str, int]): Address of the coordinator
+
+    Raises:
+        ValueError: If DOMINOES_AUTHKEY is not set and the address is not a loopback address
+
+    Returns:
+        bytes: The key
+    """
+    key = os.environ.get("DOMINOES_AUTHKEY")
+    if key:
+        return key.encode()
+    if address[0] not in LOOPBACK:
+        raise ValueError(f"Set DOMINOES_AUTHKEY to a secret shared by the coordinator and the workers to use {address[0]}")
+    key = secrets.token_hex(16)
+    os.environ["DOMINOES_AUTHKEY"] = key
+    print(f"DOMINOES_AUTHKEY is not set, using a random key for this session: DOMINOES_AUTHKEY={key}")
+    return key.encode()
+
+
+class DistributedEvaluation():
+    """Class to play the games of an evaluation on worker processes, on this host or any other
+
+    The games are split into batches of batch_games games, each with its own seed. Workers (see run_worker, any
+    number per host) connect to the coordinator, ask for a batch, play it and send back its Evaluation, which is
+    merged into the coordinator's evaluation. A worker that disconnects, or stops sending heartbeats for
+    lease_timeout seconds, loses its batch, which is handed to the next worker asking for one (a seeded batch
+    plays the same games wherever it is played). With no worker connected for idle_timeout seconds, the remaining
+    batches are played in this process.
+    """
+
+    def __init__(self, evaluation : Evaluation, address : tuple[str, int] = ("127.0.0.1", 6100), authkey : bytes | None = None, batch_games : int = 5, lease_timeout : float = 120.0, seed : int = 0,
+                 idle_timeout : float | None = 300.0):
+        """Init Function for the coordinator
+
+        Args:
+            evaluation (Evaluation): Evaluation receiving the games (its agents, score to win, domino set, hand size and sequential test are used)
+            address (tuple[str, int], optional): Address the coordinator listens on (the host's address on a private network to
+                accept other hosts). Defaults to ("127.0.0.1", 6100).
+            authkey (bytes | None, optional): Key shared with the workers. Defaults to authkey_for(address).
+            batch_games (int, optional): Games per batch. Defaults to 5.
+            lease_timeout (float, optional): Seconds without news from a worker playing a batch before the batch is handed to another worker. Defaults to 120.0.
+            seed (int, optional): Seed of the first batch (batch i is played with seed + i). Defaults to 0.
+            idle_timeout (float | None, optional): Seconds without any worker connected before the remaining batches are played
+                in this process (None to wait for workers forever). Defaults to 300.0.
+        """
+        self.evaluation = evaluation
+        self.address = address
+        self.authkey = authkey or authkey_for(address)
+        self.batch_games = batch_games
+        self.lease_timeout = lease_timeout
+        self.seed = seed
+        self.idle_timeout = idle_timeout
+
+        # Batches handed out so far (across calls to play), numbering the next ones
+        self.batches = 0
+        # Statistics: workers lost while playing a batch, batches handed out again, and batches played here
+        self.workers_lost = 0
+        self.batches_requeued = 0
+        self.batches_local = 0
+
+    def play(self, games : int) -> int:
+        """Play up to games more games on the workers (fewer if the sequential test gets decided)
+
+        Args:
+            games (int): Number of games to play
+
+        Returns:
+            int: Number of games played
+        """
+        start = perf_counter()
+        pending : deque[tuple[int, int, int]] = deque()
+        for first in range(0, games, self.batch_games):
+            pending.append((self.batches, min(self.batch_games, games - first), self.seed + self.batches))
+            self.batches += 1
+        remaining = {batch[0] for batch in pending}
+        played = 0
+
+        # Room in the backlog for every worker reconnecting at once, and for the connection of close_listener
+        listener = Listener(self.address, backlog=socket.SOMAXCONN, authkey=self.authkey)
+        closing = threading.Event()
+        connections = queue.Queue()
+        accepter = threading.Thread(target=self.accept, args=(listener, connections, closing), daemon=True)
+        accepter.start()
+        # Batch played by each connected worker (None when idle) and when it was last heard of
+        workers : dict[Connection, list] = {}
+        # Workers waiting for a batch
+        waiting : list[Connection] = []
+        # Since when no worker is connected
+        alone_since = perf_counter()
+
+        def lose(connection : Connection):
+            # A worker disconnected or missed its lease: its batch goes back to the front of the queue
+            batch = workers.pop(connection)[0]
+            if connection in waiting:
+                waiting.remove(connection)
+            connection.close()
+            if batch and batch[0] in remaining:
+                self.workers_lost += 1
+                self.batches_requeued += 1
+                pending.appendleft(batch)
+                if self.evaluation.verbose:
+                    print(f"Worker lost, batch {batch[0]} queued again")
+
+        try:
+            while remaining and not self.evaluation.decided():
+                while not connections.empty():
+                    workers[connections.get()] = [None, perf_counter()]
+                if workers:
+                    alone_since = None
+                elif alone_since is None:
+                    alone_since = perf_counter()
+                elif self.idle_timeout is not None and perf_counter() - alone_since > self.idle_timeout:
+                    # Every remaining batch is pending (the batches of lost workers are queued again)
+                    print(f"No worker connected for {self.idle_timeout:.0f}s, playing the remaining {len(remaining)} batches here")
+                    break
+
+                for connection in wait(list(workers), timeout=1):
+                    try:
+                        message = connection.recv()
+                    except (EOFError, OSError):
+                        lose(connection)
+                        continue
+                    workers[connection][1] = perf_counter()
+                    if message[0] == "ready":
+                        waiting.append(connection)
+                    elif message[0] == "result":
+                        _, batch_id, batch = message
+                        workers[connection][0] = None
+                        if batch_id in remaining:
+                            # The first result of a batch counts (a batch is only played again once its worker is lost)
+                            remaining.discard(batch_id)
+                            self.evaluation.merge(batch)
+                            played += batch.games
+                            if self.evaluation.verbose:
+                                print(f"Batch {batch_id} done ({batch.games} games), {played}/{games} games played")
+
+                now = perf_counter()
+                for connection, (batch, last_seen) in list(workers.items()):
+                    if batch and now - last_seen > self.lease_timeout:
+                        lose(connection)
+
+                while waiting and pending:
+                    connection = waiting.pop(0)
+                    batch = pending.popleft()
+                    batch_id, batch_games, seed = batch
+                    settings = (self.evaluation.score_to_win, self.evaluation.domino_set, self.evaluation.hand_size)
+                    try:
+                        connection.send(("batch", batch_id, self.evaluation.p1_class, self.evaluation.p2_class, settings, batch_games, seed))
+                    except OSError:
+                        pending.appendleft(batch)
+                        lose(connection)
+                        continue
+                    workers[connection] = [batch, perf_counter()]
+        finally:
+            for connection in workers:
+                try:
+                    connection.send(("done",))
+                except OSError:
+                    pass
+                connection.close()
+            self.close_listener(listener, closing, accepter)
+            # Workers that connected at the end find the coordinator gone
+            while not connections.empty():
+                connections.get().close()
+
+        while remaining and not self.evaluation.decided():
+            batch_id, batch_games, seed = pending.popleft()
+            remaining.discard(batch_id)
+            batch = play_batch(self.evaluation.p1_class, self.evaluation.p2_class, self.evaluation.score_to_win, self.evaluation.domino_set,
+                               self.evaluation.hand_size, batch_games, seed)
+            self.evaluation.merge(batch)
+            self.batches_local += 1
+            played += batch.games
+
+        self.evaluation.seconds += perf_counter() - start
+        return played
+
+    def accept(self, listener : Listener, connections : queue.Queue, closing : threading.Event):
+        # Accept the workers connecting (runs in a thread until the listener is closed)
+        while True:
+            try:
+                connection = listener.accept()
+            except (AuthenticationError, EOFError, ConnectionError):
+                # Wrong key (not one of our workers), or the connection made by close_listener
+                if closing.is_set():
+                    return
+                continue
+            except OSError:
+                return
+            if closing.is_set():
+                connection.close()
+                return
+            connections.put(connection)
+
+    def close_listener(self, listener : Listener, closing : threading.Event, accepter : threading.Thread):
+        # A thread blocked in accept is not woken by closing the listener: connect once (without answering
+        # the authentication challenge, so that this never waits for the thread) so that it returns
+        closing.set()
+        if accepter.is_alive():
+            host, port = self.address
+            try:
+                socket.create_connection(("127.0.0.1" if host in ("", "0.0.0.0") else host, port), timeout=1).close()
+            except OSError:
+                pass
+            accepter.join(timeout=1)
+        listener.close()
+
+
+def play_batch(p1_class, p2_class, score_to_win : int, domino_set, hand_size : int, games : int, seed : int) -> Evaluation:
+    """Play a seeded batch of games (the same games wherever it is played)
+
+    Args:
+        p1_class (type[Player]): Factory of player 1
+        p2_class (type[Player]): Factory of player 2
+        score_to_win (int): Points needed to win a game
+        domino_set (DominoSet): Domino set the games are played with
+        hand_size (int): Tiles dealt to each player
+        games (int): Number of games
+        seed (int): Seed of the batch
+
+    Returns:
+        Evaluation: Results of the batch
+    """
+    random.seed(seed)
+    evaluation = Evaluation(p1_class, p2_class, score_to_win, verbose=False, domino_set=domino_set, hand_size=hand_size)
+    evaluation.play(games)
+    return evaluation
+
+
+def run_worker(address : tuple[str, int], authkey : bytes, heartbeat_interval : float = 10.0, retry_interval : float = 1.0, idle_exit : float | None = None):
+    """Worker: play the batches handed out by coordinators, one evaluation after another
+
+    Each evaluation opens its own coordinator, so the worker connects again (retrying while there is none) after
+    an evaluation is over or the coordinator is lost.
+
+    Args:
+        address (tuple[str, int]): Address of the coordinator
+        authkey (bytes): Key shared with the coordinator
+        heartbeat_interval (float, optional): Seconds between heartbeats while playing a batch (keep it well below the coordinator's lease_timeout). Defaults to 10.0.
+        retry_interval (float, optional): Seconds between connection attempts. Defaults to 1.0.
+        idle_exit (float | None, optional): Stop after this many seconds without a coordinator (None to run until stopped). Defaults to None.
+    """
+    idle_since = perf_counter()
+    while True:
+        try:
+            connection = Client(address, authkey=authkey)
+        except OSError:
+            if idle_exit is not None and perf_counter() - idle_since > idle_exit:
+                return
+            time.sleep(retry_interval)
+            continue
+
+        # The heartbeat thread and the worker share the connection
+        lock = threading.Lock()
+        try:
+            while True:
+                with lock:
+                    connection.send(("ready",))
+                message = connection.recv()
+                if message[0] == "done":
+                    break
+                _, batch_id, p1_class, p2_class, (score_to_win, domino_set, hand_size), games, seed = message
+
+                stop = threading.Event()
+                def heartbeat():
+                    while not stop.wait(heartbeat_interval):
+                        try:
+                            with lock:
+                                connection.send(("heartbeat",))
+                        except OSError:
+                            return
+                beats = threading.Thread(target=heartbeat, daemon=True)
+                beats.start()
+                try:
+                    evaluation = play_batch(p1_class, p2_class, score_to_win, domino_set, hand_size, games, seed)
+                finally:
+                    stop.set()
+                    beats.join()
+                with lock:
+                    connection.send(("result", batch_id, evaluation))
+        except (EOFError, OSError):
+            # The coordinator is gone (evaluation over, or it gave up on this worker)
+            pass
+        finally:
+            connection.close()
+        idle_since = perf_counter()
+
+
+def start_workers(address : tuple[str, int], processes : int | None = None, **options) -> list:
+    """Start worker processes on this host
+
+    Args:
+        address (tuple[str, int]): Address of the coordinator
+        processes (int | None, optional): Number of workers. Defaults to the number of cores.
+        **options: Other arguments of run_worker (authkey defaults to authkey_for(address))
+
+    Returns:
+        list[multiprocessing.Process]: The worker processes (daemons)
+    """
+    import multiprocessing
+    options.setdefault("authkey", authkey_for(address))
+    workers = []
+    for _ in range(processes or os.cpu_count() or 1):
+        worker = multiprocessing.Process(target=run_worker, args=(address,), kwargs=options, daemon=True)
+        worker.start()
+        workers.append(worker)
+    return workers
+
+
+if __name__ == "__main__":
+    # Usage: python DistributedEvaluation.py worker HOST [PORT] [processes]
+    #        (set DOMINOES_AUTHKEY to the coordinator's key, see distributed_address in main.py)
+    # Without arguments, runs the testing section
+    if len(sys.argv) > 1 and sys.argv[1] == "worker":
+        address = (sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 6100)
+        if not os.environ.get("DOMINOES_AUTHKEY"):
+            sys.exit("Set DOMINOES_AUTHKEY to the key of the coordinator")
+        workers = start_workers(address, int(sys.argv[4]) if len(sys.argv) > 4 else None)
+        print(f"{len(workers)} workers playing for the coordinator at {address[0]}:{address[1]}")
+        for worker in workers:
+            worker.join()
+    else:
+        # Testing Section
+        from Player import Player
+        from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer
+        from functools import partial
+        import signal
+
+        print("------------------------")
+        print("Testing DistributedEvaluation Class (ExpectiMinimax depth 4 vs Random Player, 24 games to 100 points, batches of 2)")
+        address = ("127.0.0.1", 6100)
+        results = []
+        for scenario in ["workers", "lose workers", "no worker"]:
+            # Without workers, the batches are played here once idle_timeout is over
+            workers = start_workers(address, 3, heartbeat_interval=0.5) if scenario != "no worker" else []
+            evaluation = Evaluation(partial(ExpectiMinimaxPlayer, depth=4), Player, 100, verbose=False)
+            coordinator = DistributedEvaluation(evaluation, address, batch_games=2, lease_timeout=2.0, idle_timeout=2.0)
+            if scenario == "lose workers":
+                # One worker is killed and another one hangs while they play
+                def sabotage():
+                    time.sleep(1.0)
+                    workers[0].terminate()
+                    os.kill(workers[1].pid, signal.SIGSTOP)
+                threading.Thread(target=sabotage, daemon=True).start()
+            start = perf_counter()
+            coordinator.play(24)
+            print(f"{scenario}: workers lost: {coordinator.workers_lost}, batches queued again: {coordinator.batches_requeued}, batches played here: {coordinator.batches_local}, "
+                  f"{evaluation.games} games in {perf_counter() - start:.2f}s, ExpectiMinimax won {evaluation.p1_game}")
+            results.append((evaluation.games, evaluation.p1_game, evaluation.p1_match, evaluation.matches))
+            for worker in workers:
+                if worker.is_alive():
+                    os.kill(worker.pid, signal.SIGCONT)
+                    worker.terminate()
+        print(f"Same results in every scenario: {results[0] == results[1] == results[2]}")
+        print("------------------------")
@@ -0,0 +1,172 @@
+from game_types import Domino, ALL_TILES, DominoSet, DOUBLE_SIX
+
+
+# Bit index of every double-6 tile (in both orientations) for hand bitmasks
+TILE_INDEX : dict[Domino, int] = DOUBLE_SIX.index
+
+# Pip sum of each double-6 tile by bit index
+TILE_PIPS : list[int] = [tile[0] + tile[-1] for tile in ALL_TILES]
+
+
+class EndgameSolver():
+    """Exact solver for perfect-information endgames
+
+    Once the boneyard is empty and both hands are known (as in a determinization),
+    the rest of the round is a finite two-player game. The solver plays it out with
+    both players choosing their best moves and returns the utility of the player to move,
+    using the same scoring as MonteCarloPlayer.State.utility. Results are memoized on
+    (hands, open ends) and shared by every solver of the process, so repeated endgames
+    across rollouts, moves and agents are free.
+    """
+
+    # Solved positions of every domino set (by max pip), keyed by (mover mask, other mask, low end, high end)
+    memos : dict[int, dict[tuple[int, int, int, int], int]] = {}
+
+    def __init__(self, max_tiles : int = 8, tablebase = None, domino_set : DominoSet = DOUBLE_SIX):
+        """Init Function for the endgame solver
+
+        Args:
+            max_tiles (int, optional): Largest combined number of tiles in both hands that will be solved. Defaults to 8.
+            tablebase (Tablebase | None, optional): Precomputed values, looked up instead of searching
+                once few enough tiles are left (double-6 only). Defaults to None.
+            domino_set (DominoSet, optional): Domino set of the hands (bit i of a hand mask is domino_set.tiles[i]). Defaults to DOUBLE_SIX.
+        """
+        self.max_tiles = max_tiles
+        self.tablebase = tablebase if domino_set is DOUBLE_SIX else None
+        self.tiles = domino_set.tiles
+        self.tile_index = domino_set.index
+        self.tile_pips = [tile[0] + tile[-1] for tile in domino_set.tiles]
+        self.memo = self.memos.setdefault(domino_set.max_pip, {})
+
+    def qualifies(self, player_hand : list[Domino], opponent_hand : list[Domino], boneyard_size : int) -> bool:
+        """Check if a position can be solved exactly
+
+        Args:
+            player_hand (list[Domino]): Hand of the player to move
+            opponent_hand (list[Domino]): Hand of the other player
+            boneyard_size (int): Number of tiles in the boneyard
+
+        Returns:
+            bool: True if the boneyard is empty and the hands are small enough
+        """
+        return boneyard_size == 0 and len(player_hand) + len(opponent_hand) <= self.max_tiles
+
+    def solve(self, player_hand : list[Domino], opponent_hand : list[Domino], tails : tuple[int, int]) -> int:
+        """Game-theoretic utility of an endgame for the player to move
+
+        Args:
+            player_hand (list[Domino]): Hand of the player to move
+            opponent_hand (list[Domino]): Hand of the other player
+            tails (tuple[int, int]): Open ends of the (non-empty) board
+
+        Returns:
+            int: Opponent's hand score if the player to move wins, minus their own hand score if they lose, 0 on a tie
+        """
+        # Keep the memo bounded for long running agents
+        if len(self.memo) > 1000000:
+            self.memo.clear()
+
+        player_mask = 0
+        for tile in player_hand:
+            player_mask |= 1 << self.tile_index[tile]
+        opponent_mask = 0
+        for tile in opponent_hand:
+            opponent_mask |= 1 << self.tile_index[tile]
+
+        return self.negamax(player_mask, opponent_mask, tails[0], tails[-1])
+
+    def solve_state(self, state) -> int:
+        """Utility of a determinized MonteCarloPlayer State (player to move, boneyard empty)
+
+        Args:
+            state (State): Determinized state that qualifies for solving
+
+        Returns:
+            int: Game-theoretic utility for the state's player
+        """
+        return self.solve(state.player.hand, state.opponent.hand, state.board.get_tails())
+
+    def negamax(self, mover : int, other : int, left : int, right : int) -> int:
+        # The order of the ends does not matter
+        if left > right:
+            left, right = right, left
+        if self.tablebase and self.tablebase.covers((mover | other).bit_count()):
+            return self.tablebase.lookup_masks(mover, other, left, right)
+        key = (mover, other, left, right)
+        if key in self.memo:
+            return self.memo[key]
+
+        if mover == 0 or other == 0:
+            # A player has emptied their hand
+            value = self.utility(mover, other)
+        else:
+            best = None
+            for index in self.tile_indices(mover):
+                a, b = self.tiles[index]
+                # Resulting open ends for each end the tile can be placed on
+                # (placing on either of two equal ends gives the same position)
+                children = []
+                if a == left or b == left:
+                    children.append((b if a == left else a, right))
+                if right != left and (a == right or b == right):
+                    children.append((left, b if a == right else a))
+                for new_left, new_right in children:
+                    value = -self.negamax(other, mover & ~(1 << index), new_left, new_right)
+                    if best is None or value > best:
+                        best = value
+
+            if best is not None:
+                value = best
+            elif self.can_move(other, left, right):
+                # Pass, the opponent plays next
+                value = -self.negamax(other, mover, left, right)
+            else:
+                # Both players are blocked
+                value = self.utility(mover, other)
+
+        self.memo[key] = value
+        return value
+
+    def can_move(self, mask : int, left : int, right : int) -> bool:
+        # Check if any tile in the hand matches an open end
+        for index in self.tile_indices(mask):
+            a, b = self.tiles[index]
+            if a == left or b == left or a == right or b == right:
+                return True
+        return False
+
+    def utility(self, mover : int, other : int) -> int:
+        # Scoring from the point of view of the player to move
+        mover_score = sum(self.tile_pips[index] for index in self.tile_indices(mover))
+        other_score = sum(self.tile_pips[index] for index in self.tile_indices(other))
+        if mover_score < other_score:
+            return other_score
+        elif other_score < mover_score:
+            return -mover_score
+        else:
+            return 0
+
+    def tile_indices(self, mask : int) -> list[int]:
+        # Bit indices set in a hand mask
+        indices = []
+        while mask:
+            low_bit = mask & -mask
+            indices.append(low_bit.bit_length() - 1)
+            mask ^= low_bit
+        return indices
+
+
+# Testing Section
+if __name__ == "__main__":
+    print("------------------------")
+    print("Testing EndgameSolver Class")
+    solver = EndgameSolver()
+    # Player to move can go out with (3, 4) and collects the opponent's 12 pips
+    print(solver.solve([(3, 4)], [(6, 6)], (3, 5)))
+    # Player to move is blocked, the opponent goes out
+    print(solver.solve([(0, 0)], [(5, 6)], (5, 5)))
+    # Both blocked, lowest hand wins
+    print(solver.solve([(0, 1)], [(2, 2)], (5, 6)))
+    print(solver.solve([(1, 2), (2, 2), (4, 6)], [(2, 5), (0, 6), (1, 1)], (2, 6)))
+    print(f"Memoized positions: {len(solver.memo)}")
+    print("------------------------")
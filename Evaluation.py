@@ -0,0 +1,193 @@
+from Player import Player
+from Match import Match
+from SPRT import SPRT
+from LatencyRecorder import LatencyRecorder
+from Profiler import Profiler
+from GameRecord import GameRecordWriter
+from game_types import DominoSet, DOUBLE_SIX, HAND_SIZE
+from time import perf_counter
+
+
+class Evaluation():
+    """Class to play games to score_to_win points between two agents and collect statistics
+
+    Games can be played in several batches (play can be called repeatedly), so that
+    a scheduler can decide how many more games an agent configuration deserves.
+    """
+
+    def __init__(self, p1_class : type['Player'], p2_class : type['Player'], score_to_win : int = 200, sprt : SPRT | None = None, profiler : Profiler | None = None, recorder : GameRecordWriter | None = None, verbose : bool = True,
+                 domino_set : DominoSet = DOUBLE_SIX, hand_size : int = HAND_SIZE):
+        """Init Function for the evaluation
+
+        Args:
+            p1_class (type[Player]): Factory of the first agent (a new agent is created for every game)
+            p2_class (type[Player]): Factory of the second agent
+            score_to_win (int, optional): Points needed to win a game. Defaults to 200.
+            sprt (SPRT | None, optional): Sequential test stopping the evaluation once decided. Defaults to None.
+            profiler (Profiler | None, optional): Profiler of the agents and the engine, across all games. Defaults to None.
+            recorder (GameRecordWriter | None, optional): Binary log receiving every round played. Defaults to None.
+            verbose (bool, optional): Print every round and game result. Defaults to True.
+            domino_set (DominoSet, optional): Domino set the games are played with. Defaults to DOUBLE_SIX.
+            hand_size (int, optional): Tiles dealt to each player. Defaults to 7.
+        """
+        self.p1_class = p1_class
+        self.p2_class = p2_class
+        self.score_to_win = score_to_win
+        self.sprt = sprt
+        self.profiler = profiler
+        self.recorder = recorder
+        self.verbose = verbose
+        self.domino_set = domino_set
+        self.hand_size = hand_size
+
+        self.p1_name = None
+        self.p2_name = None
+        self.p1_match = 0
+        self.p2_match = 0
+        self.p1_game = 0
+        self.p2_game = 0
+        self.matches = 0
+        self.games = 0
+        # Move latencies (constant memory whatever the number of games)
+        self.latency_p1 = LatencyRecorder()
+        self.latency_p2 = LatencyRecorder()
+        # Wall clock time spent playing
+        self.seconds = 0.0
+
+    def decided(self) -> bool:
+        # Whether the sequential test (if any) has reached a decision
+        return bool(self.sprt and self.sprt.decision())
+
+    def play(self, games : int) -> int:
+        """Play up to games more games (fewer if the sequential test gets decided)
+
+        Args:
+            games (int): Number of games to play
+
+        Returns:
+            int: Number of games played
+        """
+        start = perf_counter()
+        played = 0
+        while played < games and not self.decided():
+            p1 = self.p1_class()
+            p2 = self.p2_class()
+            self.p1_name = p1.name
+            self.p2_name = p2.name
+            m = Match(p1, p2, False, self.profiler, self.recorder, self.domino_set, self.hand_size, self.score_to_win)
+            i = 1
+            if self.verbose:
+                print(f"\nGame #{self.games + 1}")
+            while not m.game_over():
+                self.matches += 1
+                if self.verbose:
+                    print(f"\nMatch #{i}")
+
+                result, _, _ = m.play()
+
+                if self.verbose:
+                    print(f"Result: {result}")
+                    m.boneyard.print_boneyard_tiles()
+                    print(f"{p1.name}: {m.player_1.hand}, Score: {m.player_1.score}")
+                    print(f"{p2.name}: {m.player_2.hand}, Score: {m.player_2.score}")
+                if result == p1.name:
+                    self.p1_match += 1
+                if result == p2.name:
+                    self.p2_match += 1
+                i += 1
+
+            self.latency_p1.merge(m.latency_1)
+            self.latency_p2.merge(m.latency_2)
+
+            self.games += 1
+            played += 1
+            if p1.score >= self.score_to_win:
+                self.p1_game += 1
+            else:
+                self.p2_game += 1
+            if self.verbose:
+                print()
+                print(f"{p1.name if p1.score >= self.score_to_win else p2.name} is the winner")
+
+            if self.sprt:
+                self.sprt.update(p1.score >= self.score_to_win)
+                if self.sprt.decision():
+                    print(f"\nSequential test decided after {self.games} games: {self.sprt.decision()}")
+
+        self.seconds += perf_counter() - start
+        return played
+
+    def merge(self, other : 'Evaluation'):
+        """Add the games of another evaluation of the same agents (e.g. a batch played by a distributed worker)
+
+        The sequential test, if any, is updated with the other evaluation's game results.
+
+        Args:
+            other (Evaluation): Evaluation to merge into this one
+        """
+        self.p1_name = other.p1_name
+        self.p2_name = other.p2_name
+        self.p1_match += other.p1_match
+        self.p2_match += other.p2_match
+        self.p1_game += other.p1_game
+        self.p2_game += other.p2_game
+        self.matches += other.matches
+        self.games += other.games
+        self.latency_p1.merge(other.latency_p1)
+        self.latency_p2.merge(other.latency_p2)
+        if self.sprt:
+            for p1_won in [True] * other.p1_game + [False] * other.p2_game:
+                self.sprt.update(p1_won)
+
+    def print_stats(self):
+        # Print the statistics of the games played so far
+        p1_name, p2_name = self.p1_name, self.p2_name
+
+        print("\n Match Stats")
+        print(f"{p1_name} Match Winning Ratio: {self.p1_match / self.matches} after playing {self.matches} matches")
+        print(f"{p2_name} Match Winning Ratio: {self.p2_match / self.matches} after playing {self.matches} matches")
+
+        print("\n Game Stats")
+        print(f"{p1_name} Game Winning Ratio: {self.p1_game / self.games} after playing {self.games} games")
+        print(f"{p2_name} Game Winning Ratio: {self.p2_game / self.games} after playing {self.games} games")
+
+        print("\n Move Time Stats")
+        for name, latency in ((p1_name, self.latency_p1), (p2_name, self.latency_p2)):
+            t = latency.total.stats()
+            print(f"{name} Move Time: Mean = {t['mean']}s, Std = {t['std']}s, Max = {t['max']}s, Min = {t['min']}s")
+            print(f"{name} Move Time Percentiles: p50 = {t['p50']:.6f}s, p90 = {t['p90']:.6f}s, p99 = {t['p99']:.6f}s, p99.9 = {t['p99.9']:.6f}s")
+            for phase, histogram in latency.phases.items():
+                if histogram.count:
+                    print(f"  {phase}: {histogram.count} moves, p50 = {histogram.percentile(0.5):.6f}s, p99 = {histogram.percentile(0.99):.6f}s, Max = {histogram.max:.6f}s")
+
+        if self.sprt:
+            ci_low, ci_high = self.sprt.confidence_interval()
+            print(f"\n Sequential Test: {self.sprt.decision() or 'undecided'} after {self.games} games, {p1_name} game win ratio 95% CI = [{ci_low:.3f}, {ci_high:.3f}]")
+
+    def stats(self) -> dict:
+        """Statistics of the games played so far
+
+        Returns:
+            dict: Win ratios, move time statistics (overall and per phase of the round) and number of matches and games played
+        """
+        stats = {
+            "p1_match_win_ratio": self.p1_match / self.matches,
+            "p2_match_win_ratio": self.p2_match / self.matches,
+            "p1_game_win_ratio": self.p1_game / self.games,
+            "p2_game_win_ratio": self.p2_game / self.games,
+        }
+        for player, latency in (("p1", self.latency_p1), ("p2", self.latency_p2)):
+            latency_stats = latency.stats()
+            for field in ["mean", "std", "max", "min", "p50", "p90", "p99", "p99.9"]:
+                stats[f"{player}_move_time_{field}"] = latency_stats[field]
+            stats[f"{player}_move_time_phases"] = latency_stats["phases"]
+        stats["matches_played"] = self.matches
+        stats["games_played"] = self.games
+
+        if self.sprt:
+            ci_low, ci_high = self.sprt.confidence_interval()
+            stats["sprt_decision"] = self.sprt.decision() or "undecided"
+            stats["p1_game_win_ratio_ci_low"] = ci_low
+            stats["p1_game_win_ratio_ci_high"] = ci_high
+
+        return stats
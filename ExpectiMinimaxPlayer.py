@@ -1,7 +1,38 @@
 from Player import Player
 from Board import Board 
-from game_types import Domino, NUMBER_OF_TILES, ALL_TILES, Move
+from EndgameSolver import EndgameSolver
+from Tablebase import Tablebase
+from PositionCache import PositionCache, position_key
+from OpeningBook import OpeningBook
+from Ponderer import Ponderer
+from functools import partial
+from game_types import Domino, Move, DominoSet, DOUBLE_SIX
 import math
+import random
+
+# NumPy is only needed to evaluate the search frontier in batch; it is imported on first use
+numpy = None
+
+# Exact endgame results are mapped to +/-(EXACT_VALUE + margin), above any value of the evaluation function, so that
+# a solved win (loss) always ranks above (below) a heuristic estimate, and solved results keep their order by margin
+EXACT_VALUE = 10000
+
+
+def load_numpy():
+    """Imports NumPy on first use
+
+    Returns:
+        module | None: The numpy module, or None if it is not installed (the frontier is then searched node by node)
+    """
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as np
+        except ImportError:
+            np = False
+        numpy = np
+    return numpy or None
+
 
 class ExpectiMinimaxPlayer(Player): 
     """Expectiminimax Player
@@ -10,15 +41,78 @@ class ExpectiMinimaxPlayer(Player):
         Player (Player): Inherits from the generic Player class
     """
     
-    def __init__(self, name: str = "ExpectiMinimax", depth: int = 4):
+    def __init__(self, name: str = "ExpectiMinimax", depth: int = 4, move_ordering: bool = True, transposition_table: bool = True, endgame_tiles: int = 0, tablebase: str | None = None, cache: str | None = None, opening_book: str | None = None, ponder: bool = False, chance_samples: int = 0, chance_sampling: str = "ranked", chance_variance: float = 0, batch_leaves: bool = True):
         """Init Function for the Expectiminimax player
 
         Args:
             name (str, optional): _description_. Defaults to "ExpectiMinimax".
             depth (int, optional): Depth of search. Defaults to 4. !! HIGHER DEPTHS SLOW DOWN EXECUTION SIGNIFICANTLY!!
+            move_ordering (bool, optional): Search the most promising moves first so that max nodes below a min node are cut off sooner. Defaults to True.
+            transposition_table (bool, optional): Reuse the value of max nodes already searched during the current move
+                (e.g. the same position is reached through every tile the opponent cannot play). Defaults to True.
+            endgame_tiles (int, optional): When the boneyard is empty the opponent's hand is known, so leaves with at most this many
+                tiles left in both hands are solved exactly instead of using eval (0 disables it). Defaults to 0.
+            tablebase (str | None, optional): Endgame tablebase file used by the solver for the smallest endgames (see Tablebase.py). Defaults to None.
+            cache (str | None, optional): Persistent position cache file (see PositionCache.py). Positions already searched with the same
+                configuration, in this or an earlier run, are answered without searching. Defaults to None.
+            opening_book (str | None, optional): Opening book file (see OpeningBook.py). Book positions are answered without searching. Defaults to None.
+            ponder (bool, optional): Search the positions that can follow the opponent's reply in a background process
+                during the opponent's turn (see Ponderer.py). Defaults to False.
+            chance_samples (int, optional): Number of opponent tiles the opponent can play that are searched per chance node, the
+                others being estimated from them (0 searches every tile). Defaults to 0.
+            chance_sampling (str, optional): How those tiles are chosen: "ranked" (most likely first, then the doubles and
+                heaviest tiles the opponent would rather play) or "random". Defaults to "ranked".
+            chance_variance (float, optional): When above 0, more tiles are searched (doubling their number) until the variance
+                of the chance node estimate falls below it. Defaults to 0.
+            batch_leaves (bool, optional): Evaluate the last two plies below a chance node (every opponent tile and end, then every
+                reply) at once with NumPy arrays instead of node by node, from depth 5. Same values, ignored if NumPy is not installed. Defaults to True.
         """
+        if chance_sampling not in ("ranked", "random"):
+            raise ValueError(f"Unknown chance sampling {chance_sampling}, expected ranked or random")
         super().__init__(name)
         self.depth = depth
+        self.move_ordering = move_ordering
+        self.use_transposition_table = transposition_table
+        self.endgame_tiles = endgame_tiles
+        self.tablebase = Tablebase.open(tablebase) if tablebase else None
+        self.endgame_solver = EndgameSolver(endgame_tiles, self.tablebase) if endgame_tiles > 0 else None
+        self.position_cache = PositionCache.open(cache) if cache else None
+        self.opening_book = OpeningBook.open(opening_book) if opening_book else None
+        self.chance_samples = chance_samples
+        self.chance_sampling = chance_sampling
+        self.chance_variance = chance_variance
+        # The batch mirrors eval, so it is only used with this class's evaluation function, and only from depth 5:
+        # shallower searches take a few milliseconds, less than importing NumPy in a new process
+        self.batch_leaves = batch_leaves and depth >= 5 and type(self).eval is ExpectiMinimaxPlayer.eval
+        # Cached values are only valid for the same search configuration
+        self.cache_namespace = f"ExpectiMinimax(depth={depth},endgame_tiles={endgame_tiles}" + (
+            f",chance_samples={chance_samples},chance_sampling={chance_sampling},chance_variance={chance_variance})" if chance_samples else ")")
+        self.base_namespace = self.cache_namespace
+        self.ponderer = Ponderer(partial(ExpectiMinimaxPlayer, name, depth, move_ordering, transposition_table, endgame_tiles, tablebase, cache, opening_book,
+                                         chance_samples=chance_samples, chance_sampling=chance_sampling, chance_variance=chance_variance, batch_leaves=batch_leaves), self.cache_namespace) if ponder else None
+
+        # Search statistics (value of the last move and number of max, chance and min nodes visited to find it)
+        self.last_value = None
+        self.nodes_searched = 0
+
+        # Max node values of the current move, keyed by position and remaining depth
+        # Entries are (value, is_lower_bound) since a cutoff only proves a lower bound
+        self.transpositions : dict[tuple, tuple[float, bool]] = {}
+
+        # Move ordering tables
+        # Best move previously found for a position, keyed by (tails, hand)
+        self.best_moves : dict[tuple, Move] = {}
+        # Moves that caused a cutoff, two per remaining depth
+        self.killer_moves : dict[int, list[Move]] = {}
+        # Accumulated cutoff/best-move credit, keyed by (tile, pip of the end it was played on)
+        self.history : dict[tuple[Domino, int], int] = {}
+
+    def set_domino_set(self, domino_set: DominoSet):
+        # Play with another domino set: the endgame solver and the cached values depend on it
+        super().set_domino_set(domino_set)
+        if self.endgame_solver:
+            self.endgame_solver = EndgameSolver(self.endgame_tiles, self.tablebase, domino_set)
+        self.cache_namespace = self.base_namespace if domino_set is DOUBLE_SIX else f"{self.base_namespace}[{domino_set.name}]"
 
     def obtain_opponent_tile_probabilities(self, board: Board) -> list[tuple[Domino, float]]: 
         """Obtains the opponent tile probabilities based on the number of tiles that we have, number of tiles on the baord, and number of tiles in the boneyard. 
@@ -27,23 +121,32 @@ class ExpectiMinimaxPlayer(Player):
             board (Board): takes the current state of the board as a parameter
 
         Returns:
-            list[tuple[Domino, float]]: Returns a uniform probability distribution of each possible tile and the probability of the opponent having that tile
+            list[tuple[Domino, float]]: Returns a uniform probability distribution of each possible tile and the probability of the opponent having that tile.
+            Tiles excluded by the opponent's observed voids are left out.
         """
         board_tiles = board.get_board_tiles()
         player_hand = self.get_hand()
-        tiles_left = NUMBER_OF_TILES - (len(board_tiles) + len(player_hand))
-        tile_probabilities = []
+        tiles_left = self.domino_set.number_of_tiles - (len(board_tiles) + len(player_hand))
         # If there are no tiles left - end game scenario
         if tiles_left <= 0:
             return []
-        # Iterate through all possible tiles
-        for tile in ALL_TILES: 
-            # If tile is not in the ExpectiMinimax player's hand nor on the observable board, add it to the tile_probabilities array 
-            # with a probability of 1 / number of tiles left
-            tile_flip = (tile[-1], tile[0])
-            if (tile not in board_tiles and tile not in player_hand and tile_flip not in board_tiles and tile_flip not in player_hand): 
-                tile_probabilities.append((tile, 1/tiles_left))
-        return tile_probabilities
+        # Tiles that are neither in the ExpectiMinimax player's hand nor on the observable board,
+        # kept up to date by the match events (rescanned if the round was not followed)
+        unseen_tiles = self.opponent_model.unseen_tiles(board_tiles)
+        if unseen_tiles is None:
+            unseen_tiles = []
+            for tile in self.domino_set.tiles: 
+                tile_flip = (tile[-1], tile[0])
+                if (tile not in board_tiles and tile not in player_hand and tile_flip not in board_tiles and tile_flip not in player_hand): 
+                    unseen_tiles.append(tile)
+
+        # Tiles containing a pip the opponent is known to be void in cannot be in their hand
+        candidate_tiles = self.opponent_model.possible_tiles(unseen_tiles)
+        if not candidate_tiles:
+            candidate_tiles = unseen_tiles
+
+        # Uniform probability over the remaining candidates
+        return [(tile, 1/len(candidate_tiles)) for tile in candidate_tiles]
     
     def eval(self, board: Board, boneyard_size: int, hand: list[Domino]):
         """Evaluation function to capture score of the current game as it stands
@@ -58,7 +161,7 @@ class ExpectiMinimaxPlayer(Player):
         """
         player_tiles = hand
         ## Metric #1: Number of tiles the opponent has compared to the number of tiles that the player has (Highest weighted metric) 
-        opp_tile_count = NUMBER_OF_TILES - (boneyard_size + len(player_tiles) + len(board.get_board_tiles()))
+        opp_tile_count = self.domino_set.number_of_tiles - (boneyard_size + len(player_tiles) + len(board.get_board_tiles()))
         tile_count_score = (opp_tile_count - len(player_tiles))
         ## Metrix #2: Pip score captures the negative sum of the tile values in ExpectiMiniMax Player's hand. Lower tiles are preferable
         pip_score = -sum(a+b for (a,b) in player_tiles)
@@ -66,6 +169,37 @@ class ExpectiMinimaxPlayer(Player):
         mobility = len(self.possible_moves(board, player_tiles))
         return pip_score + 2*mobility + 5*tile_count_score
 
+    def leaf_value(self, board: Board, boneyard_size: int, hand: list[Domino], opponent_to_move: bool = False):
+        """Value of a leaf of the search: the exact endgame utility (mapped onto the scale of the evaluation function, see
+        EXACT_VALUE) when the endgame solver is enabled and the position qualifies, otherwise the evaluation function
+
+        Args:
+            board (Board): Current state of the board
+            boneyard_size (int): number of tiles of the boneyard
+            hand (list[Domino]): ExpectiMiniMax Player's hand
+            opponent_to_move (bool, optional): True if the leaf is reached on the opponent's turn. Defaults to False.
+
+        Returns:
+            int: Leaf score
+        """
+        if self.endgame_solver and boneyard_size == 0 and not board.is_empty():
+            # With an empty boneyard every unseen tile is in the opponent's hand
+            board_tiles = board.get_board_tiles()
+            opponent_hand = self.opponent_model.unseen_tiles(board_tiles)
+            if opponent_hand is None:
+                opponent_hand = [
+                    tile for tile in self.domino_set.tiles
+                    if tile not in hand and (tile[-1], tile[0]) not in hand and tile not in board_tiles and (tile[-1], tile[0]) not in board_tiles
+                ]
+            if self.endgame_solver.qualifies(hand, opponent_hand, boneyard_size):
+                if opponent_to_move:
+                    margin = -self.endgame_solver.solve(opponent_hand, hand, board.get_tails())
+                else:
+                    margin = self.endgame_solver.solve(hand, opponent_hand, board.get_tails())
+                # A tie stays 0
+                return ((margin > 0) - (margin < 0)) * EXACT_VALUE + margin
+        return self.eval(board, boneyard_size, hand)
+
     def possible_moves(self, board: Board, hand: list[Domino] | None = None) -> list[Move]:
         """Obtains all the possible moves for the ExpectiMiniMax player specifically. 
         Captures the hypothetical possible moves given the state of a hand and board. 
@@ -110,7 +244,7 @@ class ExpectiMinimaxPlayer(Player):
         if len(hand) == 0:
             # A state is terminal if the hand of the player is empty
             return True
-        elif (NUMBER_OF_TILES - (len(hand) + boneyard_size + len(board.get_board_tiles()))) == 0:
+        elif (self.domino_set.number_of_tiles - (len(hand) + boneyard_size + len(board.get_board_tiles()))) == 0:
             # A state is terminal if the hand of the opponent is empty
             return True
         else:
@@ -127,11 +261,103 @@ class ExpectiMinimaxPlayer(Player):
         Returns:
             Move | None: Returns an optimal move
         """
+        action = self.search_move(board, boneyard_size)
+        if self.ponderer and action:
+            # Search the likely next positions while the opponent thinks
+            self.ponderer.ponder(self, board, boneyard_size, action)
+        return action
+
+    def search_move(self, board: Board, boneyard_size: int) -> Move | None:
+        # Choose a move (see move)
+        # A new round starts with fresh move ordering tables
+        # (the best move table is kept within a round so that positions searched
+        # deeper in the previous move are tried in the right order)
+        if len(board.get_board_tiles()) <= 1 or len(self.best_moves) > 100000:
+            self.best_moves = {}
+            self.history = {}
+        self.killer_moves = {}
+        self.transpositions = {}
+        self.nodes_searched = 0
+
+        # Positions searched while the opponent was thinking are answered at once
+        # (not while drawing: with no legal move there is nothing to search)
+        if self.ponderer and self.possible_moves(board):
+            answer = self.ponderer.lookup(self, board, boneyard_size)
+            if answer:
+                self.last_value = answer[1]
+                return answer[0]
+
+        # Book positions (searched offline, without any known opponent voids) are answered from the book
+        if self.opening_book and not self.opponent_model.voids and self.domino_set is DOUBLE_SIX:
+            entry = self.opening_book.lookup(self.get_hand(), board, boneyard_size)
+            if entry and self.is_legal(board, entry[0]):
+                self.last_value = entry[1]
+                return entry[0]
+
+        # Positions searched before are answered from the cache
+        if self.position_cache:
+            key = position_key(self.get_hand(), board, boneyard_size, self.opponent_model.voids, self.cache_namespace)
+            entry = self.position_cache.get(key)
+            if entry:
+                self.last_value = entry[0]
+                return entry[1]
+
         # Calls the max node (Player's search node) to obtain optimal move
-        _, action = self.max_node(board, boneyard_size, depth=self.depth, hand=self.get_hand().copy())
+        value, action = self.max_node(board, boneyard_size, depth=self.depth, hand=self.get_hand().copy())
+        self.last_value = value
+
+        if self.position_cache:
+            self.position_cache.put(key, value, action)
         return action
 
-    def max_node(self, board: Board, boneyard_size: int, depth: int, hand: list[Domino]):
+    def order_moves(self, board: Board, hand: list[Domino], moves: list[Move], depth: int) -> list[Move]:
+        """Sorts moves so that the most promising ones are searched first:
+        the best move previously found for this position, then the killer moves for this depth,
+        then by history score, and finally doubles and high-pip tiles first
+
+        Args:
+            board (Board): Current state of the board
+            hand (list[Domino]): Current state of our hand
+            moves (list[Move]): Legal moves to order
+            depth (int): Remaining depth of search
+
+        Returns:
+            list[Move]: Moves in search order
+        """
+        best_move = self.best_moves.get((board.get_tails(), frozenset(hand)))
+        killers = self.killer_moves.get(depth, [])
+
+        def score(action: Move):
+            tile = action[0]
+            return (
+                action == best_move,
+                action in killers,
+                self.history.get((tile, board.get_tails(action[-1])), 0),
+                tile[0] == tile[-1],
+                tile[0] + tile[-1],
+            )
+
+        return sorted(moves, key=score, reverse=True)
+
+    def record_good_move(self, board: Board, action: Move, depth: int, cutoff: bool):
+        """Updates the move ordering tables with a move that was best or caused a cutoff
+
+        Args:
+            board (Board): Board before the move was played
+            action (Move): The move
+            depth (int): Remaining depth of search
+            cutoff (bool): True if the move caused a cutoff (it is then also kept as a killer move)
+        """
+        key = (action[0], board.get_tails(action[-1]))
+        self.history[key] = self.history.get(key, 0) + depth * depth
+
+        if cutoff:
+            killers = self.killer_moves.setdefault(depth, [])
+            if action not in killers:
+                killers.insert(0, action)
+                del killers[2:]
+
+    def max_node(self, board: Board, boneyard_size: int, depth: int, hand: list[Domino], beta: float = math.inf):
         """Max Node is the node for the Expectiminimax player. It evaluates the best moves given a board, boneyard size, depth, and hand
 
         Args:
@@ -139,19 +365,31 @@ class ExpectiMinimaxPlayer(Player):
             boneyard_size (int): Number of tiles in the boneyard 
             depth (int): Depth of search (Defaulted to 4)
             hand (list[Domino]): Current State of our hand
+            beta (float, optional): Value already guaranteed to the parent min node. Once a move reaches it, the min node
+                will not choose this node, so the remaining moves are skipped. Defaults to math.inf.
 
         Returns:
             Tuple(int, action): optimal value and move 
         """
+        self.nodes_searched += 1
         if (depth == 0 or not hand or self.check_terminal(board, hand, boneyard_size)):
-            return self.eval(board, boneyard_size, hand), None
+            return self.leaf_value(board, boneyard_size, hand), None
+
+        if self.use_transposition_table:
+            key = (board.get_tails(), frozenset(board.get_board_tiles()), frozenset(hand), depth)
+            if key in self.transpositions:
+                value, is_lower_bound = self.transpositions[key]
+                if not is_lower_bound or value >= beta:
+                    return value, self.best_moves.get((board.get_tails(), frozenset(hand)))
 
         optimal_max_val = -math.inf
         optimal_max_move = None
         moves = self.possible_moves(board, hand)
         # Generate moves based on the current hand copy
         if not moves:
-            return self.eval(board, boneyard_size, hand), None
+            return self.leaf_value(board, boneyard_size, hand), None
+        if self.move_ordering:
+            moves = self.order_moves(board, hand, moves, depth)
         for action in moves:
             board_copy = board.copy()
             board_copy.add_to_board(action)
@@ -164,6 +402,16 @@ class ExpectiMinimaxPlayer(Player):
             if value > optimal_max_val:
                 optimal_max_val = value
                 optimal_max_move = action
+            if optimal_max_val >= beta:
+                # Cutoff: the parent min node already has a better (lower) option
+                break
+
+        if self.use_transposition_table:
+            self.transpositions[key] = (optimal_max_val, optimal_max_val >= beta)
+        if self.move_ordering or self.use_transposition_table:
+            self.best_moves[(board.get_tails(), frozenset(hand))] = optimal_max_move
+        if self.move_ordering:
+            self.record_good_move(board, optimal_max_move, depth, optimal_max_val >= beta)
 
         return optimal_max_val, optimal_max_move
 
@@ -171,6 +419,11 @@ class ExpectiMinimaxPlayer(Player):
         """Chance node accounts for the probabilities of opponent tiles and for each possible tile, evaluates the score and 
         possible move for the opponent. Finally, it obtains a weightage of the minimum eval score multiplied by the tile probability
 
+        Every tile the opponent cannot play leads to the same position (the opponent draws or passes), so that position is
+        searched once. With chance_samples set, only that many of the playable tiles are searched and the others are
+        estimated from them (see sample_tiles). Chance nodes one or two plies above the leaves are evaluated in batch
+        (see batch_min_values), for every playable tile.
+
         Args:
             board (Board): Current State of the board
             boneyard_size (int): Number of boneyard tiles
@@ -180,13 +433,160 @@ class ExpectiMinimaxPlayer(Player):
         Returns:
             total: int: Weighted score of the possible moves * probability of opponent having the tile
         """
+        self.nodes_searched += 1
         tile_probabilities = self.obtain_opponent_tile_probabilities(board)
-        total = 0
-        # tile_probabilities = [(Domino, probability), ...]
+        if not tile_probabilities:
+            return 0
+        if depth == 0 or not hand or self.check_terminal(board, hand, boneyard_size):
+            # The min node below is a leaf whatever the tile
+            return self.min_node(board, boneyard_size, depth, tile_probabilities[0][0], hand) * sum(prob for _, prob in tile_probabilities)
+
+        tails = board.get_tails()
+        playable = []
+        unplayable_prob = 0
         for tile, prob in tile_probabilities:
-            min_value = self.min_node(board, boneyard_size, depth, tile, hand)
-            total += min_value * prob
-        return total
+            if tile[0] in tails or tile[-1] in tails:
+                playable.append((tile, prob))
+            else:
+                unplayable_prob += prob
+                unplayable_tile = tile
+
+        total = 0
+        if unplayable_prob:
+            total += self.min_node(board, boneyard_size, depth, unplayable_tile, hand) * unplayable_prob
+        if not playable:
+            return total
+        values = self.batch_min_values(board, boneyard_size, depth, hand, playable, len(tile_probabilities)) if depth <= 2 else None
+        if values is not None:
+            for (tile, prob), min_value in zip(playable, values):
+                total += min_value * prob
+            return total
+        if not self.chance_samples or len(playable) <= self.chance_samples:
+            # tile_probabilities = [(Domino, probability), ...]
+            for tile, prob in playable:
+                min_value = self.min_node(board, boneyard_size, depth, tile, hand)
+                total += min_value * prob
+            return total
+        return total + self.sample_tiles(board, boneyard_size, depth, hand, playable)
+
+    def batch_min_values(self, board: Board, boneyard_size: int, depth: int, hand: list[Domino], playable: list[tuple[Domino, float]], candidates: int) -> list[float] | None:
+        """Min node values of the playable opponent tiles of a chance node one or two plies above the leaves, evaluated at once
+
+        The positions after every (opponent tile, opponent end) and, at depth 2, every reply of ours are evaluated as NumPy
+        arrays indexed by tile: eval only depends on the tails (through mobility, the number of hand tiles containing each
+        tail pip) and on the tile we played (through the pip score), so no board or hand is copied. The values are the same
+        as searching the min nodes one by one.
+
+        Args:
+            board (Board): Current State of the board
+            boneyard_size (int): Number of boneyard tiles
+            depth (int): depth of the search (1 or 2)
+            hand (list[Domino]): Current state of the hand after player plays the move
+            playable (list[tuple[Domino, float]]): Tiles the opponent can play and their probabilities
+            candidates (int): Number of tiles the opponent may hold at this chance node
+
+        Returns:
+            list[float] | None: Min node value of each playable tile, or None when the batch does not apply
+                (disabled or no NumPy, exact endgame leaves, or a round that can end before the leaves)
+        """
+        if not self.batch_leaves or (self.endgame_solver and boneyard_size == 0):
+            return None
+        board_size = len(board.get_board_tiles())
+        opponent_tiles = self.domino_set.number_of_tiles - (boneyard_size + len(hand) + board_size)
+        if depth == 2 and (candidates < 2 or opponent_tiles < 2):
+            return None
+        np = load_numpy()
+        if np is None:
+            return None
+
+        left, right = board.get_tails()
+        tiles = np.array([tile for tile, _ in playable])
+        # Hand tiles containing each pip
+        counts = np.zeros(self.domino_set.max_pip + 1, dtype=np.int64)
+        for tile in hand:
+            counts[tile[0]] += 1
+            if tile[-1] != tile[0]:
+                counts[tile[-1]] += 1
+
+        # Tails after each opponent move: [tile, end (0 or -1), (left tail, right tail)]
+        tails = np.empty((len(playable), 2, 2), dtype=np.int64)
+        tails[:, 0, 0] = np.where(tiles[:, 0] == left, tiles[:, 1], tiles[:, 0])
+        tails[:, 0, 1] = right
+        tails[:, 1, 0] = left
+        tails[:, 1, 1] = np.where(tiles[:, 0] == right, tiles[:, 1], tiles[:, 0])
+        opponent_moves = np.stack([(tiles == left).any(axis=1), (tiles == right).any(axis=1)], axis=1)
+
+        # Leaf after the opponent move (eval with our hand unchanged): also the value when we have no reply
+        pip_sum = sum(a + b for (a, b) in hand)
+        tile_count_score = (opponent_tiles - 1) - len(hand)
+        mobility = counts[tails[..., 0]] + (tails[..., 0] != tails[..., 1]) * counts[tails[..., 1]]
+        values = -pip_sum + 2 * mobility + 5 * tile_count_score
+        self.nodes_searched += int(opponent_moves.sum())
+
+        if depth == 2:
+            # Every reply of ours: [tile, end, hand tile, our end, (left tail, right tail)]
+            ours = np.array(hand)
+            first, second = ours[:, 0], ours[:, 1]
+            after_left = tails[:, :, 0, None]
+            after_right = tails[:, :, 1, None]
+            replies = np.stack([(ours[None, None, :, :] == after_left[..., None]).any(axis=-1),
+                                ((ours[None, None, :, :] == after_right[..., None]).any(axis=-1)) & (after_left != after_right)], axis=-1)
+            final_left = np.stack([np.where(first == after_left, second, first), np.broadcast_to(after_left, replies.shape[:-1])], axis=-1)
+            final_right = np.stack([np.broadcast_to(after_right, replies.shape[:-1]), np.where(first == after_right, second, first)], axis=-1)
+            # Mobility of the hand without the tile played
+            played = ours[None, None, :, None, :]
+            left_count = counts[final_left] - (played == final_left[..., None]).any(axis=-1)
+            right_count = counts[final_right] - (played == final_right[..., None]).any(axis=-1)
+            reply_mobility = left_count + (final_left != final_right) * right_count
+            reply_pips = -(pip_sum - (first + second))[None, None, :, None]
+            # Our reply is followed by a chance node at depth 0: the leaf times the probability mass of the remaining tiles
+            tiles_left = self.domino_set.number_of_tiles - (board_size + 2 + len(self.get_hand()))
+            mass = sum([1 / (candidates - 1)] * (candidates - 1)) if tiles_left > 0 else 0
+            leaves = (reply_pips + 2 * reply_mobility + 5 * ((opponent_tiles - 1) - (len(hand) - 1))) * mass
+            best_reply = np.where(replies, leaves, -np.inf).max(axis=(2, 3))
+            values = np.where(replies.any(axis=(2, 3)), best_reply, values)
+            self.nodes_searched += int(replies[opponent_moves].sum())
+
+        return np.where(opponent_moves, values, np.inf).min(axis=1).tolist()
+
+    def sample_tiles(self, board: Board, boneyard_size: int, depth: int, hand: list[Domino], playable: list[tuple[Domino, float]]) -> float:
+        """Estimates the weighted score of the playable opponent tiles from chance_samples of them
+
+        The tiles are taken most likely first (ties broken by doubles and pips, the tiles an opponent would rather get rid of)
+        or at random. Their probability-weighted mean stands for the whole set; with chance_variance set, more tiles are
+        searched, doubling their number, until the variance of that mean (with the finite population correction, so that
+        it reaches 0 once every tile is searched) falls below chance_variance.
+
+        Args:
+            board (Board): Current State of the board
+            boneyard_size (int): Number of boneyard tiles
+            depth (int): depth of the search
+            hand (list[Domino]): Current state of the hand after player plays the move
+            playable (list[tuple[Domino, float]]): Tiles the opponent can play and their probabilities
+
+        Returns:
+            float: Estimated weighted score of the playable tiles
+        """
+        if self.chance_sampling == "ranked":
+            order = sorted(playable, key=lambda item: (item[1], item[0][0] == item[0][-1], item[0][0] + item[0][-1]), reverse=True)
+        else:
+            order = random.sample(playable, len(playable))
+        mass = sum(prob for _, prob in playable)
+
+        values = []
+        count = self.chance_samples
+        while True:
+            for tile, prob in order[len(values):count]:
+                values.append((self.min_node(board, boneyard_size, depth, tile, hand), prob))
+            weight = sum(prob for _, prob in values)
+            mean = sum(value * prob for value, prob in values) / weight
+            if not self.chance_variance or len(values) == len(order):
+                break
+            spread = sum((value - mean) ** 2 for value, _ in values) / (len(values) - 1) if len(values) > 1 else math.inf
+            if spread / len(values) * (1 - len(values) / len(order)) <= self.chance_variance:
+                break
+            count *= 2
+        return mean * mass
 
     def min_node(self, board: Board, boneyard_size: int, depth: int, tile: Domino, hand: list[Domino]):
         """Min Node is the node for the opponent. It evaluates the best moves for opponent
@@ -202,8 +602,9 @@ class ExpectiMinimaxPlayer(Player):
         Returns:
             Tuple(int, action): optimal value and move 
         """
+        self.nodes_searched += 1
         if (depth == 0 or not hand or self.check_terminal(board, hand, boneyard_size)):
-            return self.eval(board, boneyard_size, hand)
+            return self.leaf_value(board, boneyard_size, hand, opponent_to_move=True)
 
         opponent_moves = [
             m for m in board.get_moves_for_tiles(tile)
@@ -217,7 +618,91 @@ class ExpectiMinimaxPlayer(Player):
         for action in opponent_moves:
             board_copy = board.copy()
             board_copy.add_to_board(action)
-            value, _ = self.max_node(board_copy, boneyard_size, depth - 1, hand.copy())
+            # The max node can stop as soon as it cannot improve on the worst value found so far
+            value, _ = self.max_node(board_copy, boneyard_size, depth - 1, hand.copy(), beta=worst_value)
             worst_value = min(worst_value, value)
 
         return worst_value
+
+# Testing Section
+if __name__ == "__main__":
+    from Boneyard import Boneyard
+    import time
+    print("------------------------")
+    print("Testing ExpectiMinimaxPlayer Class (nodes searched per move ordering configuration)")
+    configurations = {
+        "plain": dict(move_ordering=False, transposition_table=False),
+        "ordering": dict(move_ordering=True, transposition_table=False),
+        "ordering + transpositions": dict(move_ordering=True, transposition_table=True),
+    }
+    for depth in [5, 6, 7]:
+        for label, options in configurations.items():
+            nodes = 0
+            elapsed = 0.0
+            for seed in range(5):
+                # Same positions for every configuration
+                random.seed(seed)
+                boneyard = Boneyard()
+                board = Board()
+                player = ExpectiMinimaxPlayer(depth=depth, **options)
+                player.set_hand(boneyard.generate_random_hand())
+                opponent_hand = boneyard.generate_random_hand()
+                board.add_to_board((opponent_hand.pop(), 0))
+                start = time.perf_counter()
+                player.move(board, len(boneyard.boneyard))
+                nodes += player.nodes_searched
+                elapsed += time.perf_counter() - start
+            print(f"Depth {depth} ({label}): {nodes} nodes, {elapsed:.2f}s")
+    print("------------------------")
+    print("Testing ExpectiMinimaxPlayer Class (sparse chance nodes, depth 7: nodes searched and moves agreeing with the full search)")
+    samplings = {
+        "full": {},
+        "2 ranked": dict(chance_samples=2),
+        "3 ranked": dict(chance_samples=3),
+        "3 random": dict(chance_samples=3, chance_sampling="random"),
+        "2 ranked, variance 4": dict(chance_samples=2, chance_variance=4.0),
+    }
+    reference = []
+    for label, options in samplings.items():
+        nodes = 0
+        elapsed = 0.0
+        agree = 0
+        for seed in range(8):
+            random.seed(seed)
+            boneyard = Boneyard()
+            board = Board()
+            player = ExpectiMinimaxPlayer(depth=7, **options)
+            player.set_hand(boneyard.generate_random_hand())
+            opponent_hand = boneyard.generate_random_hand()
+            board.add_to_board((opponent_hand.pop(), 0))
+            start = time.perf_counter()
+            action = player.move(board, len(boneyard.boneyard))
+            nodes += player.nodes_searched
+            elapsed += time.perf_counter() - start
+            if not options:
+                reference.append(action)
+            agree += action == reference[seed]
+        print(f"{label}: {nodes} nodes, {elapsed:.2f}s, {agree}/8 moves agree")
+    print("------------------------")
+    print("Testing ExpectiMinimaxPlayer Class (frontier evaluated node by node vs in batch)")
+    for depth in [5, 6, 7]:
+        for batch_leaves in [False, True]:
+            elapsed = 0.0
+            actions = []
+            for seed in range(8):
+                random.seed(seed)
+                boneyard = Boneyard()
+                board = Board()
+                player = ExpectiMinimaxPlayer(depth=depth, batch_leaves=batch_leaves)
+                player.set_hand(boneyard.generate_random_hand())
+                opponent_hand = boneyard.generate_random_hand()
+                board.add_to_board((opponent_hand.pop(), 0))
+                start = time.perf_counter()
+                actions.append((player.move(board, len(boneyard.boneyard)), player.last_value))
+                elapsed += time.perf_counter() - start
+            if batch_leaves:
+                print(f"Depth {depth} (batch): {elapsed:.2f}s, same moves and values: {actions == unbatched}")
+            else:
+                unbatched = actions
+                print(f"Depth {depth} (node by node): {elapsed:.2f}s")
+    print("------------------------")
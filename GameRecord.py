@@ -0,0 +1,300 @@
+from game_types import Domino, Move, DominoSet, DOUBLE_SIX, HAND_SIZE, domino_set
+from Board import Board
+import mmap
+import os
+import struct
+
+
+# File layout: MAGIC, then records of RECORD_HEADER (record type, body length) followed by the body
+# - PLAYERS record: the two player names, utf-8, separated by a zero byte (applies to the following rounds)
+# - SET record: max pip of the domino set and hand size, one byte each (applies to the following rounds,
+#   double-6 with 7-tile hands until the first SET record)
+# - ROUND record: the tiles dealt to player 1 and the tiles dealt to player 2 (one byte per tile,
+#   the index in the domino set's tiles), then the events of the round
+MAGIC = b"DGR1"
+RECORD_HEADER = struct.Struct("<BH")
+PLAYERS = 0
+ROUND = 1
+SET = 2
+
+# Events start with an opcode byte: kind << 2 | player << 1 | tail (player 0 is player 1 of the match)
+# - MOVE: tile byte (the starting tile is the first move)
+# - DRAW: tile byte
+# - PASS: no argument
+# - TIME: uint32 microseconds, time taken by the turn made of the events since the previous TIME
+# - END: winner byte (0, 1, or 2 for a tie), uint16 points won
+MOVE = 0
+DRAW = 1
+PASS = 2
+TIME = 3
+END = 4
+TIME_ARGUMENT = struct.Struct("<I")
+END_ARGUMENT = struct.Struct("<BH")
+TIE = 2
+
+
+class GameRecordWriter():
+    """Append-only binary log of rounds, written by Match as the rounds are played
+
+    Events are appended to an in-memory buffer during the round (a couple of bytes each),
+    and the round is written as one record when it ends.
+    """
+
+    def __init__(self, path : str):
+        """Init Function for the writer
+
+        Args:
+            path (str): Path of the log, created if needed and appended to otherwise
+        """
+        self.path = path
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.players = None
+        # Domino set and hand size of the following rounds
+        self.layout = (DOUBLE_SIX.max_pip, HAND_SIZE)
+        self.tile_index = DOUBLE_SIX.index
+        self.round = None
+        self.rounds = 0
+
+    def start_round(self, names : tuple[str, str], hand_1 : list[Domino], hand_2 : list[Domino], domino_set : DominoSet = DOUBLE_SIX):
+        """Start recording a round
+
+        Args:
+            names (tuple[str, str]): Names of player 1 and player 2
+            hand_1 (list[Domino]): Hand dealt to player 1
+            hand_2 (list[Domino]): Hand dealt to player 2
+            domino_set (DominoSet, optional): Domino set of the round. Defaults to DOUBLE_SIX.
+        """
+        if names != self.players:
+            body = "\0".join(names).encode("utf-8")
+            self.file.write(RECORD_HEADER.pack(PLAYERS, len(body)) + body)
+            self.players = names
+        if (domino_set.max_pip, len(hand_1)) != self.layout:
+            self.layout = (domino_set.max_pip, len(hand_1))
+            self.file.write(RECORD_HEADER.pack(SET, 2) + bytes(self.layout))
+            self.tile_index = domino_set.index
+        self.round = bytearray(self.tile_index[tile] for tile in hand_1 + hand_2)
+
+    def move(self, player : int, move : Move):
+        self.round += bytes(((MOVE << 2) | (player << 1) | (move[1] != 0), self.tile_index[move[0]]))
+
+    def draw(self, player : int, tile : Domino):
+        self.round += bytes(((DRAW << 2) | (player << 1), self.tile_index[tile]))
+
+    def passed(self, player : int):
+        self.round.append((PASS << 2) | (player << 1))
+
+    def time(self, player : int, seconds : float):
+        self.round.append((TIME << 2) | (player << 1))
+        self.round += TIME_ARGUMENT.pack(min(int(seconds * 1e6), 0xFFFFFFFF))
+
+    def end_round(self, winner : int, points : int):
+        """Write the round
+
+        Args:
+            winner (int): 0 if player 1 won, 1 if player 2 won, TIE otherwise
+            points (int): Points won
+        """
+        self.round.append(END << 2)
+        self.round += END_ARGUMENT.pack(winner, points)
+        self.file.write(RECORD_HEADER.pack(ROUND, len(self.round)))
+        self.file.write(self.round)
+        self.round = None
+        self.rounds += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class GameRecordReader():
+    """Reader of a game record log (memory-mapped)
+
+    scan yields the raw rounds without decoding their events, for fast passes over
+    millions of rounds; rounds decodes them; replay rebuilds every decision of a round.
+    """
+
+    def __init__(self, path : str):
+        """Init Function for the reader
+
+        Args:
+            path (str): Path of the log
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size <= len(MAGIC):
+                self.data = b""
+            else:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data and self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a game record log")
+
+    def scan(self):
+        """Raw rounds
+
+        Yields:
+            tuple[tuple[str, str], tuple[int, int], memoryview]: Player names, (max pip, hand size) and body of every round
+        """
+        data = memoryview(self.data)
+        offset = len(MAGIC)
+        names = None
+        layout = (DOUBLE_SIX.max_pip, HAND_SIZE)
+        while offset + RECORD_HEADER.size <= len(data):
+            kind, length = RECORD_HEADER.unpack_from(data, offset)
+            offset += RECORD_HEADER.size
+            body = data[offset:offset + length]
+            offset += length
+            if len(body) < length:
+                # Round cut short by an interrupted writer
+                break
+            if kind == PLAYERS:
+                names = tuple(bytes(body).decode("utf-8").split("\0"))
+            elif kind == SET:
+                layout = (body[0], body[1])
+            else:
+                yield names, layout, body
+
+    def results(self):
+        """Winner and points of every round, read from the END event of the raw rounds
+
+        Yields:
+            tuple[tuple[str, str], int, int]: Player names, winner (0, 1 or TIE) and points won
+        """
+        for names, _, body in self.scan():
+            winner, points = END_ARGUMENT.unpack_from(body, len(body) - END_ARGUMENT.size)
+            yield names, winner, points
+
+    def rounds(self):
+        """Decoded rounds
+
+        Yields:
+            dict: Player names, hands dealt, events as (kind, player, tile, tail, seconds) tuples, winner and points
+        """
+        for names, layout, body in self.scan():
+            yield decode_round(names, body, layout)
+
+
+def decode_round(names : tuple[str, str], body : memoryview, layout : tuple[int, int] = (DOUBLE_SIX.max_pip, HAND_SIZE)) -> dict:
+    """Decode the body of a ROUND record
+
+    Args:
+        names (tuple[str, str]): Player names
+        body (memoryview): Body of the record
+        layout (tuple[int, int], optional): Max pip of the domino set and hand size. Defaults to double-6 with 7-tile hands.
+
+    Returns:
+        dict: Player names, max pip of the domino set, hands dealt, events as (kind, player, tile, tail, seconds) tuples
+            (tile and tail are None when not relevant, seconds only for TIME events), winner and points
+    """
+    max_pip, hand_size = layout
+    tiles = domino_set(max_pip).tiles
+    hands = ([tiles[index] for index in body[:hand_size]], [tiles[index] for index in body[hand_size:2 * hand_size]])
+    events = []
+    winner = points = None
+    offset = 2 * hand_size
+    while offset < len(body):
+        op = body[offset]
+        kind, player, tail = op >> 2, (op >> 1) & 1, -(op & 1)
+        offset += 1
+        if kind == MOVE:
+            events.append((MOVE, player, tiles[body[offset]], tail, None))
+            offset += 1
+        elif kind == DRAW:
+            events.append((DRAW, player, tiles[body[offset]], None, None))
+            offset += 1
+        elif kind == PASS:
+            events.append((PASS, player, None, None, None))
+        elif kind == TIME:
+            events.append((TIME, player, None, None, TIME_ARGUMENT.unpack_from(body, offset)[0] / 1e6))
+            offset += TIME_ARGUMENT.size
+        else:
+            winner, points = END_ARGUMENT.unpack_from(body, offset)
+            offset += END_ARGUMENT.size
+    return {"players": names, "max_pip": max_pip, "hands": hands, "events": events, "winner": winner, "points": points}
+
+
+def replay(round : dict):
+    """Replay a decoded round, yielding every decision (e.g. to build training or evaluation datasets)
+
+    Args:
+        round (dict): Decoded round (see decode_round)
+
+    Yields:
+        tuple[int, list[Domino], list[Domino], int, Move | None]: Player deciding (0 or 1), their hand,
+            the board tiles and the boneyard size before the decision, and the move taken (None to draw or pass)
+    """
+    hands = [list(round["hands"][0]), list(round["hands"][1])]
+    board = Board()
+    boneyard_size = domino_set(round["max_pip"]).number_of_tiles - len(hands[0]) - len(hands[1])
+    for kind, player, tile, tail, _ in round["events"]:
+        if kind == MOVE:
+            if not board.is_empty():
+                yield player, list(hands[player]), list(board.get_board_tiles()), boneyard_size, (tile, tail)
+            board.add_to_board((tile, tail))
+            hands[player].remove(tile)
+        elif kind == DRAW:
+            yield player, list(hands[player]), list(board.get_board_tiles()), boneyard_size, None
+            hands[player].append(tile)
+            boneyard_size -= 1
+        elif kind == PASS:
+            yield player, list(hands[player]), list(board.get_board_tiles()), boneyard_size, None
+
+
+if __name__ == "__main__":
+    # Testing Section
+    from Player import Player
+    from Match import Match
+    import tempfile
+    import time
+
+    print("------------------------")
+    print("Testing GameRecord Module (Random Player vs Random Player)")
+    path = os.path.join(tempfile.mkdtemp(), "games.dgr")
+    rounds = 20000
+
+    m = Match(Player("Random_A"), Player("Random_B"), False)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        m.play()
+    plain_time = time.perf_counter() - start
+
+    with GameRecordWriter(path) as writer:
+        m = Match(Player("Random_A"), Player("Random_B"), False, recorder=writer)
+        start = time.perf_counter()
+        expected = []
+        for _ in range(rounds):
+            score_1, score_2 = m.player_1.score, m.player_2.score
+            m.play()
+            expected.append((m.player_1.score - score_1, m.player_2.score - score_2))
+        record_time = time.perf_counter() - start
+    print(f"{rounds} rounds: {plain_time:.2f}s without recording, {record_time:.2f}s with recording, {os.path.getsize(path) / rounds:.1f} bytes per round")
+
+    reader = GameRecordReader(path)
+    start = time.perf_counter()
+    wins = [0, 0, 0]
+    for names, winner, points in reader.results():
+        wins[winner] += 1
+    print(f"Scanned results in {time.perf_counter() - start:.3f}s: {wins} (player 1, player 2, ties)")
+
+    start = time.perf_counter()
+    decoded = list(reader.rounds())
+    print(f"Decoded rounds in {time.perf_counter() - start:.3f}s")
+
+    start = time.perf_counter()
+    decisions = sum(1 for round in decoded for _ in replay(round))
+    print(f"Replayed {decisions} decisions in {time.perf_counter() - start:.3f}s")
+
+    mismatches = 0
+    for round, (points_1, points_2) in zip(decoded, expected):
+        if round["winner"] == 0 and (points_1, points_2) != (round["points"], 0):
+            mismatches += 1
+        if round["winner"] == 1 and (points_1, points_2) != (0, round["points"]):
+            mismatches += 1
+    print(f"{mismatches} rounds with results different from the match")
+    print("------------------------")
@@ -0,0 +1,547 @@
+from game_types import Move, MatchEvent
+from Player import Player
+from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer
+from MonteCarloPlayer import MonteCarloPlayer
+from Board import Board
+from Match import Match
+from LatencyRecorder import LatencyRecorder, LatencyHistogram
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+import asyncio
+import json
+import random
+import socket
+import sys
+
+
+# Protocol: one JSON object per line in both directions
+# Client -> server:
+# - {"type": "new_game", "opponent": "random" | "expectiminimax" | "montecarlo", "options": {...},
+#    "score_to_win": 200, "name": "Human", "deadline": 10.0} (one game per connection)
+# - {"type": "move", "tile": [a, b], "tail": 0 | -1}, answering a your_turn message
+# - {"type": "stats"}, instead of new_game, to get the server statistics
+# Server -> client:
+# - {"type": "started", "you": name, "opponent": name}
+# - {"type": "event", "event": "RoundStarted" | "TilePlaced" | "Drew" | "Passed" | "RoundEnded", ...fields}
+#   (see game_types.py, a tile drawn by the agent is None)
+# - {"type": "your_turn", "hand": [...], "board": [...], "boneyard_size": n, "moves": [[tile, tail], ...]}
+#   (draws are automatic: the client is only asked when it has a legal move)
+# - {"type": "round_over", "winner": name | "Tie", "scores": {name: score}}
+# - {"type": "game_over", "winner": name, "scores": {name: score}}
+# - {"type": "stats", ...} and {"type": "error", "error": message}
+
+# Agents the server can host, by the name used in new_game requests
+AGENTS = {"random": Player, "expectiminimax": ExpectiMinimaxPlayer, "montecarlo": MonteCarloPlayer}
+# Options a client may set, with their largest value (a search can not be stopped once started)
+OPTIONS = {
+    "random": {},
+    "expectiminimax": {"depth": 8, "endgame_tiles": 10, "move_ordering": True, "transposition_table": True, "chance_samples": 91, "chance_variance": 1000.0},
+    "montecarlo": {"n": 20000, "c": 10.0, "endgame_tiles": 10, "rave": 100000.0},
+}
+# Largest score_to_win a client may ask for (bounds the length of a session)
+MAX_SCORE_TO_WIN = 1000
+
+# Agents built by a pool worker, one per configuration (reused across sessions)
+worker_agents = {}
+
+
+def search_position(opponent : str, options : dict, hand : list, line : list, boneyard_size : int, voids : list) -> Move | None:
+    """Pool worker: choose the agent's move in a position
+
+    Args:
+        opponent (str): Agent name (see AGENTS)
+        options (dict): Agent options
+        hand (list): Agent's hand
+        line (list): Board tiles
+        boneyard_size (int): Number of tiles in the boneyard
+        voids (list): Numbers the opponent is known not to hold
+
+    Returns:
+        Move | None: Move chosen by the agent
+    """
+    config = (opponent, tuple(sorted(options.items())))
+    agent = worker_agents.get(config)
+    if agent is None:
+        agent = worker_agents[config] = AGENTS[opponent](**options)
+    board = Board()
+    board.board = list(line)
+    agent.set_hand(list(hand))
+    agent.opponent_model.voids = set(voids)
+    return agent.move(board, boneyard_size)
+
+
+def validate_options(opponent : str, options : dict) -> dict:
+    # Check the agent options requested by a client (raises ValueError)
+    if not isinstance(opponent, str) or opponent not in AGENTS:
+        raise ValueError(f"Unknown opponent {opponent}, expected one of {list(AGENTS)}")
+    if not isinstance(options, dict):
+        raise ValueError("options must be an object")
+    for option, value in options.items():
+        if option not in OPTIONS[opponent]:
+            raise ValueError(f"Unknown option {option} for {opponent}, expected one of {list(OPTIONS[opponent])}")
+        limit = OPTIONS[opponent][option]
+        if type(value) is not type(limit) and not (isinstance(limit, float) and type(value) is int):
+            raise ValueError(f"Option {option} must be a {type(limit).__name__}")
+        if not isinstance(limit, bool) and not 0 <= value <= limit:
+            raise ValueError(f"Option {option} must be between 0 and {limit}")
+    return options
+
+
+def validate_game(score_to_win, deadline, move_deadline : float) -> tuple[int, float]:
+    # Check the score to win and move deadline requested by a client (raises ValueError), the deadline capped by the server's
+    if type(score_to_win) is not int or not 0 < score_to_win <= MAX_SCORE_TO_WIN:
+        raise ValueError(f"score_to_win must be an integer between 1 and {MAX_SCORE_TO_WIN}")
+    if type(deadline) not in (int, float) or not deadline > 0:
+        raise ValueError("deadline must be a positive number of seconds")
+    return score_to_win, min(float(deadline), move_deadline)
+
+
+class RemotePlayer(Player):
+    """Seat of a client: its moves come from the connection, and the match events it observes are forwarded to it
+    """
+    def __init__(self, name : str, session : 'GameSession'):
+        super().__init__(name)
+        self.session = session
+
+    def observe(self, event : MatchEvent):
+        super().observe(event)
+        self.session.send({"type": "event", "event": type(event).__name__, **event._asdict()})
+
+
+class GameSession():
+    """One game between a client and an agent, played on the server's event loop
+
+    Follows the rules of Match.play_round, but awaits the client's moves and the agent's
+    searches (run in the server's process pool) instead of blocking on them.
+    """
+
+    def __init__(self, server : 'GameServer', reader : asyncio.StreamReader, writer : asyncio.StreamWriter, request : dict):
+        """Init Function for the session
+
+        Args:
+            server (GameServer): Server hosting the session
+            reader (asyncio.StreamReader): Connection to the client
+            writer (asyncio.StreamWriter): Connection to the client
+            request (dict): new_game request (see the protocol above)
+        """
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.opponent = request.get("opponent", "random")
+        self.options = validate_options(self.opponent, request.get("options", {}))
+        self.score_to_win, self.deadline = validate_game(request.get("score_to_win", 200), request.get("deadline", server.move_deadline), server.move_deadline)
+
+        self.client = RemotePlayer(str(request.get("name", "HumanPlayer")), self)
+        # The agent itself searches in the pool: its seat only holds its hand, score and opponent model
+        self.agent = Player(self.opponent)
+        self.match = Match(self.client, self.agent, False)
+
+    def send(self, message : dict):
+        # Queue a message to the client (flushed by drain)
+        self.writer.write((json.dumps(message) + "\n").encode())
+
+    async def receive(self) -> dict:
+        # Next message of the client
+        line = await asyncio.wait_for(self.reader.readline(), self.server.idle_timeout)
+        if not line:
+            raise ConnectionError("Client disconnected")
+        return json.loads(line)
+
+    def scores(self) -> dict[str, int]:
+        return {self.client.name: self.client.score, self.agent.name: self.agent.score}
+
+    async def run(self):
+        # Play rounds until one of the players reaches score_to_win
+        self.send({"type": "started", "you": self.client.name, "opponent": self.agent.name})
+        while self.client.score < self.score_to_win and self.agent.score < self.score_to_win:
+            result, _, _ = await self.play_round()
+            self.send({"type": "round_over", "winner": result, "scores": self.scores()})
+            await self.writer.drain()
+        winner = self.client if self.client.score >= self.score_to_win else self.agent
+        self.send({"type": "game_over", "winner": winner.name, "scores": self.scores()})
+        await self.writer.drain()
+
+    async def play_round(self):
+        # Play a round (see Match.play_round)
+        match = self.match
+        first_player, second_player = match.deal()
+        times = {first_player.name: [], second_player.name: []}
+        while not match.terminal_state():
+            times[second_player.name].append(await self.timed_turn(second_player))
+            if match.terminal_state():
+                break
+            times[first_player.name].append(await self.timed_turn(first_player))
+        return match.end_round(first_player, second_player, times[first_player.name], times[second_player.name])
+
+    async def timed_turn(self, player : Player) -> float:
+        # Take a turn, recording the agent's latencies (see Match.timed_turn)
+        boneyard_size = len(self.match.boneyard.boneyard)
+        start = perf_counter()
+        await self.take_turn(player)
+        elapsed = perf_counter() - start
+        if player is self.agent:
+            self.match.latency_2.record(elapsed, boneyard_size)
+            self.server.latency.record(elapsed, boneyard_size)
+        return elapsed
+
+    async def take_turn(self, player : Player):
+        # Choose a move, drawing until one is possible (see Match.take_turn)
+        match = self.match
+        move = await self.choose(player)
+        tails = match.board.get_tails()
+        while not move and not match.boneyard.is_boneyard_empty():
+            match.draw_tile(player, tails)
+            move = await self.choose(player)
+        if move:
+            match.take_move(player, move)
+        else:
+            match.pass_turn(player, tails)
+
+    async def choose(self, player : Player) -> Move | None:
+        # Move of the client or the agent, None if they have no legal move
+        board = self.match.board
+        boneyard_size = len(self.match.boneyard.boneyard)
+        moves = player.possible_moves(board)
+        if not moves:
+            return None
+
+        if player is self.agent:
+            if len(moves) == 1:
+                return moves[0]
+            if self.opponent == "random":
+                return random.choice(moves)
+            return await self.server.search(self.opponent, self.options, player, board, boneyard_size, moves, self.deadline)
+
+        self.send({"type": "your_turn", "hand": player.get_hand(), "board": board.get_board_tiles(), "boneyard_size": boneyard_size, "moves": moves})
+        await self.writer.drain()
+        while True:
+            message = await self.receive()
+            if isinstance(message, dict) and message.get("type") == "move":
+                try:
+                    move = (tuple(message["tile"]), message["tail"])
+                    if move[1] in (0, -1) and len(move[0]) == 2 and player.is_legal(board, move):
+                        return move
+                except (KeyError, TypeError):
+                    pass
+            self.send({"type": "error", "error": f"Illegal move {message}, expected one of {moves}"})
+            await self.writer.drain()
+
+
+class GameServer():
+    """Asyncio server hosting many concurrent games between clients and agents
+
+    Client moves are awaited without blocking the other games. Agent searches run in a
+    shared process pool, with:
+    - a deadline per move: past it, the agent plays its heaviest legal tile instead
+    - backpressure: at most max_pending searches are submitted to the pool (others wait,
+      within their deadline), at most max_sessions games are hosted (others are refused),
+      and every message waits for the connection to drain.
+    """
+
+    def __init__(self, processes : int | None = None, max_sessions : int = 64, max_pending : int | None = None, move_deadline : float = 10.0, idle_timeout : float = 300.0):
+        """Init Function for the server
+
+        Args:
+            processes (int | None, optional): Number of search processes. Defaults to the number of cores.
+            max_sessions (int, optional): Maximum number of concurrent games. Defaults to 64.
+            max_pending (int | None, optional): Maximum number of searches submitted to the pool. Defaults to twice the number of processes.
+            move_deadline (float, optional): Longest time in seconds an agent may take per move (clients may ask for less). Defaults to 10.0.
+            idle_timeout (float, optional): Seconds to wait for a client message before closing the connection. Defaults to 300.0.
+        """
+        self.pool = ProcessPoolExecutor(processes)
+        self.processes = self.pool._max_workers
+        self.max_sessions = max_sessions
+        self.max_pending = max_pending or 2 * self.processes
+        self.move_deadline = move_deadline
+        self.idle_timeout = idle_timeout
+        self.server = None
+
+        # Statistics
+        self.sessions = 0
+        self.games_played = 0
+        self.refused = 0
+        self.searches = 0
+        self.deadline_misses = 0
+        # Agent move latencies, and time searches waited for the pool
+        self.latency = LatencyRecorder()
+        self.queue_wait = LatencyHistogram()
+
+    async def start(self, host : str = "127.0.0.1", port : int = 8765, path : str | None = None) -> int | str:
+        """Start listening
+
+        Args:
+            host (str, optional): TCP host. Defaults to "127.0.0.1".
+            port (int, optional): TCP port (0 for any free port). Defaults to 8765.
+            path (str | None, optional): Unix socket path, used instead of TCP if given. Defaults to None.
+
+        Returns:
+            int | str: Port (or Unix socket path) listened on
+        """
+        self.slots = asyncio.Semaphore(self.max_pending)
+        if path:
+            self.server = await asyncio.start_unix_server(self.handle, path)
+            return path
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self.server.serve_forever()
+
+    async def close(self):
+        # Stop listening and stop the search processes
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        self.pool.shutdown(cancel_futures=True)
+
+    async def handle(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter):
+        # Serve a connection: a stats request or a game
+        try:
+            request = json.loads(await asyncio.wait_for(reader.readline(), self.idle_timeout) or "{}")
+            if request.get("type") == "stats":
+                writer.write((json.dumps({"type": "stats", **self.stats()}) + "\n").encode())
+            elif request.get("type") != "new_game":
+                raise ValueError(f"Expected a new_game or stats request, got {request}")
+            elif self.sessions >= self.max_sessions:
+                self.refused += 1
+                writer.write((json.dumps({"type": "error", "error": "Server busy, try again later"}) + "\n").encode())
+            else:
+                session = GameSession(self, reader, writer, request)
+                self.sessions += 1
+                try:
+                    await session.run()
+                    self.games_played += 1
+                finally:
+                    self.sessions -= 1
+            await writer.drain()
+        except (ValueError, TypeError, AttributeError) as error:
+            writer.write((json.dumps({"type": "error", "error": str(error)}) + "\n").encode())
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def search(self, opponent : str, options : dict, player : Player, board : Board, boneyard_size : int, moves : list[Move], deadline : float) -> Move:
+        """Search the agent's move in the process pool
+
+        Args:
+            opponent (str): Agent name (see AGENTS)
+            options (dict): Agent options
+            player (Player): Agent's seat
+            board (Board): Current state of the board
+            boneyard_size (int): Number of tiles in the boneyard
+            moves (list[Move]): Legal moves
+            deadline (float): Seconds allowed, waiting for the pool included
+
+        Returns:
+            Move: Move found, or the heaviest legal tile if the deadline passed
+        """
+        loop = asyncio.get_running_loop()
+        start = perf_counter()
+        self.searches += 1
+        try:
+            await asyncio.wait_for(self.slots.acquire(), deadline)
+            self.queue_wait.record(perf_counter() - start)
+            future = self.pool.submit(search_position, opponent, options, player.get_hand(), board.get_board_tiles(), boneyard_size, list(player.opponent_model.voids))
+            # The slot is freed when the search really ends (a running search can not be cancelled)
+            future.add_done_callback(lambda _: loop.call_soon_threadsafe(self.slots.release))
+            move = await asyncio.wait_for(asyncio.wrap_future(future), max(deadline - (perf_counter() - start), 0.0))
+            if move and player.is_legal(board, move):
+                return move
+        except asyncio.TimeoutError:
+            self.deadline_misses += 1
+        return max(moves, key=lambda move: move[0][0] + move[0][1])
+
+    def stats(self) -> dict:
+        """Statistics of the server
+
+        Returns:
+            dict: Games in progress and played, refused, searches, deadline misses, and agent move and pool wait latencies
+        """
+        return {
+            "sessions": self.sessions,
+            "games_played": self.games_played,
+            "refused": self.refused,
+            "searches": self.searches,
+            "deadline_misses": self.deadline_misses,
+            "processes": self.processes,
+            "move_time": self.latency.stats(),
+            "queue_wait": self.queue_wait.stats(),
+        }
+
+
+async def play_client(request : dict, host : str = "127.0.0.1", port : int = 8765, path : str | None = None, latency : LatencyHistogram | None = None, rng : random.Random | None = None) -> tuple[dict, int]:
+    """Play a game against the server with random moves
+
+    Args:
+        request (dict): new_game request
+        host (str, optional): Server host. Defaults to "127.0.0.1".
+        port (int, optional): Server port. Defaults to 8765.
+        path (str | None, optional): Unix socket path, used instead of TCP if given. Defaults to None.
+        latency (LatencyHistogram | None, optional): Receives the time from each move sent to the next your_turn. Defaults to None.
+        rng (random.Random | None, optional): Random generator of the moves. Defaults to None.
+
+    Returns:
+        tuple[dict, int]: Last message of the server (game_over or error) and number of moves played
+    """
+    rng = rng or random.Random()
+    if path:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    writer.write((json.dumps(request) + "\n").encode())
+    sent = perf_counter()
+    moves = 0
+    message = {"type": "error", "error": "Connection closed"}
+    try:
+        while line := await reader.readline():
+            message = json.loads(line)
+            if message["type"] == "your_turn":
+                if latency:
+                    latency.record(perf_counter() - sent)
+                tile, tail = rng.choice(message["moves"])
+                writer.write((json.dumps({"type": "move", "tile": tile, "tail": tail}) + "\n").encode())
+                await writer.drain()
+                sent = perf_counter()
+                moves += 1
+            elif message["type"] in ("game_over", "error"):
+                break
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return message, moves
+
+
+async def run_load(games : int, concurrency : int, opponent : str = "expectiminimax", options : dict | None = None, score_to_win : int = 50, deadline : float | None = None,
+                   host : str = "127.0.0.1", port : int = 8765, path : str | None = None, seed : int = 0) -> dict:
+    """Load generator: play games against the server, concurrency of them at a time
+
+    Args:
+        games (int): Number of games
+        concurrency (int): Number of games played at the same time
+        opponent (str, optional): Agent (see AGENTS). Defaults to "expectiminimax".
+        options (dict | None, optional): Agent options. Defaults to None.
+        score_to_win (int, optional): Points needed to win a game. Defaults to 50.
+        deadline (float | None, optional): Seconds allowed per agent move. Defaults to the server's.
+        host (str, optional): Server host. Defaults to "127.0.0.1".
+        port (int, optional): Server port. Defaults to 8765.
+        path (str | None, optional): Unix socket path, used instead of TCP if given. Defaults to None.
+        seed (int, optional): Seed of the clients' moves. Defaults to 0.
+
+    Returns:
+        dict: Games completed and failed, moves, throughput, and response latency statistics
+    """
+    request = {"type": "new_game", "opponent": opponent, "options": options or {}, "score_to_win": score_to_win, "name": "LoadClient"}
+    if deadline:
+        request["deadline"] = deadline
+    latency = LatencyHistogram()
+    limit = asyncio.Semaphore(concurrency)
+    errors = []
+
+    async def one_game(index : int) -> int:
+        async with limit:
+            try:
+                message, moves = await play_client(request, host, port, path, latency, random.Random(seed + index))
+            except ConnectionError as error:
+                message, moves = {"type": "error", "error": str(error)}, 0
+            if message["type"] != "game_over":
+                errors.append(message["error"])
+            return moves
+
+    start = perf_counter()
+    moves = sum(await asyncio.gather(*(one_game(index) for index in range(games))))
+    seconds = perf_counter() - start
+    return {
+        "games": games - len(errors),
+        "errors": len(errors),
+        "moves": moves,
+        "seconds": seconds,
+        "games_per_second": (games - len(errors)) / seconds,
+        "moves_per_second": moves / seconds,
+        "response_time": latency.stats(),
+    }
+
+
+def play_interactive(opponent : str = "expectiminimax", options : dict | None = None, score_to_win : int = 200, host : str = "127.0.0.1", port : int = 8765):
+    # Play a game against the server from the terminal
+    request = {"type": "new_game", "opponent": opponent, "options": options or {}, "score_to_win": score_to_win, "name": "HumanPlayer"}
+    with socket.create_connection((host, port)) as connection:
+        stream = connection.makefile("rw")
+        stream.write(json.dumps(request) + "\n")
+        stream.flush()
+        for line in stream:
+            message = json.loads(line)
+            if message["type"] == "your_turn":
+                print(f"Board: {message['board']} (boneyard: {message['boneyard_size']})")
+                print(f"Hand: {message['hand']}")
+                moves = message["moves"]
+                print(" | ".join(f"Move #{i}: {move}" for i, move in enumerate(moves)))
+                move_idx = -1
+                while move_idx < 0 or move_idx >= len(moves):
+                    move_idx = int(input("Select a move by #: "))
+                stream.write(json.dumps({"type": "move", "tile": moves[move_idx][0], "tail": moves[move_idx][1]}) + "\n")
+                stream.flush()
+            elif message["type"] == "event" and message["event"] in ("TilePlaced", "Drew", "Passed"):
+                print(f"{message['player']}: {message['event']} {message.get('tile') or ''}")
+            elif message["type"] == "round_over":
+                print(f"Round Over: {message['winner']}, Scores: {message['scores']}")
+            elif message["type"] in ("game_over", "error"):
+                print(message)
+                if message["type"] == "game_over":
+                    break
+
+
+async def serve(port : int, processes : int | None):
+    server = GameServer(processes)
+    print(f"Listening on port {await server.start(port=port)} with {server.processes} search processes")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    # Usage: python GameServer.py serve [port] [processes]
+    #        python GameServer.py load [games] [concurrency] [depth] [port]
+    #        python GameServer.py play [depth] [port]
+    # Without arguments, runs the testing section
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "serve":
+        asyncio.run(serve(int(sys.argv[2]) if len(sys.argv) > 2 else 8765, int(sys.argv[3]) if len(sys.argv) > 3 else None))
+    elif command == "load":
+        games = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+        concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+        depth = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+        port = int(sys.argv[5]) if len(sys.argv) > 5 else 8765
+        print(json.dumps(asyncio.run(run_load(games, concurrency, options={"depth": depth}, port=port)), indent=4))
+    elif command == "play":
+        play_interactive(options={"depth": int(sys.argv[2]) if len(sys.argv) > 2 else 5}, port=int(sys.argv[3]) if len(sys.argv) > 3 else 8765)
+    else:
+        # Testing Section
+        async def test():
+            server = GameServer(max_sessions=16)
+            port = await server.start(port=0)
+            print(f"Server on port {port} with {server.processes} search processes")
+            for concurrency in [1, 8]:
+                result = await run_load(16, concurrency, options={"depth": 4}, score_to_win=30, port=port)
+                response = result["response_time"]
+                print(f"Concurrency {concurrency}: {result['games']} games, {result['moves']} moves in {result['seconds']:.2f}s "
+                      f"({result['moves_per_second']:.1f} moves/s), response p50 = {response['p50']:.4f}s, p99 = {response['p99']:.4f}s, errors = {result['errors']}")
+
+            result = await run_load(8, 8, options={"depth": 7}, score_to_win=30, deadline=0.05, port=port)
+            print(f"Deadline 0.05s at depth 7: {result['games']} games, {server.deadline_misses} deadline misses of {server.searches} searches")
+
+            result = await run_load(24, 24, options={"depth": 4}, score_to_win=30, port=port)
+            print(f"24 games at once with max_sessions=16: {result['games']} games, {result['errors']} refused")
+            stats = server.stats()
+            print(f"Server: {stats['games_played']} games, agent move p50 = {stats['move_time']['p50']:.4f}s, p99 = {stats['move_time']['p99']:.4f}s, pool wait p99 = {stats['queue_wait']['p99']:.4f}s")
+            await server.close()
+
+        print("------------------------")
+        print("Testing GameServer Class (load generator, random client moves vs ExpectiMinimax)")
+        asyncio.run(test())
+        print("------------------------")
@@ -0,0 +1,353 @@
+from Player import Player
+from Board import Board
+from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer
+from MonteCarloPlayer import MonteCarloPlayer
+from game_types import Move, DominoSet
+from Boneyard import Boneyard
+from typing import NamedTuple
+from time import perf_counter
+import math
+import random
+import sys
+
+
+class EngineChoice(NamedTuple):
+    # Engine used for a move, with the position features its cost was estimated from
+    engine : str  # "expectiminimax", "montecarlo" or "forced" (at most one legal move, no search)
+    setting : int  # Depth (ExpectiMinimax) or iterations (MonteCarlo)
+    legal_moves : int
+    unseen : int
+    boneyard_size : int
+    hand_size : int
+    estimated_seconds : float
+    seconds : float
+
+
+class HybridPlayer(Player):
+    """Player choosing, for every move, the search that fits a target latency: ExpectiMinimax or MonteCarlo
+
+    The cost of each engine is estimated from the position:
+    - ExpectiMinimax, per depth: from our legal moves, the unseen tiles matching an open end (the opponent's choices)
+      and the turns left before a hand is empty (how deep the tree can grow)
+    - MonteCarlo: the iterations times the cost of a rollout, from the tiles left in both hands and the boneyard
+    The models are fitted on measured searches by fit_cost_models (python HybridPlayer.py fit); after every search
+    the estimate is corrected towards the time measured, so that they adapt to the machine and to the options of the
+    engines.
+
+    ExpectiMinimax is used at the deepest depth that fits when that depth is at least min_depth, otherwise MonteCarlo
+    with the most iterations that fit (at least min_iterations), otherwise ExpectiMinimax at the deepest depth that
+    fits (at least depth 1). Every decision is kept in engine_log.
+    """
+
+    # Cost model of ExpectiMinimax, per depth: log(seconds) = intercept + a * log(legal moves) + b * log(1 + unseen tiles
+    # matching an end) + c * turns left (before a hand is empty), followed by the standard deviation of the log of the
+    # measured / estimated seconds. Fitted by fit_cost_models on a few hundred positions: run it again (python
+    # HybridPlayer.py fit) and paste its output here after a change to the cost of the searches
+    EXPECTIMINIMAX_COST = {
+        1: (-9.49, 0.73, 0.01, 0.00, 0.19),
+        2: (-9.56, 0.91, 0.25, 0.04, 0.24),
+        3: (-9.15, 1.24, 0.34, 0.25, 0.36),
+        4: (-9.03, 1.32, 0.41, 0.36, 0.44),
+        5: (-8.81, 1.51, 0.40, 0.49, 0.56),
+        6: (-9.49, 1.74, 0.50, 0.83, 0.78),
+        7: (-9.93, 1.90, 0.49, 1.06, 0.90),
+        8: (-10.50, 2.08, 0.34, 1.41, 1.05),
+    }
+    # Cost model of MonteCarlo: log(seconds per iteration) = intercept + a * log(tiles left in play), and its deviation
+    # (also fitted by fit_cost_models)
+    MONTECARLO_COST = (-13.90, 1.79, 0.32)
+    # Weight of a new measurement in the corrections of the models
+    RATE_UPDATE = 0.3
+
+    def __init__(self, name : str = "Hybrid", target_latency : float = 0.5, min_depth : int = 5, max_depth : int = 8, min_iterations : int = 100, max_iterations : int = 20000, expectiminimax_options : dict | None = None, montecarlo_options : dict | None = None, verbose : bool = False):
+        """Init Function for the hybrid player
+
+        Args:
+            name (str, optional): Name of the player. Defaults to "Hybrid".
+            target_latency (float, optional): Seconds a move should take. Defaults to 0.5.
+            min_depth (int, optional): Shallowest ExpectiMinimax search preferred to MonteCarlo. Defaults to 5.
+            max_depth (int, optional): Deepest ExpectiMinimax search. Defaults to 8.
+            min_iterations (int, optional): Fewest MonteCarlo iterations preferred to a shallow ExpectiMinimax search. Defaults to 100.
+            max_iterations (int, optional): Most MonteCarlo iterations. Defaults to 20000.
+            expectiminimax_options (dict | None, optional): Other options of the ExpectiMinimax searches (e.g. endgame_tiles). Defaults to None.
+            montecarlo_options (dict | None, optional): Other options of the MonteCarlo searches (e.g. c, rave). Defaults to None.
+            verbose (bool, optional): Print the engine used for every move. Defaults to False.
+        """
+        super().__init__(name)
+        self.target_latency = target_latency
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.min_iterations = min_iterations
+        self.max_iterations = max_iterations
+        self.expectiminimax_options = expectiminimax_options or {}
+        self.montecarlo_options = montecarlo_options or {}
+        self.verbose = verbose
+
+        # Corrections of the cost models (log of measured / estimated seconds), updated after every search
+        self.expectiminimax_offsets = {depth: 0.0 for depth in self.EXPECTIMINIMAX_COST}
+        self.montecarlo_offset = 0.0
+
+        # Engines built so far, one per depth / iteration count (the iterations are min_iterations times a power
+        # of two, so that few of them are built)
+        self.engines : dict[tuple[str, int], Player] = {}
+
+        # Engine used for every move (see EngineChoice)
+        self.engine_log : list[EngineChoice] = []
+        self.last_value = None
+
+    def set_domino_set(self, domino_set : DominoSet):
+        super().set_domino_set(domino_set)
+        for engine in self.engines.values():
+            engine.set_domino_set(domino_set)
+
+    def engine(self, kind : str, setting : int) -> Player:
+        # Engine searching with a depth / iterations, sharing our hand and what we observed of the opponent
+        engine = self.engines.get((kind, setting))
+        if engine is None:
+            if kind == "expectiminimax":
+                engine = ExpectiMinimaxPlayer(self.name, depth=setting, **self.expectiminimax_options)
+            else:
+                engine = MonteCarloPlayer(self.name, n=setting, **self.montecarlo_options)
+            engine.set_domino_set(self.domino_set)
+            self.engines[(kind, setting)] = engine
+        engine.hand = self.hand
+        engine.opponent_model = self.opponent_model
+        return engine
+
+    def features(self, board : Board, boneyard_size : int) -> tuple[int, int, int]:
+        """Position features the costs are estimated from
+
+        Returns:
+            tuple[int, int, int]: Unseen tiles the opponent can hold, how many of them match an open end, and the opponent's hand size
+        """
+        board_tiles = board.get_board_tiles()
+        unseen = self.opponent_model.unseen_tiles(board_tiles)
+        if unseen is None:
+            seen = set(board_tiles) | {(b, a) for a, b in board_tiles} | set(self.hand) | {(b, a) for a, b in self.hand}
+            unseen = [tile for tile in self.domino_set.tiles if tile not in seen]
+        unseen = self.opponent_model.possible_tiles(unseen) or unseen
+        tails = board.get_tails()
+        playable = sum(1 for tile in unseen if tails[0] in tile or tails[-1] in tile) if tails else len(unseen)
+        opponent_tiles = self.domino_set.number_of_tiles - len(board_tiles) - boneyard_size - len(self.hand)
+        return len(unseen), playable, opponent_tiles
+
+    def expectiminimax_seconds(self, depth : int, legal_moves : int, playable : int, moves_left : int) -> float:
+        # Estimated seconds of an ExpectiMinimax search (see EXPECTIMINIMAX_COST)
+        intercept, moves_exponent, playable_exponent, moves_left_factor, _ = self.EXPECTIMINIMAX_COST[depth]
+        return math.exp(intercept + self.expectiminimax_offsets[depth] + moves_exponent * math.log(legal_moves)
+                        + playable_exponent * math.log(1 + playable) + moves_left_factor * moves_left)
+
+    def montecarlo_seconds(self, iterations : int, boneyard_size : int, moves_left : int) -> float:
+        # Estimated seconds of a MonteCarlo search (see MONTECARLO_COST): iterations times the cost of a rollout,
+        # which grows with the tiles left to play
+        intercept, tiles_exponent, _ = self.MONTECARLO_COST
+        tiles = len(self.hand) + moves_left + boneyard_size
+        return iterations * math.exp(intercept + self.montecarlo_offset + tiles_exponent * math.log(tiles))
+
+    def plan(self, board : Board, boneyard_size : int, moves : list[Move]) -> tuple[str, int, float, int]:
+        """Choose the engine and its setting for the position
+
+        Returns:
+            tuple[str, int, float, int]: Engine, depth or iterations, estimated seconds, and unseen tiles
+        """
+        unseen, playable, opponent_tiles = self.features(board, boneyard_size)
+        # Turns left before a hand is empty, the strongest predictor of the tree size
+        moves_left = min(len(self.hand), opponent_tiles)
+
+        # A setting fits when its estimate is below the target with one deviation to spare (about 5 positions out of 6),
+        # since the deepest searches occasionally take many times their estimate
+
+        # Deepest ExpectiMinimax search that fits
+        depth, depth_seconds = 1, self.expectiminimax_seconds(1, len(moves), playable, moves_left)
+        for d in range(2, min(self.max_depth, max(self.EXPECTIMINIMAX_COST)) + 1):
+            seconds = self.expectiminimax_seconds(d, len(moves), playable, moves_left)
+            if seconds * math.exp(self.EXPECTIMINIMAX_COST[d][-1]) > self.target_latency:
+                break
+            depth, depth_seconds = d, seconds
+        if depth >= self.min_depth:
+            return "expectiminimax", depth, depth_seconds, unseen
+
+        # Most MonteCarlo iterations that fit (min_iterations times a power of two)
+        budget = self.target_latency / math.exp(self.MONTECARLO_COST[-1])
+        iterations = self.min_iterations
+        if self.montecarlo_seconds(iterations, boneyard_size, moves_left) <= budget:
+            while iterations * 2 <= self.max_iterations and self.montecarlo_seconds(iterations * 2, boneyard_size, moves_left) <= budget:
+                iterations *= 2
+            return "montecarlo", iterations, self.montecarlo_seconds(iterations, boneyard_size, moves_left), unseen
+        return "expectiminimax", depth, depth_seconds, unseen
+
+    def correction(self, offset : float, estimate : float, seconds : float) -> float:
+        # Move a correction (log of the ratio of measured to estimated seconds) towards the last measurement
+        if estimate <= 0 or seconds <= 0:
+            return offset
+        return offset + self.RATE_UPDATE * (math.log(seconds) - math.log(estimate))
+
+    def move(self, board : Board, boneyard_size : int) -> Move | None:
+        moves = self.possible_moves(board)
+        if len(moves) <= 1:
+            # Nothing to search
+            self.last_value = None
+            if moves:
+                self.log(EngineChoice("forced", 0, 1, 0, boneyard_size, len(self.hand), 0.0, 0.0))
+            return moves[0] if moves else None
+
+        kind, setting, estimate, unseen = self.plan(board, boneyard_size, moves)
+        engine = self.engine(kind, setting)
+        start = perf_counter()
+        move = engine.move(board, boneyard_size)
+        seconds = perf_counter() - start
+        self.last_value = getattr(engine, "last_value", None)
+
+        # Learn from the time taken (searches answered from a book or cache say nothing about the cost)
+        if kind == "expectiminimax" and engine.nodes_searched > 0:
+            self.expectiminimax_offsets[setting] = self.correction(self.expectiminimax_offsets[setting], estimate, seconds)
+        elif kind == "montecarlo" and seconds > 0.2 * estimate:
+            self.montecarlo_offset = self.correction(self.montecarlo_offset, estimate, seconds)
+
+        self.log(EngineChoice(kind, setting, len(moves), unseen, boneyard_size, len(self.hand), estimate, seconds))
+        return move
+
+    def log(self, choice : EngineChoice):
+        # Keep (and optionally print) the engine used for a move
+        self.engine_log.append(choice)
+        if self.verbose:
+            setting = f"depth {choice.setting}" if choice.engine == "expectiminimax" else f"{choice.setting} iterations" if choice.engine == "montecarlo" else ""
+            print(f"{self.name}: {choice.engine} {setting} ({choice.legal_moves} moves, {choice.unseen} unseen, boneyard {choice.boneyard_size}, "
+                  f"hand {choice.hand_size}) estimated {choice.estimated_seconds:.3f}s, took {choice.seconds:.3f}s")
+
+    def engine_usage(self) -> dict[str, int]:
+        """Number of moves played by each engine (and setting) so far
+
+        Returns:
+            dict[str, int]: Moves per engine, e.g. {"expectiminimax depth 6": 12, "montecarlo 800": 3, "forced": 9}
+        """
+        usage : dict[str, int] = {}
+        for choice in self.engine_log:
+            key = choice.engine if choice.engine == "forced" else f"{choice.engine} {'depth ' if choice.engine == 'expectiminimax' else ''}{choice.setting}"
+            usage[key] = usage.get(key, 0) + 1
+        return usage
+
+
+def sample_positions(count : int, seed : int = 0) -> list[tuple[list, Board, int]]:
+    """Positions from random play, at every stage of a round, with at least two legal moves
+
+    Args:
+        count (int): Number of dealt rounds (positions without two legal moves are left out)
+        seed (int, optional): Seed of the first round. Defaults to 0.
+
+    Returns:
+        list[tuple[list[Domino], Board, int]]: Hand of the player to move, board and boneyard size
+    """
+    positions = []
+    for round_seed in range(seed, seed + count):
+        random.seed(round_seed)
+        boneyard = Boneyard()
+        board = Board()
+        players = [Player(), Player()]
+        for player in players:
+            player.set_hand(boneyard.generate_random_hand())
+        board.add_to_board((players[1].hand.pop(), 0))
+        # Random moves by both players, fewer or more turns depending on the round
+        for _ in range(round_seed % 6):
+            for player in players:
+                moves = player.possible_moves(board)
+                while not moves and boneyard.boneyard:
+                    player.add_hand(boneyard.generate_random_tile())
+                    moves = player.possible_moves(board)
+                if moves:
+                    move = random.choice(moves)
+                    board.add_to_board(move)
+                    player.use_tile(move[0])
+        if players[0].hand and players[1].hand and len(players[0].possible_moves(board)) >= 2:
+            positions.append((list(players[0].hand), board, len(boneyard.boneyard)))
+    return positions
+
+
+def fit_cost_models(positions : int = 300, seed : int = 0, max_seconds : float = 1.5, iterations : int = 400,
+                    expectiminimax_options : dict | None = None, montecarlo_options : dict | None = None) -> tuple[dict[int, tuple], tuple]:
+    """Measure searches and fit the cost models of HybridPlayer (EXPECTIMINIMAX_COST and MONTECARLO_COST)
+
+    Every position is searched by ExpectiMinimax at depths 1 to 8 (deeper ones are skipped once a search takes more
+    than max_seconds) and by MonteCarlo, and the models are fitted by least squares on the log of the seconds.
+
+    Args:
+        positions (int, optional): Number of dealt rounds the positions are sampled from. Defaults to 300.
+        seed (int, optional): Seed of the positions. Defaults to 0.
+        max_seconds (float, optional): Longest ExpectiMinimax search before the deeper ones are skipped. Defaults to 1.5.
+        iterations (int, optional): Iterations of the MonteCarlo searches. Defaults to 400.
+        expectiminimax_options (dict | None, optional): Options of the ExpectiMinimax searches. Defaults to None.
+        montecarlo_options (dict | None, optional): Options of the MonteCarlo searches. Defaults to None.
+
+    Returns:
+        tuple[dict[int, tuple], tuple]: Coefficients of EXPECTIMINIMAX_COST (by depth) and of MONTECARLO_COST
+    """
+    import numpy as np
+    expectiminimax_rows = {depth: ([], []) for depth in HybridPlayer.EXPECTIMINIMAX_COST}
+    montecarlo_rows = ([], [])
+    for hand, board, boneyard_size in sample_positions(positions, seed):
+        # Same features as HybridPlayer.plan
+        hybrid = HybridPlayer()
+        hybrid.set_hand(list(hand))
+        legal_moves = len(hybrid.possible_moves(board))
+        _, playable, opponent_tiles = hybrid.features(board, boneyard_size)
+        moves_left = min(len(hand), opponent_tiles)
+
+        for depth, (features, seconds) in expectiminimax_rows.items():
+            engine = ExpectiMinimaxPlayer(depth=depth, **(expectiminimax_options or {}))
+            engine.set_hand(list(hand))
+            start = perf_counter()
+            engine.move(board, boneyard_size)
+            features.append([1, math.log(legal_moves), math.log(1 + playable), moves_left])
+            seconds.append(perf_counter() - start)
+            if seconds[-1] > max_seconds:
+                break
+
+        engine = MonteCarloPlayer(n=iterations, **(montecarlo_options or {}))
+        engine.set_hand(list(hand))
+        start = perf_counter()
+        engine.move(board, boneyard_size)
+        montecarlo_rows[0].append([1, math.log(len(hand) + moves_left + boneyard_size)])
+        montecarlo_rows[1].append((perf_counter() - start) / iterations)
+
+    def least_squares(features : list, seconds : list) -> tuple:
+        # Coefficients of the log of the seconds, then the standard deviation of the residuals
+        X, y = np.array(features), np.log(np.array(seconds))
+        coefficients = np.linalg.lstsq(X, y, rcond=None)[0]
+        return tuple(round(float(value), 2) + 0.0 for value in coefficients) + (round(float((y - X @ coefficients).std()), 2),)
+
+    expectiminimax_cost = {depth: least_squares(*rows) for depth, rows in expectiminimax_rows.items() if len(rows[1]) >= 10}
+    return expectiminimax_cost, least_squares(*montecarlo_rows)
+
+
+if __name__ == "__main__":
+    # Usage: python HybridPlayer.py fit [rounds] prints the cost models fitted on this machine, to paste into HybridPlayer
+    # Without arguments, runs the testing section
+    if len(sys.argv) > 1 and sys.argv[1] == "fit":
+        expectiminimax_cost, montecarlo_cost = fit_cost_models(int(sys.argv[2]) if len(sys.argv) > 2 else 300)
+        print("    EXPECTIMINIMAX_COST = {")
+        for depth, coefficients in expectiminimax_cost.items():
+            print(f"        {depth}: ({', '.join(f'{value:.2f}' for value in coefficients)}),")
+        print("    }")
+        print(f"    MONTECARLO_COST = ({', '.join(f'{value:.2f}' for value in montecarlo_cost)})")
+    else:
+        # Testing Section
+        from Match import Match
+        import statistics
+
+        print("------------------------")
+        print("Testing HybridPlayer Class (vs ExpectiMinimax depth 4, 30 rounds per target latency)")
+        for target in [0.05, 0.2, 0.5]:
+            random.seed(0)
+            hybrid = HybridPlayer(target_latency=target)
+            m = Match(hybrid, ExpectiMinimaxPlayer(name="ExpectiMinimax"), False)
+            wins = 0
+            for _ in range(30):
+                result, _, _ = m.play()
+                wins += result == hybrid.name
+            searched = [choice for choice in hybrid.engine_log if choice.engine != "forced"]
+            times = [choice.seconds for choice in searched]
+            over = sum(seconds > 2 * target for seconds in times)
+            print(f"Target {target}s: won {wins}/30, move time median {statistics.median(times):.3f}s, p90 {statistics.quantiles(times, n=10)[-1]:.3f}s, "
+                  f"max {max(times):.3f}s, {over}/{len(times)} over twice the target")
+            print(f"  engines: {hybrid.engine_usage()}")
+        print("------------------------")
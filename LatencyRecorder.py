@@ -0,0 +1,200 @@
+import math
+
+
+class LatencyHistogram():
+    """Constant memory histogram of latencies (HDR-style log-linear buckets)
+
+    Latencies are recorded in nanoseconds. Values below 2 * SUB_BUCKETS ns get their own bucket,
+    larger values share buckets of relative width at most 1 / SUB_BUCKETS, so percentiles are
+    within 0.4% of the exact value whatever the number of samples. Count, sum, sum of squares,
+    min and max are kept exactly.
+    """
+
+    SUB_BITS = 7
+    SUB_BUCKETS = 1 << SUB_BITS
+
+    def __init__(self):
+        # Number of samples per bucket index
+        self.counts : dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    @classmethod
+    def bucket(cls, nanoseconds : int) -> int:
+        # Bucket index of a latency
+        if nanoseconds < 2 * cls.SUB_BUCKETS:
+            return nanoseconds
+        shift = nanoseconds.bit_length() - cls.SUB_BITS - 1
+        return ((shift + 1) << cls.SUB_BITS) + (nanoseconds >> shift) - cls.SUB_BUCKETS
+
+    @classmethod
+    def bucket_value(cls, index : int) -> float:
+        # Midpoint (in seconds) of the latencies of a bucket
+        if index < 2 * cls.SUB_BUCKETS:
+            return index / 1e9
+        shift = (index >> cls.SUB_BITS) - 1
+        lowest = ((index & (cls.SUB_BUCKETS - 1)) + cls.SUB_BUCKETS) << shift
+        return (lowest + ((1 << shift) - 1) / 2) / 1e9
+
+    def record(self, seconds : float):
+        """Add a latency
+
+        Args:
+            seconds (float): Latency in seconds
+        """
+        index = self.bucket(max(0, int(seconds * 1e9)))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.total_squares += seconds * seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def merge(self, other : 'LatencyHistogram'):
+        """Add the samples of another histogram (e.g. from a parallel worker)
+
+        Args:
+            other (LatencyHistogram): Histogram to merge into this one
+        """
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.total_squares += other.total_squares
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def std(self) -> float:
+        if not self.count:
+            return 0.0
+        return math.sqrt(max(0.0, self.total_squares / self.count - self.mean() ** 2))
+
+    def percentile(self, q : float) -> float:
+        """Latency below which a fraction q of the samples fall
+
+        Args:
+            q (float): Fraction between 0 and 1 (e.g. 0.99 for p99)
+
+        Returns:
+            float: Latency in seconds (0 without samples)
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(self.bucket_value(index), self.min), self.max)
+        return self.max
+
+    def stats(self) -> dict:
+        """Summary of the histogram
+
+        Returns:
+            dict: Count, mean, std, min, max and p50/p90/p99/p99.9 in seconds
+        """
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "std": self.std(),
+            "max": self.max,
+            "min": self.min if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "p99.9": self.percentile(0.999),
+        }
+
+
+class LatencyRecorder():
+    """Move latencies of one agent, overall and per phase of the round
+
+    The phase of a move is given by the size of the boneyard when it is made: early moves
+    (large boneyard) search shallow trees, endgame moves (empty boneyard) are fully informed.
+    """
+
+    # Phase of a round by smallest boneyard size
+    PHASES = [(10, "boneyard_10+"), (5, "boneyard_5-9"), (1, "boneyard_1-4"), (0, "boneyard_0")]
+
+    def __init__(self):
+        self.total = LatencyHistogram()
+        self.phases : dict[str, LatencyHistogram] = {name: LatencyHistogram() for _, name in self.PHASES}
+
+    @classmethod
+    def phase(cls, boneyard_size : int) -> str:
+        # Phase of a round with boneyard_size tiles in the boneyard
+        for smallest, name in cls.PHASES:
+            if boneyard_size >= smallest:
+                return name
+        return cls.PHASES[-1][1]
+
+    def record(self, seconds : float, boneyard_size : int):
+        """Add the latency of a move
+
+        Args:
+            seconds (float): Time taken by the move
+            boneyard_size (int): Number of tiles in the boneyard when the move started
+        """
+        self.total.record(seconds)
+        self.phases[self.phase(boneyard_size)].record(seconds)
+
+    def merge(self, other : 'LatencyRecorder'):
+        """Add the latencies of another recorder (e.g. another game or a parallel worker)
+
+        Args:
+            other (LatencyRecorder): Recorder to merge into this one
+        """
+        self.total.merge(other.total)
+        for name, histogram in other.phases.items():
+            self.phases[name].merge(histogram)
+
+    def stats(self) -> dict:
+        """Summary of the latencies
+
+        Returns:
+            dict: Overall statistics, with the statistics of every phase under "phases"
+        """
+        stats = self.total.stats()
+        stats["phases"] = {name: histogram.stats() for name, histogram in self.phases.items()}
+        return stats
+
+
+if __name__ == "__main__":
+    # Testing Section
+    import random
+    import statistics
+    import time
+
+    print("------------------------")
+    print("Testing LatencyRecorder Class (percentiles against exact values)")
+    rng = random.Random(0)
+    samples = [rng.lognormvariate(-5, 1.5) for _ in range(200000)]
+    histogram = LatencyHistogram()
+    halves = [LatencyHistogram(), LatencyHistogram()]
+    for i, sample in enumerate(samples):
+        histogram.record(sample)
+        halves[i % 2].record(sample)
+    halves[0].merge(halves[1])
+
+    ordered = sorted(samples)
+    for q in [0.5, 0.9, 0.99, 0.999]:
+        exact = ordered[math.ceil(q * len(ordered)) - 1]
+        estimate = histogram.percentile(q)
+        print(f"p{q * 100:g}: exact {exact * 1000:.4f}ms, histogram {estimate * 1000:.4f}ms ({abs(estimate - exact) / exact:.3%} error), merged {halves[0].percentile(q) * 1000:.4f}ms")
+    print(f"Mean {histogram.mean():.6f}s (exact {statistics.fmean(samples):.6f}s), std {histogram.std():.6f}s (exact {statistics.pstdev(samples):.6f}s)")
+    print(f"{len(histogram.counts)} buckets for {histogram.count} samples")
+
+    start = time.perf_counter()
+    recorder = LatencyRecorder()
+    for i, sample in enumerate(samples):
+        recorder.record(sample, i % 15)
+    print(f"Recording: {(time.perf_counter() - start) / len(samples) * 1e9:.0f}ns per sample")
+    print({name: stats["count"] for name, stats in recorder.stats()["phases"].items()})
+    print("------------------------")
@@ -1,11 +1,11 @@
-from game_types import Domino, Tail, Move
+from game_types import Domino, Tail, Move, MatchEvent, RoundStarted, TilePlaced, Drew, Passed, RoundEnded, DominoSet, DOUBLE_SIX, DOUBLE_NINE, DOUBLE_TWELVE, HAND_SIZE
 from Boneyard import Boneyard
 from Player import Player
 from Board import Board
-from HumanPlayer import HumanPlayer
-from MonteCarloPlayer import MonteCarloPlayer
-from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer
-from time import time
+from LatencyRecorder import LatencyRecorder
+from Profiler import Profiler
+from GameRecord import GameRecordWriter, TIE
+from time import perf_counter
 
 class Match(): 
     """Class to represent a match between two agents/players
@@ -23,12 +23,30 @@ class Match():
     """
 
     # Initialization of a match
-    def __init__(self, player_1: Player, player_2: Player, display : bool = True):
+    def __init__(self, player_1: Player, player_2: Player, display : bool = True, profiler : Profiler | None = None, recorder : GameRecordWriter | None = None,
+                 domino_set : DominoSet = DOUBLE_SIX, hand_size : int = HAND_SIZE, score_to_win : int = 200):
         self.player_1 = player_1
         self.player_2 = player_2
+        # Domino set (double-6, double-9, double-12...), tiles dealt to each player, and points needed to win the game
+        self.domino_set = domino_set
+        self.hand_size = hand_size
+        self.score_to_win = score_to_win
+        if 2 * hand_size >= domino_set.number_of_tiles:
+            raise ValueError(f"Hands of {hand_size} tiles do not fit in a {domino_set.name} set")
         self.board = Board()
-        self.boneyard = Boneyard()
+        self.boneyard = Boneyard(domino_set)
         self.display = display
+        # Optional profiler, charging each turn to the player and the rest to "Match"
+        self.profiler = profiler
+        # Optional binary log of the rounds (deal, moves, draws, passes and turn times)
+        self.recorder = recorder
+
+        # Observers of the match events (both players, plus any subscriber)
+        self.observers = [player_1, player_2]
+
+        # Move latencies of each player, across all the rounds of the match
+        self.latency_1 = LatencyRecorder()
+        self.latency_2 = LatencyRecorder()
 
         # Check names, and make them unique
         if player_1.name == player_2.name:
@@ -54,33 +72,37 @@ class Match():
 
         return double_count < 5
     
-    def play(self):
-        """Game Rules and executing the game
+    def deal(self) -> tuple[Player, Player]:
+        """Start a round: deal valid hands and place the starting tile
+
+        Returns:
+            tuple[Player, Player]: The player who placed the starting tile, and the player who moves next
         """
         # Initialize the board and boneyard
         self.board = Board()
-        self.boneyard = Boneyard()
+        self.boneyard = Boneyard(self.domino_set)
 
         # Each player is dealt a hand
-        self.player_1.set_hand(self.boneyard.generate_random_hand())
-        self.player_2.set_hand(self.boneyard.generate_random_hand())
+        self.player_1.set_hand(self.boneyard.generate_random_hand(self.hand_size))
+        self.player_2.set_hand(self.boneyard.generate_random_hand(self.hand_size))
 
         # Repeat until hands are valid
         while not self.valid_hands():
             self.boneyard.restart_boneyard()
-            self.player_1.set_hand(self.boneyard.generate_random_hand())
-            self.player_2.set_hand(self.boneyard.generate_random_hand())
+            self.player_1.set_hand(self.boneyard.generate_random_hand(self.hand_size))
+            self.player_2.set_hand(self.boneyard.generate_random_hand(self.hand_size))
+
+        if self.recorder:
+            self.recorder.start_round((self.player_1.name, self.player_2.name), self.player_1.get_hand(), self.player_2.get_hand(), self.domino_set)
+        self.publish(RoundStarted((self.player_1.name, self.player_2.name), len(self.player_1.get_hand()), len(self.boneyard.boneyard), self.domino_set.max_pip))
 
         # The player with the highest double starts
         # If no player has a double, then the highest numbered
         # Tile goes first
         # Conversation is allowed to find out who is first
 
-        # Order of domino tiles (which tile goes first)
-        priority_order : list[Domino] = [(0, 0), (0, 1), (0, 2), (0, 3), (0, 4), (0, 5), (0, 6), (1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6), (2, 2), (2, 3), (2, 4), (2, 5), (2, 6), (3, 3), (3, 4), (3, 5), (3, 6), (4, 4), (4, 5), (4, 6), (5, 5), (5, 6), (6, 6)]
-        
-        # Ordering list according to priority rules
-        priority_order.sort(key = lambda tile: (tile[0] + tile[-1]) + (100 if tile[0] == tile[-1] else 1), reverse=True)
+        # Order of domino tiles (which tile goes first), according to priority rules
+        priority_order : list[Domino] = self.domino_set.priority_order
 
         # Determine who goes first
         first_player = self.player_1
@@ -104,6 +126,24 @@ class Match():
         
         # Make the first move
         self.take_move(first_player, (starting_tile, 0))
+
+        return first_player, second_player
+
+    def game_over(self) -> bool:
+        # The game ends when a player reaches score_to_win points
+        return self.player_1.score >= self.score_to_win or self.player_2.score >= self.score_to_win
+
+    def play(self):
+        """Game Rules and executing the game
+        """
+        if self.profiler:
+            with self.profiler.profile("Match"):
+                return self.play_round()
+        return self.play_round()
+
+    def play_round(self):
+        # Play a round (see play)
+        first_player, second_player = self.deal()
         
         # Time Stats
         first_player_times = []
@@ -112,9 +152,7 @@ class Match():
         # Start the game
         while not self.terminal_state():
             # Second player takes a move
-            second_time = time()
-            self.take_turn(second_player)
-            second_player_times.append(time() - second_time)
+            second_player_times.append(self.timed_turn(second_player))
 
             # Display board
             if self.display:
@@ -125,14 +163,20 @@ class Match():
                 break
 
             # First player takes a move
-            first_time = time()
-            self.take_turn(first_player)
-            first_player_times.append(time() - first_time)
+            first_player_times.append(self.timed_turn(first_player))
 
             # Display board
             if self.display:
                 self.board.print_board()
 
+        return self.end_round(first_player, second_player, first_player_times, second_player_times)
+
+    def end_round(self, first_player : Player, second_player : Player, first_player_times : list[float], second_player_times : list[float]):
+        """Score the finished round
+
+        Returns:
+            tuple[str, list[float], list[float]]: Name of the winner (or "Tie"), and the turn times of player 1 and player 2
+        """
         # The winner is the player with the empty and or with the lowest hand score
         # If both players have the same hand score, then it's a tie
         # If a player wins, then the score of the other player is added to their total score
@@ -141,6 +185,9 @@ class Match():
         if p1_score < p2_score:
             # First player wins
             first_player.add_score(p2_score)
+            if self.recorder:
+                self.recorder.end_round(self.index_of(first_player), p2_score)
+            self.publish(RoundEnded(first_player.name, p2_score))
             if self.display:
                 # Show winner and current scores
                 print(f"Match Over: {first_player.name} wins")
@@ -154,6 +201,9 @@ class Match():
         elif p2_score < p1_score:
             # Second player wins
             second_player.add_score(p1_score)
+            if self.recorder:
+                self.recorder.end_round(self.index_of(second_player), p1_score)
+            self.publish(RoundEnded(second_player.name, p1_score))
             if self.display:
                 print(f"Match Over: {second_player.name} wins")
                 print(f"Current Scores -> {first_player.name} : {first_player.score} | {second_player.name} : {second_player.score}")
@@ -164,6 +214,9 @@ class Match():
                 return second_player.name, first_player_times, second_player_times
         else:
             # Tie
+            if self.recorder:
+                self.recorder.end_round(TIE, 0)
+            self.publish(RoundEnded(None, 0))
             if self.display:
                 print("Match Over: Tie")
             
@@ -172,6 +225,26 @@ class Match():
             else:
                 return "Tie", second_player_times, first_player_times
     
+    def timed_turn(self, player : Player) -> float:
+        """Take a turn and record its latency (with a monotonic high resolution clock)
+
+        Returns:
+            float: Time taken by the turn in seconds
+        """
+        boneyard_size = len(self.boneyard.boneyard)
+        start = perf_counter()
+        if self.profiler:
+            with self.profiler.profile(player.name):
+                self.take_turn(player)
+        else:
+            self.take_turn(player)
+        elapsed = perf_counter() - start
+        latency = self.latency_1 if player is self.player_1 else self.latency_2
+        latency.record(elapsed, boneyard_size)
+        if self.recorder:
+            self.recorder.time(self.index_of(player), elapsed)
+        return elapsed
+
     def take_turn(self, player : Player):
         # Choose a move
         move = player.move(self.board, len(self.boneyard.boneyard))
@@ -181,26 +254,67 @@ class Match():
             # Then take the move
             self.take_move(player, move)     
         else:
+            tails = self.board.get_tails()
+
             # If no possible move and the boneyard is not empty
             # Then add new tile from boneyard and check again
             while not self.boneyard.is_boneyard_empty() and move == None:
-                new_tile = self.boneyard.generate_random_tile()
-                player.add_hand(new_tile)
+                self.draw_tile(player, tails)
                 move = player.move(self.board, len(self.boneyard.boneyard))
             
             if move:
                 # If possible move, then take it
                 self.take_move(player, move) 
             else:
-                # Pass
-                if self.display:
-                    print("No possible moves and empty boneyard")
+                self.pass_turn(player, tails)
+
+    def draw_tile(self, player : Player, tails : tuple[int, int]):
+        # Draw a tile from the boneyard (the player had no tile matching the tails)
+        new_tile = self.boneyard.generate_random_tile()
+        player.add_hand(new_tile)
+        if self.recorder:
+            self.recorder.draw(self.index_of(player), new_tile)
+        for observer in self.observers:
+            # The drawn tile is only revealed to the player who drew it
+            observer.observe(Drew(player.name, new_tile if observer is player else None, tails, len(self.boneyard.boneyard)))
+
+    def pass_turn(self, player : Player, tails : tuple[int, int]):
+        # Pass: no tile matching the tails and an empty boneyard
+        if self.recorder:
+            self.recorder.passed(self.index_of(player))
+        self.publish(Passed(player.name, tails))
+        if self.display:
+            print("No possible moves and empty boneyard")
 
     
+    def opponent_of(self, player : Player) -> Player:
+        # The other player of the match
+        return self.player_2 if player is self.player_1 else self.player_1
+
+    def subscribe(self, observer):
+        """Subscribe an observer to the match events
+
+        Args:
+            observer: Object with an observe(event) method
+        """
+        self.observers.append(observer)
+
+    def publish(self, event : MatchEvent):
+        # Send an event to every observer
+        for observer in self.observers:
+            observer.observe(event)
+
+    def index_of(self, player : Player) -> int:
+        # 0 for player 1, 1 for player 2
+        return 0 if player is self.player_1 else 1
+
     def take_move(self, player : Player, move : Move):
         # Taking a move implies:
         self.board.add_to_board(move) # Adding tile to the board
         player.use_tile(move[0]) #Removing tile from hand
+        if self.recorder:
+            self.recorder.move(self.index_of(player), move)
+        self.publish(TilePlaced(player.name, move[0], move[1]))
 
     def terminal_state(self) -> bool:
         if len(self.player_1.get_hand()) == 0 or len(self.player_2.get_hand()) == 0:
@@ -216,6 +330,9 @@ class Match():
 
 # Testing Section   
 if __name__ == "__main__":
+    from HumanPlayer import HumanPlayer
+    from MonteCarloPlayer import MonteCarloPlayer
+    from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer
     print("------------------------")
     print("Testing Match Class")
     test_number = int(input("Test #: "))
@@ -484,4 +601,17 @@ if __name__ == "__main__":
         print(f"P1 Game Winning Ratio: {p1_game / games} after playing {games} games")
         print(f"P2 Game Winning Ratio: {p2_game / games} after playing {games} games")
 
+    if test_number == 11:
+        # Per-move cost of each agent with larger domino sets (against a random player)
+        import random
+        rounds = 3
+        for domino_set in [DOUBLE_SIX, DOUBLE_NINE, DOUBLE_TWELVE]:
+            for agent in [Player(), ExpectiMinimaxPlayer(depth=3), MonteCarloPlayer(n=100)]:
+                random.seed(0)
+                m = Match(agent, Player("Random"), False, domino_set=domino_set)
+                for _ in range(rounds):
+                    m.play()
+                latency = m.latency_1.total
+                print(f"{domino_set.name} ({domino_set.number_of_tiles} tiles) {agent.name}: {latency.count} moves, mean = {latency.mean():.4f}s, p90 = {latency.percentile(0.9):.4f}s")
+
     print("------------------------")
\ No newline at end of file
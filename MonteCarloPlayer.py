@@ -1,12 +1,18 @@
 from Player import Player
 from Board import Board
 from Boneyard import Boneyard
-from game_types import Domino, Move, NUMBER_OF_TILES, ALL_TILES
-from copy import deepcopy
+from EndgameSolver import EndgameSolver
+from Tablebase import Tablebase
+from PositionCache import PositionCache, position_key
+from OpeningBook import OpeningBook
+from Ponderer import Ponderer
+from RolloutPolicy import RolloutPolicy
+from functools import partial
+from game_types import Domino, Move, DominoSet, DOUBLE_SIX
 from itertools import combinations
+from math import comb, log, sqrt
 import random
 from typing import Literal, Self
-import numpy as np
 
 # Describe a state in the game
 class State():
@@ -19,11 +25,21 @@ class State():
         self.boneyard : Boneyard = boneyard
         self.board : Board = board
 
-    def transition(self, move : Move | None) -> Self:
+    def copy(self) -> Self:
+        # Copy of the state (hands, boneyard and board), much cheaper than a deepcopy
+        new_state = State.__new__(State)
+        new_state.player = self.player.copy()
+        new_state.opponent = self.opponent.copy()
+        new_state.boneyard = self.boneyard.copy()
+        new_state.board = self.board.copy()
+        return new_state
+
+    def transition(self, move : Move | None, policy : RolloutPolicy | None = None) -> Self:
         # Return updated state based on the move
+        # (the opponent's reply is random, or chosen by the rollout policy if given)
 
         # Based on a copy of the current state
-        new_state = deepcopy(self)
+        new_state = self.copy()
 
         # Handling PASS condition (Move = 0) (No move, and empty boneyard)
         if move != 0:
@@ -42,8 +58,8 @@ class State():
             # The opponent moves if the players makes a move or passes
             op_actions = new_state.opponent.possible_moves(new_state.board)
             if len(op_actions) > 0:
-                # Random move
-                op_action = random.choice(op_actions)
+                # Random move (or the rollout policy's)
+                op_action = policy.choose(op_actions, new_state.board, new_state.opponent.hand, new_state.player.hand) if policy else random.choice(op_actions)
                 new_state.board.add_to_board(op_action)
                 new_state.opponent.hand.remove(op_action[0])
             elif not new_state.boneyard.is_boneyard_empty():
@@ -111,6 +127,8 @@ class Node():
         self.visit_count = 0 # Number of times a node is visited
         self.total_reward = 0 # Sum of utilities
         self.availability = 0 # Number of alternative nodes available for selection
+        self.amaf_visits = 0 # Number of simulations through the parent where our side played this action at any later point (RAVE)
+        self.amaf_reward = 0 # Sum of utilities of those simulations
         self.children : list[Node] = [] # List of children
         self.d : State = None # Determinization of the corresponding node
     
@@ -134,7 +152,7 @@ class Node():
         return unexplored_actions
 
 class MonteCarloPlayer(Player):
-    def __init__(self, name : str = "MonteCarloPlayer", n : int = 1000, c : float = 0.7):
+    def __init__(self, name : str = "MonteCarloPlayer", n : int = 1000, c : float = 0.7, endgame_tiles : int = 8, tablebase : str | None = None, cache : str | None = None, opening_book : str | None = None, ponder : bool = False, rave : float = 0, rollout : str = "random"):
         super().__init__(name) 
 
         # Number of MCTS iterations
@@ -143,7 +161,58 @@ class MonteCarloPlayer(Player):
         # Exploration constant
         self.MCTS_C = c
 
+        # RAVE equivalence parameter (0 disables RAVE)
+        # Every tile our side plays in a simulation, in the tree or in the rollout, also credits the
+        # (tile, end) children of the nodes above it (all-moves-as-first statistics). Selection blends
+        # the AMAF mean with the child's own mean, trusting AMAF with weight sqrt(k / (3 visits + k)):
+        # fully at first, half after k visits
+        self.rave = rave
+
+        # Policy choosing the moves of both sides in the simulations (see RolloutPolicy.py)
+        self.rollout = rollout
+        self.rollout_policy = RolloutPolicy(rollout, self.domino_set)
+
+        # Exact solver for rollouts that reach an empty boneyard with at most
+        # endgame_tiles tiles left in both hands (0 disables it)
+        # Small endgames are looked up in the tablebase file, if one is given (see Tablebase.py)
+        self.endgame_tiles = endgame_tiles
+        self.tablebase = Tablebase.open(tablebase) if tablebase else None
+        self.endgame_solver = EndgameSolver(endgame_tiles, self.tablebase) if endgame_tiles > 0 else None
+
+        # Persistent cache of searched positions (see PositionCache.py), per search configuration
+        self.position_cache = PositionCache.open(cache) if cache else None
+        self.cache_namespace = f"MonteCarlo(n={n},c={c},endgame_tiles={endgame_tiles}" + (f",rave={rave}" if rave else "") + (f",rollout={rollout})" if rollout != "random" else ")")
+        self.base_namespace = self.cache_namespace
+
+        # Opening book of deep searches for the first decisions of a round (see OpeningBook.py)
+        self.opening_book = OpeningBook.open(opening_book) if opening_book else None
+
+        # Background search of the positions that can follow the opponent's reply, during the opponent's turn (see Ponderer.py)
+        self.ponderer = Ponderer(partial(MonteCarloPlayer, name, n, c, endgame_tiles, tablebase, cache, opening_book, rave=rave, rollout=rollout), self.cache_namespace) if ponder else None
+
+        # Search statistics: mean utility of the last move chosen (None if it was not searched) and its visits
+        self.last_value = None
+        self.last_visits = 0
+
+    def set_domino_set(self, domino_set : DominoSet):
+        # Play with another domino set: the endgame solver and the cached values depend on it
+        super().set_domino_set(domino_set)
+        if self.endgame_solver:
+            self.endgame_solver = EndgameSolver(self.endgame_tiles, self.tablebase, domino_set)
+        self.rollout_policy = RolloutPolicy(self.rollout, domino_set)
+        self.cache_namespace = self.base_namespace if domino_set is DOUBLE_SIX else f"{self.base_namespace}[{domino_set.name}]"
+
     def move(self, board : Board, boneyard_size : int) -> Move | None:
+        move = self.search_move(board, boneyard_size)
+        if self.ponderer and move:
+            # Search the likely next positions while the opponent thinks
+            self.ponderer.ponder(self, board, boneyard_size, move)
+        return move
+
+    def search_move(self, board : Board, boneyard_size : int) -> Move | None:
+        self.last_value = None
+        self.last_visits = 0
+
         # Possible moves
         moves = self.possible_moves(board)
 
@@ -155,6 +224,28 @@ class MonteCarloPlayer(Player):
         if len(moves) == 1:
             return moves[0]
         
+        # Positions searched while the opponent was thinking are answered at once
+        if self.ponderer:
+            answer = self.ponderer.lookup(self, board, boneyard_size)
+            if answer:
+                self.last_value = answer[1]
+                return answer[0]
+
+        # Book positions (searched offline, without any known opponent voids) are answered from the book
+        if self.opening_book and not self.opponent_model.voids and self.domino_set is DOUBLE_SIX:
+            entry = self.opening_book.lookup(self.get_hand(), board, boneyard_size)
+            if entry and self.is_legal(board, entry[0]):
+                self.last_value = entry[1]
+                return entry[0]
+
+        # Positions searched before are answered from the cache
+        if self.position_cache:
+            key = position_key(self.get_hand(), board, boneyard_size, self.opponent_model.voids, self.cache_namespace)
+            entry = self.position_cache.get(key)
+            if entry:
+                self.last_value = entry[0]
+                return entry[1]
+
         # If more than 1 option, run Single Observer Information Set Monte Carlo Tree Search (SO-ISMCTS)
 
         # Determine the list of possible determinizations
@@ -176,18 +267,25 @@ class MonteCarloPlayer(Player):
                 v, d = self.expand(v, d)
             
             # Simulate with determinization
-            # Calculate utility
-            r = self.simulate(d)
+            # Calculate utility (and collect the moves played by our side, for RAVE)
+            played = [] if self.rave else None
+            r = self.simulate(d, played)
 
             # Backpropagate utility through the tree
-            self.backpropagate(r, v)
+            self.backpropagate(r, v, played)
         
         # From the children of the root node
         # The action that creates the child with the most visits
         # is the chosen move
         children = v0.children
-        n = np.asarray([c.visit_count for c in children])
-        move = children[np.argmax(n)].action
+        best = max(children, key=lambda c: c.visit_count)
+        move = best.action
+        # The value of the position is the mean utility of the chosen move
+        self.last_value = best.total_reward / best.visit_count
+        self.last_visits = best.visit_count
+
+        if self.position_cache:
+            self.position_cache.put(key, self.last_value, move)
 
         return move
         
@@ -202,12 +300,15 @@ class MonteCarloPlayer(Player):
 
             # UCB calculatation for each child
             for c in children:
-                value = c.total_reward / c.visit_count + 0.7 * np.sqrt(np.log(c.availability) / c.visit_count)
+                mean = c.total_reward / c.visit_count
+                if self.rave and c.amaf_visits:
+                    beta = sqrt(self.rave / (3 * c.visit_count + self.rave))
+                    mean = (1 - beta) * mean + beta * c.amaf_reward / c.amaf_visits
+                value = mean + self.MCTS_C * sqrt(log(c.availability) / c.visit_count)
                 values.append(value)
             
-            # A child with the best UCB is chosen as the new node
-            values = np.asarray(values)
-            idx = np.argmax(values)
+            # A child with the best UCB is chosen as the new node (the first one on ties)
+            idx = max(range(len(values)), key=values.__getitem__)
             v = children[idx]
 
             # A new determinization (state) is obtained from
@@ -241,22 +342,31 @@ class MonteCarloPlayer(Player):
         # Return child of the expanded node
         return w, d
     
-    def simulate(self, d : State) -> int:
-        # Simulate with random actions until terminal state
+    def simulate(self, d : State, played : list[Move] | None = None) -> int:
+        # Simulate with the rollout policy's actions (random by default) until terminal state
+        # (the tiles placed by our side are appended to played, if given)
         while not d.is_terminal():
+            if self.endgame_solver and self.endgame_solver.qualifies(d.player.hand, d.opponent.hand, len(d.boneyard.boneyard)):
+                # Perfect-information endgame, the exact utility replaces the rest of the rollout
+                return self.endgame_solver.solve_state(d)
             actions = d.possible_actions()
             if actions:
-                a = random.choice(actions)
-                d = d.transition(a)
+                a = self.rollout_policy.choose(actions, d.board, d.player.hand, d.opponent.hand)
+                if played is not None and a:
+                    played.append(a)
+                d = d.transition(a, self.rollout_policy)
             else:
                 d = d.transition(None)
         # Return the utility of the simulated terminal state
         return d.utility()
     
-    def backpropagate(self, r : int, v_l : Node):
+    def backpropagate(self, r : int, v_l : Node, played : list[Move] | None = None):
         # Starting from the given node
         v = v_l
 
+        # RAVE: tiles placed by our side below the current node (rollout first, then the tree path)
+        played = set(played) if played is not None else None
+
         while v.parent:
             # Backpropagate to the ancestors until reaching root node
             v.visit_count += 1 # Add visit count
@@ -267,6 +377,15 @@ class MonteCarloPlayer(Player):
             for c in children: 
                 c.availability += 1
 
+            if played is not None:
+                # Credit every child of the parent whose move was played at any later point
+                if v.action:
+                    played.add(v.action)
+                for c in v.parent.children:
+                    if c.action in played:
+                        c.amaf_visits += 1
+                        c.amaf_reward += r
+
             # Move to next ancestor
             v = v.parent
         
@@ -277,24 +396,38 @@ class MonteCarloPlayer(Player):
 
     def possible_determinizations(self, board : Board, boneyard_size : int) -> list[State]:
         # Initial list of dominos that might be on the boneyard or the opponent hand
-        initial_list : list[Domino] = []
-
-        for tile in ALL_TILES:
-            # Adding tiles that are not in the player's hand or the board
-            if tile not in self.get_hand() and tile not in board.get_board_tiles():
-                # They cannot appear in reverse either
-                reverse = (tile[-1], tile[0])
-                if reverse not in self.get_hand() and reverse not in board.get_board_tiles():
-                    # Given that they do not have the certainties
-                    initial_list.append(tile)
+        # (kept up to date by the match events, rescanned if the round was not followed)
+        initial_list = self.opponent_model.unseen_tiles(board.get_board_tiles())
+
+        if initial_list is None:
+            initial_list = []
+            for tile in self.domino_set.tiles:
+                # Adding tiles that are not in the player's hand or the board
+                if tile not in self.get_hand() and tile not in board.get_board_tiles():
+                    # They cannot appear in reverse either
+                    reverse = (tile[-1], tile[0])
+                    if reverse not in self.get_hand() and reverse not in board.get_board_tiles():
+                        # Given that they do not have the certainties
+                        initial_list.append(tile)
         
         # Number of tiles the opponent
-        opponent_n : int = NUMBER_OF_TILES - len(board.board) - boneyard_size - len(self.get_hand())
+        opponent_n : int = self.domino_set.number_of_tiles - len(board.board) - boneyard_size - len(self.get_hand())
+
+        # Tiles containing a pip the opponent is known to be void in must be in the boneyard
+        candidate_list = self.opponent_model.possible_tiles(initial_list)
+        if len(candidate_list) < opponent_n:
+            candidate_list = initial_list
 
-        # The set of possible hands is every combination of of the initial list with 
+        # The set of possible hands is every combination of of the candidate list with 
+        # opponent_n tiles, or a uniform sample of one hand per iteration when there are more
+        # combinations than iterations (e.g. early in a round, or with larger domino sets)
         possible_hands : list[list[Domino]] = []
-        for combo in combinations(initial_list, opponent_n):
-            possible_hands.append(list(combo))
+        if comb(len(candidate_list), opponent_n) > self.MCTS_N:
+            for _ in range(self.MCTS_N):
+                possible_hands.append(random.sample(candidate_list, opponent_n))
+        else:
+            for combo in combinations(candidate_list, opponent_n):
+                possible_hands.append(list(combo))
 
         # Set of possible determinizations
         possible_d : list[State] = []
@@ -305,12 +438,13 @@ class MonteCarloPlayer(Player):
             boneyard_list: list[Domino] = []
             
             # The remaining tiles
+            in_hand = set(hand)
             for tile in initial_list:
-                if tile not in hand:
+                if tile not in in_hand:
                     boneyard_list.append(tile)
 
             # Make it into a boneyard object
-            boneyard = Boneyard()
+            boneyard = Boneyard(self.domino_set)
             boneyard.boneyard = boneyard_list
 
             # Define the state (Turn is always for the player for the determinization list)
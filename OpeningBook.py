@@ -0,0 +1,244 @@
+from game_types import Domino, Move, ALL_TILES
+from Board import Board
+from Player import Player
+import hashlib
+import mmap
+import os
+import random
+import struct
+import sys
+
+# File layout: header, then records sorted by key
+MAGIC = b"DOB1"
+HEADER = struct.Struct("<4sI")
+# key, tile index, tail, value
+RECORD = struct.Struct("<8sBbf")
+
+
+def normalize(tile : Domino) -> Domino:
+    return (min(tile), max(tile))
+
+
+def book_key(hand : list[Domino], board : Board, boneyard_size : int) -> tuple[bytes, bool]:
+    """Canonical key of an early position
+
+    A board line and the same line read backwards are the same position with the
+    ends swapped, so the smaller of the two is used.
+
+    Args:
+        hand (list[Domino]): Player's hand
+        board (Board): Current state of the board
+        boneyard_size (int): Number of tiles in the boneyard
+
+    Returns:
+        tuple[bytes, bool]: 8-byte key, and True if the board was reversed (tails of moves must be swapped)
+    """
+    line = [tuple(tile) for tile in board.get_board_tiles()]
+    reversed_line = [(tile[-1], tile[0]) for tile in reversed(line)]
+    flipped = reversed_line < line
+    canonical = (sorted(normalize(tile) for tile in hand), reversed_line if flipped else line, boneyard_size)
+    return hashlib.blake2b(repr(canonical).encode(), digest_size=8).digest(), flipped
+
+
+class OpeningBook():
+    """Precomputed moves for the first decisions of a round
+
+    The book is a file of fixed-size records (key, move, value) sorted by key. It is
+    memory-mapped and searched by bisection, so every process shares it and a lookup
+    costs a handful of record reads.
+    """
+
+    # Books already opened by this process, by path
+    opened : dict[str, "OpeningBook"] = {}
+
+    def __init__(self, path : str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an opening book")
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def open(cls, path : str) -> "OpeningBook":
+        # Map each file once per process
+        if path not in cls.opened:
+            cls.opened[path] = cls(path)
+        return cls.opened[path]
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def __len__(self):
+        return self.size
+
+    def record(self, index : int) -> tuple[bytes, int, int, float]:
+        return RECORD.unpack_from(self.map, HEADER.size + index * RECORD.size)
+
+    def key_at(self, index : int) -> bytes:
+        offset = HEADER.size + index * RECORD.size
+        return self.map[offset:offset + 8]
+
+    def lookup(self, hand : list[Domino], board : Board, boneyard_size : int) -> tuple[Move, float] | None:
+        """Book move for a position
+
+        Args:
+            hand (list[Domino]): Player's hand
+            board (Board): Current state of the board
+            boneyard_size (int): Number of tiles in the boneyard
+
+        Returns:
+            tuple[Move, float] | None: Recommended move (with the tile as it appears in the hand) and its value, or None if the position is not in the book
+        """
+        key, flipped = book_key(hand, board, boneyard_size)
+
+        # Binary search over the sorted records
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.size or self.key_at(low) != key:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        _, tile_index, tail, value = self.record(low)
+        tile = ALL_TILES[tile_index]
+        if tile not in hand:
+            tile = (tile[-1], tile[0])
+        if flipped:
+            tail = -1 - tail
+        return (tile, tail), value
+
+    def entries(self) -> list[tuple[bytes, int, int, float]]:
+        return [self.record(index) for index in range(self.size)]
+
+
+def write_book(path : str, entries : list[tuple[bytes, int, int, float]]):
+    # Records must be sorted by key for the binary search
+    entries = sorted(entries, key=lambda entry: entry[0])
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(entries)))
+        for entry in entries:
+            f.write(RECORD.pack(*entry))
+
+
+def sample_positions(count : int, plies : int, seed : int = 0) -> list[tuple[list[Domino], list[Domino], int]]:
+    """Collects early decisions (at least two legal moves) from randomly played rounds
+
+    Args:
+        count (int): Number of distinct positions to collect
+        plies (int): Number of decisions after the starting tile to collect per round
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        list: (hand, board line, boneyard size) of each position
+    """
+    from Match import Match
+    rng_state = random.getstate()
+    random.seed(seed)
+    positions = {}
+    while len(positions) < count:
+        match = Match(Player(), Player(), False)
+        recorded = []
+
+        # Deal and place the starting tile as Match.play does, then play random moves
+        first, second = match.deal()
+        turn = [second, first]
+        for ply in range(plies):
+            player = turn[ply % 2]
+            if match.terminal_state():
+                break
+            moves = player.possible_moves(match.board)
+            if len(moves) > 1:
+                recorded.append((player.get_hand().copy(), match.board.get_board_tiles().copy(), len(match.boneyard.boneyard)))
+            match.take_turn(player)
+
+        for hand, line, boneyard_size in recorded:
+            board = Board()
+            board.board = line
+            key, _ = book_key(hand, board, boneyard_size)
+            positions[key] = (hand, line, boneyard_size)
+    random.setstate(rng_state)
+    return list(positions.values())[:count]
+
+
+def search_position(args) -> tuple[bytes, int, int, float]:
+    # Worker: deep search of one book position
+    from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer
+    hand, line, boneyard_size, depth = args
+    board = Board()
+    board.board = line
+    player = ExpectiMinimaxPlayer(depth=depth)
+    player.set_hand(hand)
+    move = player.move(board, boneyard_size)
+    key, flipped = book_key(hand, board, boneyard_size)
+    tail = -1 - move[-1] if flipped else move[-1]
+    return key, ALL_TILES.index(normalize(move[0])), tail, player.last_value
+
+
+def build(path : str, positions : int = 1000, plies : int = 2, depth : int = 6, processes : int | None = None, seed : int = 0):
+    """Builds (or extends) an opening book with deep ExpectiMinimax searches run in parallel
+
+    Args:
+        path (str): Book file, existing entries are kept
+        positions (int, optional): Number of sampled positions to search. Defaults to 1000.
+        plies (int, optional): Decisions after the starting tile sampled per round. Defaults to 2.
+        depth (int, optional): Search depth. Defaults to 6.
+        processes (int | None, optional): Worker processes. Defaults to one per core.
+        seed (int, optional): Random seed for sampling positions. Defaults to 0.
+    """
+    entries = {}
+    if os.path.exists(path):
+        for entry in OpeningBook(path).entries():
+            entries[entry[0]] = entry
+
+    work = []
+    for hand, line, boneyard_size in sample_positions(positions, plies, seed):
+        board = Board()
+        board.board = line
+        if book_key(hand, board, boneyard_size)[0] not in entries:
+            work.append((hand, line, boneyard_size, depth))
+    print(f"Searching {len(work)} new positions at depth {depth}")
+
+    from multiprocessing import Pool
+    with Pool(processes) as pool:
+        for done, entry in enumerate(pool.imap_unordered(search_position, work, chunksize=8), 1):
+            entries[entry[0]] = entry
+            if done % 100 == 0:
+                print(f"{done}/{len(work)} positions searched")
+
+    write_book(path, list(entries.values()))
+    print(f"Wrote {len(entries)} positions to {path}")
+
+
+# Testing Section
+if __name__ == "__main__":
+    # Usage: python OpeningBook.py [path] [positions] [depth]
+    path = sys.argv[1] if len(sys.argv) > 1 else "opening_book.dob"
+    positions = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    depth = int(sys.argv[3]) if len(sys.argv) > 3 else 6
+    build(path, positions, depth=depth)
+
+    print("------------------------")
+    print("Testing OpeningBook Class")
+    book = OpeningBook.open(path)
+    disagreements = 0
+    for hand, line, boneyard_size in sample_positions(50, 2):
+        board = Board()
+        board.board = line
+        entry = book.lookup(hand, board, boneyard_size)
+        player = Player()
+        player.set_hand(hand)
+        if entry is None or entry[0] not in player.possible_moves(board):
+            disagreements += 1
+    print(f"Book size: {len(book)}, positions not found or illegal: {disagreements} of 50")
+    print("------------------------")
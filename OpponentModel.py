@@ -0,0 +1,151 @@
+from game_types import Domino, MatchEvent, domino_set, RoundStarted, TilePlaced, Drew, Passed
+
+
+class OpponentModel():
+    """Class to track what can be inferred about the opponent's hidden hand
+
+    A player only draws from the boneyard (or passes) when none of their tiles
+    match either open end of the board, so every draw or pass reveals that the
+    opponent is "void" in those pips.
+
+    Fed with the events of the Match (see observe), the model also keeps the unseen tiles
+    (opponent hand or boneyard), the opponent hand size and the boneyard size up to date
+    in O(1) per event.
+    """
+
+    def __init__(self):
+        # Pips that the opponent is known not to hold
+        self.voids : set[int] = set()
+        # Unseen tiles in the order of the domino set (a dict keeps the order and removes in O(1))
+        self.unseen : dict[Domino, None] = {}
+        self.opponent_hand_size = 0
+        self.boneyard_size = 0
+        self.board_size = 0
+        # Whether the model has followed the round since the deal (unseen tiles are only known then)
+        self.tracking = False
+
+    def reset(self):
+        # Forget everything (new round)
+        self.voids = set()
+        self.unseen = {}
+        self.opponent_hand_size = 0
+        self.boneyard_size = 0
+        self.board_size = 0
+        self.tracking = False
+
+    def observe(self, event : MatchEvent, name : str, hand : list[Domino]):
+        """Update the model with an event of the match
+
+        Args:
+            event (MatchEvent): Event published by the match
+            name (str): Name of the player owning the model
+            hand (list[Domino]): Hand of the player owning the model
+        """
+        if isinstance(event, RoundStarted):
+            self.reset()
+            in_hand = {canonical(tile) for tile in hand}
+            self.unseen = {tile: None for tile in domino_set(event.max_pip).tiles if tile not in in_hand}
+            self.opponent_hand_size = event.hand_size
+            self.boneyard_size = event.boneyard_size
+            self.tracking = True
+        elif isinstance(event, TilePlaced):
+            self.unseen.pop(canonical(event.tile), None)
+            self.board_size += 1
+            if event.player != name:
+                self.opponent_hand_size -= 1
+        elif isinstance(event, Drew):
+            self.boneyard_size = event.boneyard_size
+            if event.player != name:
+                self.opponent_hand_size += 1
+                self.record_draw(event.tails)
+            elif event.tile is not None:
+                self.unseen.pop(canonical(event.tile), None)
+        elif isinstance(event, Passed):
+            if event.player != name:
+                self.record_pass(event.tails)
+
+    def unseen_tiles(self, board_tiles : list[Domino]) -> list[Domino] | None:
+        """Unseen tiles (opponent hand or boneyard) given the board, which can hold tiles placed
+        after the last event (e.g. during a search)
+
+        Args:
+            board_tiles (list[Domino]): Tiles on the board
+
+        Returns:
+            list[Domino] | None: Unseen tiles in the order of the domino set, or None if the round was not followed
+        """
+        if not self.tracking:
+            return None
+        if len(board_tiles) <= self.board_size:
+            return list(self.unseen)
+        placed = {canonical(tile) for tile in board_tiles}
+        return [tile for tile in self.unseen if tile not in placed]
+
+    def record_pass(self, tails : tuple[int, int]):
+        """The opponent passed with an empty boneyard, so no tile in their hand matches the tails
+
+        Args:
+            tails (tuple[int, int]): Open ends of the board when the opponent passed
+        """
+        self.voids.update(tails)
+
+    def record_draw(self, tails : tuple[int, int]):
+        """The opponent drew from the boneyard because no tile in their hand matched the tails
+
+        Every tile kept while drawing did not match the tails either, but those tiles
+        were never tested against older voids, so only the current tails remain known.
+
+        Args:
+            tails (tuple[int, int]): Open ends of the board when the opponent started drawing
+        """
+        self.voids = set(tails)
+
+    def is_possible(self, tile : Domino) -> bool:
+        """Check if the opponent can be holding a tile
+
+        Args:
+            tile (Domino): Tile to check
+
+        Returns:
+            bool: False if the tile contains a pip the opponent is void in
+        """
+        return tile[0] not in self.voids and tile[-1] not in self.voids
+
+    def possible_tiles(self, tiles : list[Domino]) -> list[Domino]:
+        """Filter a list of unseen tiles down to the ones the opponent can be holding
+
+        Args:
+            tiles (list[Domino]): Unseen tiles (opponent hand or boneyard)
+
+        Returns:
+            list[Domino]: Tiles that are not excluded by a known void
+        """
+        return [tile for tile in tiles if self.is_possible(tile)]
+
+
+def canonical(tile : Domino) -> Domino:
+    # Orientation of a tile in the domino sets (low pip first)
+    return tile if tile[0] <= tile[-1] else (tile[-1], tile[0])
+
+
+# Testing Section
+if __name__ == "__main__":
+    print("------------------------")
+    print("Testing OpponentModel Class")
+    model = OpponentModel()
+    model.record_pass((3, 5))
+    print(model.voids)
+    print(model.possible_tiles([(0, 1), (3, 4), (5, 6), (2, 2)]))
+    model.record_draw((1, 1))
+    print(model.voids)
+    print(model.possible_tiles([(0, 1), (3, 4), (5, 6), (2, 2)]))
+    print("------------------------")
+    print("Testing OpponentModel Class (match events)")
+    from game_types import RoundStarted, TilePlaced, Drew, Passed
+    hand = [(0, 2), (4, 5), (3, 4), (3, 6), (2, 3), (5, 6), (2, 5)]
+    model.observe(RoundStarted(("me", "opponent"), 7, 14), "me", hand)
+    model.observe(TilePlaced("opponent", (6, 6), 0), "me", hand)
+    model.observe(Drew("opponent", None, (6, 6), 13), "me", hand)
+    print(f"Unseen: {model.unseen_tiles([(6, 6)])}")
+    print(f"Opponent hand size: {model.opponent_hand_size}, boneyard size: {model.boneyard_size}, voids: {model.voids}")
+    print("------------------------")
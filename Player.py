@@ -1,5 +1,6 @@
-from game_types import Domino, Tail, Move, NUMBER_OF_TILES
+from game_types import Domino, Tail, Move, NUMBER_OF_TILES, MatchEvent, RoundStarted, DominoSet, DOUBLE_SIX, domino_set
 from Board import Board
+from OpponentModel import OpponentModel
 import random
 
 
@@ -12,11 +13,17 @@ class Player():
         self.total_win : int = 0
         self.name = name
 
+        # What has been observed about the opponent's hidden hand (fed by the Match)
+        self.opponent_model = OpponentModel()
+
+        # Domino set of the rounds played (learned from the RoundStarted event, see set_domino_set)
+        self.domino_set : DominoSet = DOUBLE_SIX
+
+    @property
+    def priority_order(self) -> list[Domino]:
         # Useful information for a player to know
-        # Order of domino tiles (which tile goes first)
-        self.priority_order : list[Domino] = [(0, 0), (0, 1), (0, 2), (0, 3), (0, 4), (0, 5), (0, 6), (1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6), (2, 2), (2, 3), (2, 4), (2, 5), (2, 6), (3, 3), (3, 4), (3, 5), (3, 6), (4, 4), (4, 5), (4, 6), (5, 5), (5, 6), (6, 6)]
-        # Ordering list according to priority rules
-        self.priority_order.sort(key = lambda tile: (tile[0] + tile[-1]) + (100 if tile[0] == tile[-1] else 1), reverse=True)
+        # Order of domino tiles (which tile goes first), shared by every player of the set
+        return self.domino_set.priority_order
 
     def get_hand(self) -> list[Domino]: 
         # Returns the player's hand
@@ -24,7 +31,9 @@ class Player():
     
     def set_hand(self, hand : list[Domino]):
         # Set a complete hand
+        # (the unseen tiles tracked so far no longer apply until the next round starts)
         self.hand = hand
+        self.opponent_model.tracking = False
 
     def add_hand(self, tile : Domino):
         # Add a single tile to the hand
@@ -61,6 +70,27 @@ class Player():
 
         return moves
 
+    def is_legal(self, board : Board, move : Move) -> bool:
+        # A move is legal if the tile is in hand and matches the chosen tail
+        tile, tail = move
+        if tile not in self.hand and (tile[-1], tile[0]) not in self.hand:
+            return False
+        return board.is_empty() or board.get_tails(tail) in tile
+
+    def observe(self, event : MatchEvent):
+        """Receive an event of the match (the Match subscribes both players)
+
+        Args:
+            event (MatchEvent): Event published by the match
+        """
+        if isinstance(event, RoundStarted) and event.max_pip != self.domino_set.max_pip:
+            self.set_domino_set(domino_set(event.max_pip))
+        self.opponent_model.observe(event, self.name, self.hand)
+
+    def set_domino_set(self, domino_set : DominoSet):
+        # Play with another domino set (agents rebuild what depends on the set)
+        self.domino_set = domino_set
+
     def add_score(self, round_score : int):
         """ Add round score to the total score of the player, and a win
         """
@@ -89,6 +119,7 @@ class Player():
         """Return a shallow copy of the player with a copied hand."""
         new_player = Player(self.name)
         new_player.hand = self.hand.copy()
+        new_player.set_domino_set(self.domino_set)
         return new_player
 
     def remove_tile(self, tile):
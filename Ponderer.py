@@ -0,0 +1,252 @@
+from game_types import Domino, Move, domino_set
+from Board import Board
+from PositionCache import position_key
+from OpponentModel import canonical
+import queue
+from typing import Callable
+
+
+def ponder_worker(factory : Callable, tasks, results, generation, current):
+    """Worker process: searches the predicted positions with its own copy of the agent
+
+    Tasks of an older generation are skipped, so that a worker never starts searching
+    positions that can no longer happen.
+
+    Args:
+        factory (Callable): Builds the agent (with pondering disabled)
+        tasks (Queue): (generation, key, hand, board line, boneyard size, voids, max pip) tuples, None to stop
+        results (Queue): (generation, key, move, value) tuples
+        generation (Value): Current generation
+        current (Array): Key of the position this worker is searching (empty when idle), one slot per worker
+    """
+    agent = factory()
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_generation, key, hand, line, boneyard_size, voids, max_pip = task
+        if task_generation != generation.value:
+            continue
+        if agent.domino_set.max_pip != max_pip:
+            agent.set_domino_set(domino_set(max_pip))
+        current.value = key.encode()
+        board = Board()
+        board.board = list(line)
+        agent.set_hand(list(hand))
+        agent.opponent_model.voids = set(voids)
+        move = agent.move(board, boneyard_size)
+        results.put((task_generation, key, move, getattr(agent, "last_value", None)))
+        current.value = b""
+
+
+class Ponderer():
+    """Class to search during the opponent's turn
+
+    After choosing a move, the agent hands its position to the ponderer, which predicts the
+    positions that can follow the opponent's reply (every unseen tile the opponent may hold
+    placed on every end it matches, then the same after drawing a single tile, or a pass) and
+    searches them in background worker processes while the opponent thinks. When the agent's
+    turn comes, a position already searched is answered at once; if it is being searched, the
+    agent waits for it; otherwise the workers are stopped, so they do not compete with the
+    agent's own search, and restarted on the next ponder.
+    """
+
+    def __init__(self, factory : Callable, namespace : str, processes : int = 1, max_positions : int = 48):
+        """Init Function for the ponderer
+
+        Args:
+            factory (Callable): Picklable factory of the agent (with pondering disabled), e.g. a functools.partial
+            namespace (str): Agent configuration, keeps results of different configurations apart
+            processes (int, optional): Number of worker processes. Defaults to 1.
+            max_positions (int, optional): Maximum number of predicted positions searched per opponent turn. Defaults to 48.
+        """
+        self.factory = factory
+        self.namespace = namespace
+        self.processes = processes
+        self.max_positions = max_positions
+        self.workers = []
+
+        # Statistics: moves answered by pondering (at once or after waiting) and moves searched as usual
+        self.hits = 0
+        self.waits = 0
+        self.misses = 0
+
+    def start_workers(self):
+        # Worker processes are started on the first ponder (multiprocessing is only imported then)
+        import multiprocessing
+        self.tasks = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.generation = multiprocessing.Value("i", 0)
+        # One slot per worker: the key of the position it is searching
+        self.current = [multiprocessing.Array("c", 32) for _ in range(self.processes)]
+        self.answers : dict[str, tuple[Move | None, float | None]] = {}
+        for current in self.current:
+            worker = multiprocessing.Process(target=ponder_worker, args=(self.factory, self.tasks, self.results, self.generation, current), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def ponder(self, player, board : Board, boneyard_size : int, move : Move):
+        """Start searching the positions that can follow the opponent's reply to the agent's move
+
+        Args:
+            player (Player): Agent, before its move is taken
+            board (Board): Board before the agent's move
+            boneyard_size (int): Number of tiles in the boneyard
+            move (Move): Move chosen by the agent
+        """
+        hand = [tile for tile in player.get_hand() if canonical(tile) != canonical(move[0])]
+        if not hand:
+            # The agent wins the round with this move
+            return
+        after = Board()
+        after.board = list(board.get_board_tiles())
+        after.add_to_board(move)
+        board = after
+        voids = set(player.opponent_model.voids)
+        seen = {canonical(tile) for tile in hand + board.get_board_tiles()}
+        unseen = [tile for tile in player.domino_set.tiles if tile not in seen]
+
+        if not self.workers:
+            self.start_workers()
+        self.collect()
+        with self.generation.get_lock():
+            self.generation.value += 1
+        self.answers = {}
+
+        line = board.get_board_tiles()
+        tails = board.get_tails()
+        predictions = []
+        for tile in unseen:
+            if tile[0] in voids or tile[-1] in voids:
+                continue
+            for tail in (0, -1):
+                if tails[tail] in tile and (tail == 0 or tails[0] != tails[-1]):
+                    reply = Board()
+                    reply.board = list(line)
+                    reply.add_to_board((tile, tail))
+                    predictions.append((reply, boneyard_size, voids))
+        if boneyard_size == 0:
+            # The opponent passes
+            predictions.append((board, boneyard_size, voids | set(tails)))
+        else:
+            # The opponent draws a single tile and plays it (so they were void in both tails)
+            for tile in unseen:
+                for tail in (0, -1):
+                    if tails[tail] in tile and (tail == 0 or tails[0] != tails[-1]):
+                        reply = Board()
+                        reply.board = list(line)
+                        reply.add_to_board((tile, tail))
+                        predictions.append((reply, boneyard_size - 1, set(tails)))
+
+        for reply, reply_boneyard_size, reply_voids in predictions[:self.max_positions]:
+            key = position_key(hand, reply, reply_boneyard_size, reply_voids, self.namespace)
+            self.tasks.put((self.generation.value, key, tuple(hand), tuple(reply.get_board_tiles()), reply_boneyard_size, tuple(reply_voids), player.domino_set.max_pip))
+
+    def collect(self):
+        # Gather the results of the current generation posted by the workers
+        while True:
+            try:
+                result_generation, key, move, value = self.results.get_nowait()
+            except queue.Empty:
+                return
+            if result_generation == self.generation.value:
+                self.answers[key] = (move, value)
+
+    def lookup(self, player, board : Board, boneyard_size : int) -> tuple[Move | None, float | None] | None:
+        """Result of pondering for the actual position, if any
+
+        Args:
+            player (Player): Agent whose turn it is
+            board (Board): Current state of the board
+            boneyard_size (int): Number of tiles in the boneyard
+
+        Returns:
+            tuple[Move | None, float | None] | None: (move, value) found by pondering, or None to search as usual
+        """
+        if not self.workers:
+            return None
+        hand = player.get_hand()
+        key = position_key(hand, board, boneyard_size, player.opponent_model.voids, self.namespace)
+        # Keys read before collecting: a worker posts its result before clearing its slot
+        searching = [current.value.decode() for current in self.current]
+        self.collect()
+        if key not in self.answers and key in searching:
+            # Being searched: waiting is faster than starting over
+            self.waits += 1
+            while key not in self.answers and any(worker.is_alive() for worker in self.workers):
+                try:
+                    result_generation, result_key, move, value = self.results.get(timeout=1)
+                except queue.Empty:
+                    continue
+                if result_generation == self.generation.value:
+                    self.answers[result_key] = (move, value)
+        elif key in self.answers:
+            self.hits += 1
+        else:
+            self.misses += 1
+            if any(searching):
+                # A worker is busy with a position that can no longer happen
+                self.close()
+                return None
+
+        answer = self.answers.get(key)
+        # The remaining predictions can no longer happen
+        with self.generation.get_lock():
+            self.generation.value += 1
+        self.answers = {}
+        if answer and answer[0] is not None and player.is_legal(board, answer[0]):
+            return answer
+        return None
+
+    def close(self):
+        # Stop the worker processes
+        for worker in self.workers:
+            worker.terminate()
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+    def __del__(self):
+        self.close()
+
+    def __getstate__(self):
+        # Worker processes and queues belong to the process that started them
+        state = self.__dict__.copy()
+        for attribute in ["workers", "tasks", "results", "generation", "current", "answers"]:
+            state.pop(attribute, None)
+        state["workers"] = []
+        return state
+
+
+if __name__ == "__main__":
+    # Testing Section
+    from Player import Player
+    from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer
+    from MonteCarloPlayer import MonteCarloPlayer
+    from Match import Match
+    import random
+    import time
+
+    class SlowPlayer(Player):
+        # Random player thinking for a fixed time, like a human at the prompt
+        def move(self, board : Board, boneyard_size : int) -> Move | None:
+            time.sleep(1)
+            return super().move(board, boneyard_size)
+
+    print("------------------------")
+    print("Testing Ponderer Class (agent vs a random player thinking 1s per move, 5 rounds)")
+    for agent_class, options in [(ExpectiMinimaxPlayer, {"depth": 6}), (MonteCarloPlayer, {"n": 300})]:
+        for ponder in [False, True]:
+            random.seed(0)
+            agent = agent_class(ponder=ponder, **options)
+            m = Match(agent, SlowPlayer(), False)
+            for _ in range(5):
+                m.play()
+            latency = m.latency_1.total
+            print(f"{agent.name} ponder={ponder}: mean move time {latency.mean():.3f}s, p90 {latency.percentile(0.9):.3f}s", end="")
+            if agent.ponderer:
+                print(f" ({agent.ponderer.hits} hits, {agent.ponderer.waits} waits, {agent.ponderer.misses} misses)")
+                agent.ponderer.close()
+            else:
+                print()
+    print("------------------------")
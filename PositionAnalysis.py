@@ -0,0 +1,296 @@
+from game_types import Domino, domino_set
+from Board import Board
+from Player import Player
+from typing import Iterable, Iterator
+from time import perf_counter
+import json
+import random
+import sys
+
+# Batch analysis of positions: every position of a JSON lines file is searched by an agent, in a pool of worker
+# processes, and the results are streamed back as JSON lines, in the order of the file.
+#
+# Position (one JSON object per line):
+#   {"hand": [[6, 6], [1, 4]], "board": [[2, 5], [5, 6]], "boneyard_size": 12,
+#    "voids": [3], "max_pip": 6, "id": "any label", "played": [[1, 4], 0]}
+#   - board: the line of tiles, left to right, each tile oriented as on the table (at least one: the agents do not
+#     search the opening move, which Match.play_round decides by priority order)
+#   - voids (optional): pips the opponent is known not to hold (seen drawing or passing on them)
+#   - max_pip (optional): domino set (6, 9 or 12). Defaults to 6
+#   - id, played (optional): copied to the result (e.g. a label, and the move played in the game)
+# Result (one JSON object per line):
+#   {"index": 0, "id": ..., "move": [[1, 4], 0], "value": 3.5, "legal_moves": 2, "seconds": 0.08, "nodes": 1234}
+#   - move: [tile, end] (end 0 is the left end, -1 the right one), or null with no legal move (draw or pass)
+#   - value: value of the move found by the search (null when it was not searched, e.g. a forced move)
+#   - search statistics of the agent: nodes (ExpectiMinimax), visits (MonteCarlo), engine and setting (Hybrid)
+#   - error: instead of the move, if the position is not valid or the search failed
+
+# Agents available, by name (imported by the workers)
+AGENTS = ["random", "expectiminimax", "montecarlo", "hybrid"]
+
+# Agent of this worker process (built once by init_worker, reused for every position)
+worker_agent : Player | None = None
+worker_seed = 0
+
+
+def make_agent(agent : str, options : dict) -> Player:
+    """Builds an agent
+
+    Args:
+        agent (str): Agent name, one of AGENTS
+        options (dict): Arguments of the agent's class (e.g. depth, n, cache, tablebase)
+
+    Returns:
+        Player: The agent
+    """
+    if agent == "random":
+        return Player(**options)
+    if agent == "expectiminimax":
+        from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer
+        return ExpectiMinimaxPlayer(**options)
+    if agent == "montecarlo":
+        from MonteCarloPlayer import MonteCarloPlayer
+        return MonteCarloPlayer(**options)
+    if agent == "hybrid":
+        from HybridPlayer import HybridPlayer
+        return HybridPlayer(**options)
+    raise ValueError(f"Unknown agent {agent}, expected one of {AGENTS}")
+
+
+def init_worker(agent : str, options : dict, seed : int):
+    # Pool initializer: every worker builds its agent once (cache, tablebase and opening book files are shared
+    # by the workers: the cache through SQLite, the others memory-mapped)
+    global worker_agent, worker_seed
+    worker_agent = make_agent(agent, options)
+    worker_seed = seed
+
+
+def tile_list(value, field : str) -> list[Domino]:
+    # List of tiles of a position, as tuples
+    if not isinstance(value, list) or not all(isinstance(tile, list) and len(tile) == 2 and all(type(pip) is int for pip in tile) for tile in value):
+        raise ValueError(f"{field} must be a list of tiles [a, b]")
+    return [tuple(tile) for tile in value]
+
+
+def parse_position(position : dict) -> tuple[list[Domino], Board, int, set[int], int]:
+    """Checks a position and converts it for the agents
+
+    Args:
+        position (dict): Position (see the format above)
+
+    Raises:
+        ValueError: If the position is not valid
+
+    Returns:
+        tuple[list[Domino], Board, int, set[int], int]: Hand, board, boneyard size, voids and max pip
+    """
+    max_pip = position.get("max_pip", 6)
+    if max_pip not in (6, 9, 12):
+        raise ValueError("max_pip must be 6, 9 or 12")
+    dominoes = domino_set(max_pip)
+    hand = tile_list(position.get("hand"), "hand")
+    line = tile_list(position.get("board"), "board")
+    boneyard_size = position.get("boneyard_size")
+    if type(boneyard_size) is not int or boneyard_size < 0:
+        raise ValueError("boneyard_size must be a non-negative integer")
+    voids = position.get("voids", [])
+    if not isinstance(voids, list) or not all(type(pip) is int and 0 <= pip <= max_pip for pip in voids):
+        raise ValueError(f"voids must be a list of pips between 0 and {max_pip}")
+
+    seen = [(min(tile), max(tile)) for tile in hand + line]
+    if any(tile not in dominoes.index for tile in seen):
+        raise ValueError(f"Tiles must have pips between 0 and {max_pip}")
+    if len(set(seen)) != len(seen):
+        raise ValueError("A tile appears twice in the hand and board")
+    if not hand:
+        raise ValueError("The hand is empty")
+    if not line:
+        raise ValueError("The board is empty")
+    if any(line[i][-1] != line[i + 1][0] for i in range(len(line) - 1)):
+        raise ValueError("Consecutive board tiles must match")
+    if dominoes.number_of_tiles - len(hand) - len(line) - boneyard_size < 1:
+        raise ValueError("The opponent has no tile left (boneyard_size too large)")
+
+    board = Board()
+    board.board = line
+    return hand, board, boneyard_size, set(voids), max_pip
+
+
+def analyze_position(task : tuple[int, dict]) -> dict:
+    """Worker: search one position with the worker's agent
+
+    Args:
+        task (tuple[int, dict | None]): Index of the position in the file, and the position (None if the line could not be read)
+
+    Returns:
+        dict: Result (see the format above)
+    """
+    index, position = task
+    result = {"index": index}
+    if not isinstance(position, dict):
+        result["error"] = "A position must be a JSON object"
+        return result
+    for field in ("id", "played"):
+        if field in position:
+            result[field] = position[field]
+    try:
+        hand, board, boneyard_size, voids, max_pip = parse_position(position)
+    except ValueError as error:
+        result["error"] = str(error)
+        return result
+
+    agent = worker_agent
+    if agent.domino_set.max_pip != max_pip:
+        agent.set_domino_set(domino_set(max_pip))
+    agent.set_hand(hand)
+    agent.opponent_model.voids = voids
+    legal_moves = len(agent.possible_moves(board))
+
+    # Seeded per position: the results do not depend on the worker or on the other positions
+    random.seed(worker_seed + index)
+    logged = len(getattr(agent, "engine_log", []))
+    start = perf_counter()
+    try:
+        move = agent.move(board, boneyard_size)
+    except Exception as error:
+        # One position the agent cannot search must not stop the whole stream
+        result["error"] = f"Search failed: {type(error).__name__}: {error}"
+        return result
+    result["seconds"] = perf_counter() - start
+    result["move"] = [list(move[0]), move[1]] if move else None
+    result["value"] = getattr(agent, "last_value", None)
+    result["legal_moves"] = legal_moves
+
+    # Search statistics of the agent
+    if hasattr(agent, "nodes_searched"):
+        result["nodes"] = agent.nodes_searched
+    if hasattr(agent, "last_visits"):
+        result["visits"] = agent.last_visits
+    if len(getattr(agent, "engine_log", [])) > logged:
+        choice = agent.engine_log[-1]
+        result["engine"] = choice.engine
+        result["setting"] = choice.setting
+    return result
+
+
+def analyze(positions : Iterable[dict], agent : str = "expectiminimax", options : dict | None = None, processes : int | None = None, seed : int = 0) -> Iterator[dict]:
+    """Search every position with an agent, in a pool of worker processes
+
+    Args:
+        positions (Iterable[dict]): Positions (see the format above), read lazily
+        agent (str, optional): Agent name, one of AGENTS. Defaults to "expectiminimax".
+        options (dict | None, optional): Arguments of the agent's class. Pass the same cache file to share searched
+            positions between the workers and with later runs. Defaults to None.
+        processes (int | None, optional): Worker processes (1 searches in this process). Defaults to the number of cores.
+        seed (int, optional): Seed of the searches (position i is searched with seed + i). Defaults to 0.
+
+    Yields:
+        dict: Result of every position, in order, as soon as it is available
+    """
+    options = options or {}
+    if agent not in AGENTS:
+        raise ValueError(f"Unknown agent {agent}, expected one of {AGENTS}")
+    tasks = enumerate(positions)
+    if processes == 1:
+        init_worker(agent, options, seed)
+        for task in tasks:
+            yield analyze_position(task)
+        return
+
+    from multiprocessing import Pool
+    with Pool(processes, initializer=init_worker, initargs=(agent, options, seed)) as pool:
+        # Ordered, and lazy in both directions: positions are read and results written as the workers go
+        yield from pool.imap(analyze_position, tasks, chunksize=1)
+
+
+def read_positions(lines : Iterable[str]) -> Iterator[dict | None]:
+    # Positions of a JSON lines file (blank lines are skipped, a line that is not valid JSON is reported as invalid)
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            yield None
+
+
+def positions_from_records(path : str, limit : int | None = None) -> Iterator[dict]:
+    """Positions of the decisions with a choice of moves in a game log (see GameRecord.py), e.g. to build a
+    regression corpus from real games
+
+    Args:
+        path (str): Game log file
+        limit (int | None, optional): Most positions yielded. Defaults to all.
+
+    Yields:
+        dict: Position, with the move played in the game ("played") and an id "round:decision"
+    """
+    from GameRecord import GameRecordReader, replay
+    count = 0
+    player = Player()
+    for round_number, round in enumerate(GameRecordReader(path).rounds()):
+        for decision, (_, hand, line, boneyard_size, move) in enumerate(replay(round)):
+            board = Board()
+            board.board = line
+            player.hand = hand
+            if move is None or len(player.possible_moves(board)) < 2:
+                continue
+            yield {"id": f"{round_number}:{decision}", "hand": [list(tile) for tile in hand], "board": [list(tile) for tile in line],
+                   "boneyard_size": boneyard_size, "max_pip": round["max_pip"], "played": [list(move[0]), move[1]]}
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+
+if __name__ == "__main__":
+    # Usage: python PositionAnalysis.py POSITIONS [AGENT] [OPTIONS_JSON] [processes] > results.jsonl
+    #        python PositionAnalysis.py --from-log GAME_LOG [limit] > positions.jsonl
+    # Without arguments, runs the testing section
+    if len(sys.argv) > 2 and sys.argv[1] == "--from-log":
+        for position in positions_from_records(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else None):
+            print(json.dumps(position))
+    elif len(sys.argv) > 1:
+        agent = sys.argv[2] if len(sys.argv) > 2 else "expectiminimax"
+        options = json.loads(sys.argv[3]) if len(sys.argv) > 3 else {}
+        processes = int(sys.argv[4]) if len(sys.argv) > 4 else None
+        with open(sys.argv[1]) as file:
+            for result in analyze(read_positions(file), agent, options, processes):
+                print(json.dumps(result), flush=True)
+    else:
+        # Testing Section
+        from Match import Match
+        from GameRecord import GameRecordWriter
+        import os
+        import tempfile
+
+        print("------------------------")
+        print("Testing PositionAnalysis Module (positions from 10 recorded rounds, ExpectiMinimax depth 5)")
+        directory = tempfile.mkdtemp()
+        log = os.path.join(directory, "games.dgr")
+        random.seed(0)
+        with GameRecordWriter(log) as recorder:
+            m = Match(Player("Random_A"), Player("Random_B"), False, recorder=recorder)
+            for _ in range(10):
+                m.play()
+        positions = list(positions_from_records(log))
+        positions.append({"hand": [[1, 1]], "board": [[2, 3], [4, 5]], "boneyard_size": 0})
+        print(f"{len(positions) - 1} positions with a choice of moves, and one invalid position")
+
+        cache = os.path.join(directory, "cache.sqlite")
+        runs = {}
+        for label, processes, options in [("1 process", 1, {"depth": 5}), ("pool, empty cache", 2, {"depth": 5, "cache": cache}), ("pool, cache filled", 2, {"depth": 5, "cache": cache})]:
+            start = perf_counter()
+            runs[label] = list(analyze(positions, "expectiminimax", options, processes))
+            print(f"{label}: {perf_counter() - start:.2f}s")
+        # (the cache answers a position with the same tiles and ends as one searched before, and when both ends show
+        # the same pip its move may be on the other, equivalent, end)
+        tiles_and_values = [[[result["move"][0] if result.get("move") else None, result.get("value")] for result in results] for results in runs.values()]
+        print(f"Same tiles and values in every run: {all(run == tiles_and_values[0] for run in tiles_and_values)}")
+        print(f"Agrees with the random player's move: {sum(r.get('move') == r.get('played') for r in runs['1 process'])}/{len(positions) - 1}")
+        print(f"First result: {json.dumps(runs['1 process'][0])}")
+        print(f"Invalid position: {json.dumps(runs['1 process'][-1])}")
+
+        start = perf_counter()
+        results = list(analyze(positions[:20], "montecarlo", {"n": 500}, 2))
+        print(f"MonteCarlo n=500, 20 positions: {perf_counter() - start:.2f}s, first result: {json.dumps(results[0])}")
+        print("------------------------")
@@ -0,0 +1,172 @@
+from game_types import Domino, Move
+from Board import Board
+from collections import OrderedDict
+import hashlib
+import json
+import os
+
+
+def position_key(hand : list[Domino], board : Board, boneyard_size : int, voids : set[int] = frozenset(), namespace : str = "") -> str:
+    """Canonical hash of a position as seen by a player
+
+    Tiles are normalized so that (a, b) and (b, a) are the same tile, and the board is
+    reduced to its set of tiles and its open ends, which is all the agents look at.
+
+    Args:
+        hand (list[Domino]): Player's hand
+        board (Board): Current state of the board
+        boneyard_size (int): Number of tiles in the boneyard
+        voids (set[int], optional): Pips the opponent is known not to hold. Defaults to none.
+        namespace (str, optional): Agent and configuration that produced the value. Defaults to "".
+
+    Returns:
+        str: Hex digest identifying the position
+    """
+    canonical = (
+        namespace,
+        sorted((min(tile), max(tile)) for tile in hand),
+        sorted((min(tile), max(tile)) for tile in board.get_board_tiles()),
+        board.get_tails(),
+        boneyard_size,
+        sorted(voids),
+    )
+    return hashlib.blake2b(repr(canonical).encode(), digest_size=16).hexdigest()
+
+
+class PositionCache():
+    """Persistent cache of position values shared by agents, runs and worker processes
+
+    Values are kept in a small in-process LRU in front of a SQLite file. SQLite handles
+    concurrent readers and writers from several processes, the number of stored
+    positions is bounded (oldest writes are evicted first), and a version number
+    discards the stored values when the search code changes what they mean.
+    """
+
+    # Bump when cached values are no longer comparable with new ones
+    VERSION = 1
+
+    # Caches already opened, by process and path: a SQLite connection must not be used across fork(), so a
+    # forked worker (e.g. a Ponderer's) opens its own instead of reusing the one inherited from its parent
+    opened : dict[tuple[int, str], "PositionCache"] = {}
+
+    def __init__(self, path : str, memory_size : int = 100000, max_entries : int = 1000000):
+        """Init Function for the position cache
+
+        Args:
+            path (str): SQLite file backing the cache
+            memory_size (int, optional): Number of positions kept in the in-process LRU. Defaults to 100000.
+            max_entries (int, optional): Number of positions kept on disk. Defaults to 1000000.
+        """
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.memory : OrderedDict[str, tuple[float, Move | None]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+        # Imported when a cache is opened, so that agents without a cache start faster
+        import sqlite3
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        row = self.connection.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+        if row is None or int(row[0]) != self.VERSION:
+            # Stale or new file, start over
+            self.connection.execute("DROP TABLE IF EXISTS positions")
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(self.VERSION),))
+        self.connection.execute("CREATE TABLE IF NOT EXISTS positions (key TEXT PRIMARY KEY, value REAL, move TEXT)")
+
+    @classmethod
+    def open(cls, path : str) -> "PositionCache":
+        # One connection per file and process
+        key = (os.getpid(), path)
+        if key not in cls.opened:
+            cls.opened[key] = cls(path)
+        return cls.opened[key]
+
+    def __getstate__(self):
+        # Worker processes open their own connection to the same file
+        return {"path": self.path, "memory_size": self.memory_size, "max_entries": self.max_entries}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["memory_size"], state["max_entries"])
+
+    def get(self, key : str) -> tuple[float, Move | None] | None:
+        """Look up a position
+
+        Args:
+            key (str): Key from position_key
+
+        Returns:
+            tuple[float, Move | None] | None: Stored (value, move), or None if the position is unknown
+        """
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+
+        row = self.connection.execute("SELECT value, move FROM positions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        entry = (row[0], self.decode_move(row[1]))
+        self.remember(key, entry)
+        return entry
+
+    def put(self, key : str, value : float, move : Move | None):
+        """Store the value and best move of a position
+
+        Args:
+            key (str): Key from position_key
+            value (float): Value of the position
+            move (Move | None): Best move found
+        """
+        self.remember(key, (value, move))
+        self.connection.execute("INSERT OR REPLACE INTO positions VALUES (?, ?, ?)", (key, value, json.dumps(move)))
+
+        # Evict the oldest tenth of the entries once the file is full
+        self.writes += 1
+        if self.writes % 1000 == 0:
+            count = self.connection.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+            if count > self.max_entries:
+                self.connection.execute(
+                    "DELETE FROM positions WHERE rowid IN (SELECT rowid FROM positions ORDER BY rowid LIMIT ?)",
+                    (count - self.max_entries + self.max_entries // 10,)
+                )
+
+    def remember(self, key : str, entry : tuple[float, Move | None]):
+        # In-process LRU
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def decode_move(self, text : str) -> Move | None:
+        # JSON turns tuples into lists
+        move = json.loads(text)
+        if move is None:
+            return None
+        return (tuple(move[0]), move[-1])
+
+
+# Testing Section
+if __name__ == "__main__":
+    import os
+    import tempfile
+    print("------------------------")
+    print("Testing PositionCache Class")
+    path = os.path.join(tempfile.mkdtemp(), "cache.sqlite")
+    cache = PositionCache(path)
+    board = Board()
+    board.add_to_board(((6, 6), 0))
+    key = position_key([(1, 6), (2, 3)], board, 14)
+    print(cache.get(key))
+    cache.put(key, 12.5, ((1, 6), 0))
+    # A fresh process sees the stored value
+    print(PositionCache(path).get(key))
+    print(position_key([(6, 1), (3, 2)], board, 14) == key)
+    print("------------------------")
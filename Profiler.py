@@ -0,0 +1,210 @@
+import cProfile
+import signal
+import os
+import json
+from contextlib import contextmanager
+
+
+class Profiler():
+    """Class to profile the agents and the match engine separately, across many games
+
+    Code runs under a label (the name of the agent taking a turn, or "Match" for the engine),
+    set with the profile context manager. Labels can be nested: the innermost one is charged.
+    Two modes:
+    - "sampling": a CPU timer interrupts the program every interval seconds and records the
+      current call stack under the active label. Low overhead, written as collapsed stacks
+      (one "label;frame;...;frame count" line per stack) for flamegraph.pl, speedscope, etc.
+    - "deterministic": one cProfile profiler per label, exact call counts and times but
+      slower, written as .pstats files (for snakeviz, gprof2dot, etc.).
+    Both modes summarize the top functions of each label.
+    """
+
+    MODES = ["sampling", "deterministic"]
+
+    def __init__(self, mode : str = "sampling", interval : float = 0.001):
+        """Init Function for the profiler
+
+        Args:
+            mode (str, optional): "sampling" or "deterministic". Defaults to "sampling".
+            interval (float, optional): CPU seconds between samples in sampling mode. Defaults to 0.001.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown profiling mode {mode}, expected one of {self.MODES}")
+        if mode == "sampling" and not hasattr(signal, "setitimer"):
+            raise ValueError("Sampling profiling needs signal.setitimer, use the deterministic mode on this platform")
+        self.mode = mode
+        self.interval = interval
+
+        # Active labels, innermost last
+        self.labels : list[str] = []
+        # Sampling mode: number of samples per (label, outermost frame, ..., innermost frame)
+        self.samples : dict[tuple[str, ...], int] = {}
+        # Deterministic mode: profiler per label
+        self.profiles : dict[str, cProfile.Profile] = {}
+        self.previous_handler = None
+
+    @contextmanager
+    def profile(self, label : str):
+        """Charge the code run inside the context to label
+
+        Args:
+            label (str): Agent name, or "Match" for the engine
+        """
+        if self.labels:
+            self.pause(self.labels[-1])
+        else:
+            self.start()
+        self.labels.append(label)
+        self.resume(label)
+        try:
+            yield
+        finally:
+            self.pause(label)
+            self.labels.pop()
+            if self.labels:
+                self.resume(self.labels[-1])
+            else:
+                self.stop()
+
+    def start(self):
+        # Start sampling when entering the outermost label
+        if self.mode == "sampling":
+            self.previous_handler = signal.signal(signal.SIGPROF, self.sample)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        # Stop sampling when leaving the outermost label
+        if self.mode == "sampling":
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self.previous_handler or signal.SIG_DFL)
+
+    def resume(self, label : str):
+        if self.mode == "deterministic":
+            self.profiles.setdefault(label, cProfile.Profile()).enable()
+
+    def pause(self, label : str):
+        if self.mode == "deterministic":
+            self.profiles[label].disable()
+
+    def sample(self, signum, frame):
+        # Timer signal handler: record the interrupted call stack under the active label
+        if not self.labels:
+            return
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}")
+            frame = frame.f_back
+        key = (self.labels[-1], *reversed(stack))
+        self.samples[key] = self.samples.get(key, 0) + 1
+
+    def summary(self, top : int = 15) -> dict[str, dict]:
+        """Top functions of every label
+
+        Args:
+            top (int, optional): Number of functions per label. Defaults to 15.
+
+        Returns:
+            dict[str, dict]: Total time and the functions with the most time spent in their own code, by label
+        """
+        summary = {}
+        if self.mode == "sampling":
+            for label in sorted({key[0] for key in self.samples}):
+                total = 0
+                self_samples = {}
+                cumulative_samples = {}
+                for key, count in self.samples.items():
+                    if key[0] != label:
+                        continue
+                    total += count
+                    self_samples[key[-1]] = self_samples.get(key[-1], 0) + count
+                    for function in set(key[1:]):
+                        cumulative_samples[function] = cumulative_samples.get(function, 0) + count
+                functions = sorted(self_samples, key=self_samples.get, reverse=True)[:top]
+                summary[label] = {
+                    "seconds": total * self.interval,
+                    "functions": [{
+                        "function": function,
+                        "self_seconds": self_samples[function] * self.interval,
+                        "self_fraction": self_samples[function] / total,
+                        "cumulative_seconds": cumulative_samples[function] * self.interval
+                    } for function in functions]
+                }
+        else:
+            # Only needed for deterministic profiles (slow to import)
+            import pstats
+            for label, profile in self.profiles.items():
+                stats = pstats.Stats(profile).stats
+                functions = sorted(stats, key=lambda function: stats[function][2], reverse=True)[:top]
+                total = sum(entry[2] for entry in stats.values())
+                summary[label] = {
+                    "seconds": total,
+                    "functions": [{
+                        "function": f"{os.path.basename(function[0])}:{function[2]}",
+                        "calls": stats[function][1],
+                        "self_seconds": stats[function][2],
+                        "self_fraction": stats[function][2] / total if total else 0.0,
+                        "cumulative_seconds": stats[function][3]
+                    } for function in functions]
+                }
+        return summary
+
+    def print_summary(self, top : int = 15):
+        # Print the top functions of every label
+        for label, entry in self.summary(top).items():
+            print(f"\n Profile: {label} ({entry['seconds']:.2f}s)")
+            for function in entry["functions"]:
+                print(f"{function['self_fraction']:7.1%} {function['self_seconds']:9.3f}s self {function['cumulative_seconds']:9.3f}s cumulative  {function['function']}")
+
+    def write(self, prefix : str, top : int = 15) -> list[str]:
+        """Write the profile: collapsed stacks (sampling) or one .pstats file per label (deterministic), and the summary
+
+        Args:
+            prefix (str): Path prefix of the files
+            top (int, optional): Number of functions per label in the summary. Defaults to 15.
+
+        Returns:
+            list[str]: Paths of the files written
+        """
+        os.makedirs(os.path.dirname(prefix) or ".", exist_ok=True)
+        paths = []
+        if self.mode == "sampling":
+            path = prefix + ".collapsed"
+            with open(path, "w") as f:
+                for key, count in sorted(self.samples.items()):
+                    f.write(f"{';'.join(key)} {count}\n")
+            paths.append(path)
+        else:
+            for label, profile in self.profiles.items():
+                path = f"{prefix}_{label}.pstats"
+                profile.dump_stats(path)
+                paths.append(path)
+
+        path = prefix + "_summary.json"
+        with open(path, "w") as f:
+            json.dump(self.summary(top), f, indent=4)
+        paths.append(path)
+        return paths
+
+
+if __name__ == "__main__":
+    # Testing Section
+    from Player import Player
+    from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer
+    from Match import Match
+    import random
+    import time
+
+    print("------------------------")
+    print("Testing Profiler Class (ExpectiMinimax depth 4 vs Random Player, 20 rounds)")
+    for mode in [None] + Profiler.MODES:
+        random.seed(0)
+        profiler = Profiler(mode) if mode else None
+        m = Match(ExpectiMinimaxPlayer(depth=4), Player(), False, profiler=profiler)
+        start = time.perf_counter()
+        for _ in range(20):
+            m.play()
+        print(f"\nMode {mode}: {time.perf_counter() - start:.2f}s")
+        if profiler:
+            profiler.print_summary(5)
+    print("------------------------")
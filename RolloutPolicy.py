@@ -0,0 +1,104 @@
+from game_types import Domino, Move, DominoSet, DOUBLE_SIX
+from Board import Board
+import random
+
+# Rollout policies of MonteCarloPlayer (see RolloutPolicy)
+ROLLOUT_POLICIES = ["random", "heaviest", "diversity", "block"]
+
+
+class RolloutPolicy():
+    """Class to choose the moves of both sides in the rollouts (simulations) of MonteCarloPlayer
+
+    - "random": a uniformly random legal move
+    - "heaviest": the heaviest tile first (doubles first on ties), to be left with few pips
+    - "diversity": leave open the pip we hold the most other tiles of, so that we can follow it
+    - "block": leave open a pip the opponent holds no tile of (in the determinization), heaviest first otherwise
+
+    The informed policies only use lookup tables computed once per domino set (the weight of each tile, and the
+    pip each tile leaves open when played on an end showing a given pip) and the pip counts of a hand (number of
+    its tiles containing each pip), so a move costs about as much as a random choice. With probability epsilon a
+    random move is played instead, so that the rollouts stay varied.
+    """
+
+    def __init__(self, name : str = "random", domino_set : DominoSet = DOUBLE_SIX, epsilon : float = 0.1):
+        """Init Function for the rollout policy
+
+        Args:
+            name (str, optional): Policy, one of ROLLOUT_POLICIES. Defaults to "random".
+            domino_set (DominoSet, optional): Domino set of the rounds played. Defaults to DOUBLE_SIX.
+            epsilon (float, optional): Probability of a random move with the informed policies. Defaults to 0.1.
+        """
+        if name not in ROLLOUT_POLICIES:
+            raise ValueError(f"Unknown rollout policy {name}, expected one of {ROLLOUT_POLICIES}")
+        self.name = name
+        self.domino_set = domino_set
+        self.epsilon = epsilon
+
+        # Pips of each tile (in both orientations), doubles half a pip more so that they go first on ties
+        self.weight : dict[Domino, float] = {}
+        # Pip left open by a tile played on an end showing a pip, keyed by (tile, pip)
+        self.exposed : dict[tuple[Domino, int], int] = {}
+        for a, b in domino_set.tiles:
+            for tile in [(a, b), (b, a)]:
+                self.weight[tile] = a + b + (0.5 if a == b else 0)
+                self.exposed[(tile, a)] = b
+                self.exposed[(tile, b)] = a
+
+    def pip_counts(self, hand : list[Domino]) -> list[int]:
+        # Number of tiles of the hand containing each pip
+        counts = [0] * (self.domino_set.max_pip + 1)
+        for a, b in hand:
+            counts[a] += 1
+            if a != b:
+                counts[b] += 1
+        return counts
+
+    def choose(self, actions : list[Move], board : Board, hand : list[Domino], other_hand : list[Domino]) -> Move:
+        """Chooses a move
+
+        Args:
+            actions (list[Move]): Legal moves of the player to move
+            board (Board): Current state of the board
+            hand (list[Domino]): Hand of the player to move
+            other_hand (list[Domino]): Hand of the other player
+
+        Returns:
+            Move: Chosen move
+        """
+        if self.name == "random" or len(actions) == 1 or random.random() < self.epsilon:
+            return random.choice(actions)
+        weight = self.weight
+        if self.name == "heaviest" or board.is_empty():
+            return max(actions, key=lambda action: weight[action[0]])
+
+        tails = board.get_tails()
+        exposed = self.exposed
+        if self.name == "diversity":
+            counts = self.pip_counts(hand)
+            return max(actions, key=lambda action: (counts[exposed[(action[0], tails[action[-1]])]], weight[action[0]]))
+        counts = self.pip_counts(other_hand)
+        return max(actions, key=lambda action: (counts[exposed[(action[0], tails[action[-1]])]] == 0, weight[action[0]]))
+
+
+if __name__ == "__main__":
+    # Testing Section
+    from MonteCarloPlayer import MonteCarloPlayer
+    from Match import Match
+
+    print("------------------------")
+    print("Testing RolloutPolicy Class (each policy vs random rollouts with the same iterations, 60 rounds per cell)")
+    print(f"{'Policy':<10}" + "".join(f"{'n=' + str(n):>24}" for n in [50, 200, 800]))
+    for policy in ROLLOUT_POLICIES[1:]:
+        cells = []
+        for n in [50, 200, 800]:
+            random.seed(0)
+            m = Match(MonteCarloPlayer(name=policy, n=n, rollout=policy), MonteCarloPlayer(name="random", n=n), False)
+            wins = 0
+            rounds = 60
+            for _ in range(rounds):
+                result, _, _ = m.play()
+                wins += result == policy
+            seconds = m.latency_1.total.mean() / m.latency_2.total.mean()
+            cells.append(f"{wins / rounds:.2f} wins, {seconds:.2f}x time")
+        print(f"{policy:<10}" + "".join(f"{cell:>24}" for cell in cells))
+    print("------------------------")
@@ -0,0 +1,104 @@
+import math
+
+
+class SPRT():
+    """Sequential probability ratio test on the games won by player 1
+
+    Two Wald tests run side by side on the same results:
+    - "p1 stronger": H0 p = 0.5 against H1 p = 0.5 + delta
+    - "p2 stronger": H0 p = 0.5 against H1 p = 0.5 - delta
+    Each test stops at the first crossing of a boundary, and keeps the hypothesis it accepted
+    then. The comparison is decided as soon as either test accepts its H1 (that player is
+    stronger), or both accept H0 (the players are indistinguishable at this delta), with false
+    positive rate alpha and false negative rate beta for each test.
+    """
+
+    def __init__(self, delta : float = 0.15, alpha : float = 0.05, beta : float = 0.05):
+        """Init Function for the test
+
+        Args:
+            delta (float, optional): Smallest difference from a 50% win rate worth detecting. Defaults to 0.15.
+            alpha (float, optional): Probability of declaring a stronger player when they are equal. Defaults to 0.05.
+            beta (float, optional): Probability of missing a difference of delta. Defaults to 0.05.
+        """
+        self.delta = delta
+        self.alpha = alpha
+        self.beta = beta
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+
+        self.wins = 0
+        self.games = 0
+        # Log-likelihood ratio of each test, and the hypothesis it accepted ("H0", "H1", or None while running)
+        self.llr_p1 = 0.0
+        self.llr_p2 = 0.0
+        self.accepted_p1 = None
+        self.accepted_p2 = None
+
+    def update(self, p1_won : bool):
+        # Add the result of a game
+        self.games += 1
+        self.wins += p1_won
+        for test, p in (("p1", 0.5 + self.delta), ("p2", 0.5 - self.delta)):
+            if getattr(self, f"accepted_{test}") is not None:
+                # This test has stopped
+                continue
+            if p1_won:
+                step = math.log(p / 0.5)
+            else:
+                step = math.log((1 - p) / 0.5)
+            llr = getattr(self, f"llr_{test}") + step
+            setattr(self, f"llr_{test}", llr)
+            if llr >= self.upper:
+                setattr(self, f"accepted_{test}", "H1")
+            elif llr <= self.lower:
+                setattr(self, f"accepted_{test}", "H0")
+
+    def decision(self) -> str | None:
+        """Outcome of the test so far
+
+        Returns:
+            str | None: "p1 stronger", "p2 stronger", "indistinguishable", or None while undecided
+        """
+        if self.accepted_p1 == "H1":
+            return "p1 stronger"
+        if self.accepted_p2 == "H1":
+            return "p2 stronger"
+        if self.accepted_p1 == "H0" and self.accepted_p2 == "H0":
+            return "indistinguishable"
+        return None
+
+    def confidence_interval(self, z : float = 1.96) -> tuple[float, float]:
+        """Wilson score interval of player 1's game win rate
+
+        Args:
+            z (float, optional): Normal quantile (1.96 for 95%). Defaults to 1.96.
+
+        Returns:
+            tuple[float, float]: Lower and upper bound
+        """
+        if self.games == 0:
+            return 0.0, 1.0
+        p = self.wins / self.games
+        denominator = 1 + z * z / self.games
+        centre = (p + z * z / (2 * self.games)) / denominator
+        margin = z * math.sqrt(p * (1 - p) / self.games + z * z / (4 * self.games * self.games)) / denominator
+        return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+# Testing Section
+if __name__ == "__main__":
+    import random
+    print("------------------------")
+    print("Testing SPRT Class (games needed to decide)")
+    for p in [0.967, 0.8, 0.65, 0.5, 0.35]:
+        needed = []
+        decisions = {}
+        for _ in range(1000):
+            test = SPRT()
+            while test.decision() is None:
+                test.update(random.random() < p)
+            needed.append(test.games)
+            decisions[test.decision()] = decisions.get(test.decision(), 0) + 1
+        print(f"True win rate {p}: mean {sum(needed) / len(needed):.1f} games, max {max(needed)}, decisions {decisions}")
+    print("------------------------")
@@ -0,0 +1,155 @@
+from Player import Player
+from Evaluation import Evaluation
+from Profiler import Profiler
+from GameRecord import GameRecordWriter
+from game_types import DominoSet, DOUBLE_SIX, HAND_SIZE
+from typing import Callable
+import math
+
+
+class SweepScheduler():
+    """Successive halving over agent configurations evaluated against the same opponent
+
+    Instead of playing every configuration for the same number of games, the game budget
+    is split into rounds. In every round the surviving configurations play the same share
+    of that round's budget, then only the best 1/eta of them survive. Dominated (and, with
+    the "win_ratio_per_second" metric, very slow) configurations are dropped after a few
+    games, and the games they would have played go to the promising ones.
+    """
+
+    METRICS = ["win_ratio", "win_ratio_per_second"]
+
+    def __init__(self, configs : dict[str, type['Player']], opponent : type['Player'], budget : int, eta : int = 2, metric : str = "win_ratio", score_to_win : int = 200, verbose : bool = True,
+                 domino_set : DominoSet = DOUBLE_SIX, hand_size : int = HAND_SIZE, play : Callable[[Evaluation, int], int] | None = None,
+                 profilers : dict[str, Profiler] | None = None, recorder : GameRecordWriter | None = None):
+        """Init Function for the scheduler
+
+        Args:
+            configs (dict[str, type[Player]]): Agent factory of every configuration, by label
+            opponent (type[Player]): Factory of the opponent of every configuration
+            budget (int): Total number of games to play across all configurations
+            eta (int, optional): Only the best 1/eta configurations survive each round. Defaults to 2.
+            metric (str, optional): "win_ratio" or "win_ratio_per_second" (game win ratio divided by seconds of thinking per game). Defaults to "win_ratio".
+            score_to_win (int, optional): Points needed to win a game. Defaults to 200.
+            verbose (bool, optional): Print every round and game result. Defaults to True.
+            domino_set (DominoSet, optional): Domino set the games are played with. Defaults to DOUBLE_SIX.
+            hand_size (int, optional): Tiles dealt to each player. Defaults to 7.
+            play (Callable[[Evaluation, int], int] | None, optional): Plays more games of a configuration's evaluation and returns
+                the number played (e.g. with DistributedEvaluation). Defaults to Evaluation.play, in this process.
+            profilers (dict[str, Profiler] | None, optional): Profiler of the games of each configuration, by label (games played
+                in this process only). Defaults to None.
+            recorder (GameRecordWriter | None, optional): Log of every round played by every configuration (games played in this
+                process only). Defaults to None.
+        """
+        if metric not in self.METRICS:
+            raise ValueError(f"Unknown metric {metric}, expected one of {self.METRICS}")
+        self.configs = configs
+        self.opponent = opponent
+        self.budget = budget
+        self.eta = eta
+        self.metric = metric
+        self.score_to_win = score_to_win
+        self.play = play or Evaluation.play
+
+        profilers = profilers or {}
+        self.evaluations = {label: Evaluation(config, opponent, score_to_win, profiler=profilers.get(label), recorder=recorder, verbose=verbose, domino_set=domino_set, hand_size=hand_size)
+                            for label, config in configs.items()}
+        self.rounds = []
+
+    def score(self, label : str) -> tuple[float, float, float]:
+        """Ranking key of a configuration (higher is better)
+
+        Args:
+            label (str): Label of the configuration
+
+        Returns:
+            tuple[float, float, float]: Metric, then match win ratio and speed to break ties
+        """
+        evaluation = self.evaluations[label]
+        game_win_ratio = evaluation.p1_game / evaluation.games
+        match_win_ratio = evaluation.p1_match / evaluation.matches
+        seconds_per_game = evaluation.latency_p1.total.total / evaluation.games
+        if self.metric == "win_ratio_per_second":
+            return (game_win_ratio / max(seconds_per_game, 1e-9), match_win_ratio, -seconds_per_game)
+        return (game_win_ratio, match_win_ratio, -seconds_per_game)
+
+    def run(self) -> dict[str, dict]:
+        """Play the elimination rounds
+
+        Returns:
+            dict[str, dict]: Statistics of the configurations that reached the final round, by label
+        """
+        survivors = list(self.configs)
+        n_rounds = max(1, math.ceil(math.log(len(survivors), self.eta)))
+        round_budget = self.budget // n_rounds
+
+        for r in range(n_rounds):
+            games = max(1, round_budget // len(survivors))
+            print(f"\nSweep Round #{r + 1}: {len(survivors)} configurations, {games} more games each")
+            for label in survivors:
+                print(f"\nEvaluating {label}")
+                self.play(self.evaluations[label], games)
+
+            standings = sorted(survivors, key=self.score, reverse=True)
+            keep = max(1, math.ceil(len(survivors) / self.eta)) if r < n_rounds - 1 else len(survivors)
+            self.rounds.append({
+                "round": r + 1,
+                "games_per_config": games,
+                "standings": [self.standing(label) for label in standings],
+                "eliminated": standings[keep:]
+            })
+            survivors = standings[:keep]
+
+        self.winner = survivors[0]
+        return {label: self.evaluations[label].stats() for label in survivors}
+
+    def standing(self, label : str) -> dict:
+        # Summary of a configuration's results so far
+        evaluation = self.evaluations[label]
+        return {
+            "label": label,
+            "games_played": evaluation.games,
+            "game_win_ratio": evaluation.p1_game / evaluation.games,
+            "match_win_ratio": evaluation.p1_match / evaluation.matches,
+            "seconds": evaluation.seconds,
+            "score": self.score(label)[0]
+        }
+
+    def summary(self) -> dict:
+        """Summary of the elimination rounds
+
+        Returns:
+            dict: Elimination rounds, winner, and games and seconds spent
+        """
+        games_played = sum(evaluation.games for evaluation in self.evaluations.values())
+        return {
+            "metric": self.metric,
+            "eta": self.eta,
+            "budget": self.budget,
+            "games_played": games_played,
+            "seconds": sum(evaluation.seconds for evaluation in self.evaluations.values()),
+            "rounds": self.rounds,
+            "winner": self.winner
+        }
+
+
+if __name__ == "__main__":
+    # Testing Section
+    from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer
+    from functools import partial
+    import contextlib
+    import io
+
+    print("------------------------")
+    print("Testing SweepScheduler Class (ExpectiMinimax depths vs Random Player, games to 50 points)")
+    configs = {f"depth_{depth}": partial(ExpectiMinimaxPlayer, depth=depth) for depth in [1, 2, 3, 4]}
+    for metric in SweepScheduler.METRICS:
+        scheduler = SweepScheduler(configs, Player, budget=32, metric=metric, score_to_win=50)
+        with contextlib.redirect_stdout(io.StringIO()):
+            scheduler.run()
+        summary = scheduler.summary()
+        print(f"Metric {metric}: winner {summary['winner']} after {summary['games_played']} games ({summary['seconds']:.1f}s)")
+        for round in summary["rounds"]:
+            standings = ", ".join(f"{s['label']} ({s['games_played']} games, {s['score']:.3f})" for s in round["standings"])
+            print(f"  Round {round['round']}: {standings}; eliminated {round['eliminated']}")
+    print("------------------------")
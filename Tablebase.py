@@ -0,0 +1,246 @@
+from game_types import ALL_TILES, NUMBER_OF_TILES, Domino
+from EndgameSolver import TILE_INDEX, TILE_PIPS
+from math import comb
+import mmap
+import os
+import struct
+import sys
+
+# File layout: magic, max_tiles (uint8), then one int8 value per position
+MAGIC = b"DTB1"
+HEADER = struct.Struct("<4sB")
+
+# Unordered pairs of open ends (left <= right)
+END_PAIRS : list[tuple[int, int]] = [(left, right) for left in range(7) for right in range(left, 7)]
+END_PAIR_INDEX : dict[tuple[int, int], int] = {}
+for pair_index, (left, right) in enumerate(END_PAIRS):
+    END_PAIR_INDEX[(left, right)] = pair_index
+    END_PAIR_INDEX[(right, left)] = pair_index
+
+# Binomial coefficients for ranking tile sets
+BINOMIAL = [[comb(n, k) for k in range(NUMBER_OF_TILES + 1)] for n in range(NUMBER_OF_TILES + 1)]
+
+
+def section_offsets(max_tiles : int) -> list[int]:
+    """Start of the section of each total tile count (k tiles in both hands)
+
+    A section holds, for every set of k tiles (ranked in colex order), every split of
+    the set between the player to move and the opponent (a k-bit mask), and every pair of open ends.
+    """
+    offsets = [0]
+    for k in range(1, max_tiles + 2):
+        size = 0 if k == 1 else BINOMIAL[NUMBER_OF_TILES][k - 1] * (1 << (k - 1)) * len(END_PAIRS)
+        offsets.append(offsets[-1] + size)
+    return offsets
+
+
+def rank_tiles(indices : list[int]) -> int:
+    # Colex rank of a sorted list of tile indices
+    rank = 0
+    for position, index in enumerate(indices):
+        rank += BINOMIAL[index][position + 1]
+    return rank
+
+
+def mask_indices(mask : int) -> list[int]:
+    # Sorted bit indices of a mask
+    indices = []
+    while mask:
+        low_bit = mask & -mask
+        indices.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return indices
+
+
+def position_index(offsets : list[int], mover : int, other : int, left : int, right : int) -> int:
+    # Index of a position in the table
+    tiles = mask_indices(mover | other)
+    split = 0
+    for position, index in enumerate(tiles):
+        if mover >> index & 1:
+            split |= 1 << position
+    k = len(tiles)
+    return offsets[k] + ((rank_tiles(tiles) << k) + split) * len(END_PAIRS) + END_PAIR_INDEX[(left, right)]
+
+
+class Tablebase():
+    """Precomputed exact values of endgames with an empty boneyard, stored in a memory-mapped file
+
+    Every position with at most max_tiles tiles in both hands is indexed by the two hand
+    masks and the open ends, and holds the utility of the player to move (as returned by
+    EndgameSolver.solve). The file is mapped read-only, so every process that opens it
+    shares the same pages and a lookup is a single index computation.
+    """
+
+    # Tablebases already opened by this process, by path
+    opened : dict[str, "Tablebase"] = {}
+
+    def __init__(self, path : str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.max_tiles = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an endgame tablebase")
+        self.values = memoryview(self.map)[HEADER.size:].cast("b")
+        self.offsets = section_offsets(self.max_tiles)
+
+    @classmethod
+    def open(cls, path : str) -> "Tablebase":
+        # Map each file once per process
+        if path not in cls.opened:
+            cls.opened[path] = cls(path)
+        return cls.opened[path]
+
+    def __getstate__(self):
+        # Worker processes re-map the file instead of copying it
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def covers(self, tile_count : int) -> bool:
+        return tile_count <= self.max_tiles
+
+    def lookup_masks(self, mover : int, other : int, left : int, right : int) -> int:
+        """Value of a position given as hand bitmasks (bit i is ALL_TILES[i])"""
+        return self.values[position_index(self.offsets, mover, other, left, right)]
+
+    def lookup(self, player_hand : list[Domino], opponent_hand : list[Domino], tails : tuple[int, int]) -> int:
+        """Value of an endgame for the player to move
+
+        Args:
+            player_hand (list[Domino]): Hand of the player to move
+            opponent_hand (list[Domino]): Hand of the other player
+            tails (tuple[int, int]): Open ends of the board
+
+        Returns:
+            int: Same utility as EndgameSolver.solve
+        """
+        mover = 0
+        for tile in player_hand:
+            mover |= 1 << TILE_INDEX[tile]
+        other = 0
+        for tile in opponent_hand:
+            other |= 1 << TILE_INDEX[tile]
+        return self.lookup_masks(mover, other, tails[0], tails[-1])
+
+
+def generate(path : str, max_tiles : int = 4):
+    """Enumerates every endgame with at most max_tiles tiles in both hands and writes the tablebase
+
+    Sections are filled in increasing number of tiles, so a position only depends on
+    positions with one tile less (a move) or on the same tiles with the turn swapped (a pass).
+
+    Args:
+        path (str): Output file
+        max_tiles (int, optional): Largest combined number of tiles in both hands. Defaults to 4.
+    """
+    offsets = section_offsets(max_tiles)
+    values = bytearray(offsets[max_tiles + 1])
+    table = memoryview(values).cast("b")
+    pairs = len(END_PAIRS)
+
+    for k in range(1, max_tiles + 1):
+        print(f"Generating positions with {k} tiles")
+        # Positions where the player to move is blocked, filled after every other position of the section
+        blocked = []
+
+        # Iterate over every set of k tiles in colex order
+        tiles = list(range(k))
+        for set_rank in range(BINOMIAL[NUMBER_OF_TILES][k]):
+            pips = [ALL_TILES[index] for index in tiles]
+            for split in range(1 << k):
+                base = offsets[k] + ((set_rank << k) + split) * pairs
+                mover_tiles = [position for position in range(k) if split >> position & 1]
+                other_tiles = [position for position in range(k) if not split >> position & 1]
+                mover_score = sum(TILE_PIPS[tiles[position]] for position in mover_tiles)
+                other_score = sum(TILE_PIPS[tiles[position]] for position in other_tiles)
+                if mover_score < other_score:
+                    utility = other_score
+                elif other_score < mover_score:
+                    utility = -mover_score
+                else:
+                    utility = 0
+
+                if not mover_tiles or not other_tiles:
+                    # A hand is empty, the round is over
+                    for pair_index in range(pairs):
+                        table[base + pair_index] = utility
+                    continue
+
+                # Start of each child (the tile is removed and the opponent moves next)
+                children = {}
+                for position in mover_tiles:
+                    child_tiles = tiles[:position] + tiles[position + 1:]
+                    child_split = 0
+                    for child_position, index in enumerate(child_tiles):
+                        if index != tiles[position] and not split >> tiles.index(index) & 1:
+                            child_split |= 1 << child_position
+                    children[position] = offsets[k - 1] + ((rank_tiles(child_tiles) << (k - 1)) + child_split) * pairs
+
+                for pair_index, (left, right) in enumerate(END_PAIRS):
+                    best = None
+                    for position in mover_tiles:
+                        a, b = pips[position]
+                        if a == left or b == left:
+                            new_pair = END_PAIR_INDEX[(b if a == left else a, right)]
+                            value = -table[children[position] + new_pair]
+                            if best is None or value > best:
+                                best = value
+                        if right != left and (a == right or b == right):
+                            new_pair = END_PAIR_INDEX[(left, b if a == right else a)]
+                            value = -table[children[position] + new_pair]
+                            if best is None or value > best:
+                                best = value
+                    if best is None:
+                        blocked.append((base + pair_index, set_rank, split, pair_index, utility, other_tiles, pips))
+                    else:
+                        table[base + pair_index] = best
+
+            # Next set of k tiles in colex order
+            position = 0
+            while position < k - 1 and tiles[position] + 1 == tiles[position + 1]:
+                tiles[position] = position
+                position += 1
+            tiles[position] += 1
+
+        # Passes: the opponent moves next with the same tiles (or both are blocked)
+        full_split = (1 << k) - 1
+        for index, set_rank, split, pair_index, utility, other_tiles, pips in blocked:
+            left, right = END_PAIRS[pair_index]
+            if any(left in pips[position] or right in pips[position] for position in other_tiles):
+                swapped = offsets[k] + ((set_rank << k) + (split ^ full_split)) * pairs + pair_index
+                table[index] = -table[swapped]
+            else:
+                table[index] = utility
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, max_tiles))
+        f.write(values)
+    print(f"Wrote {len(values)} positions to {path}")
+
+
+# Testing Section
+if __name__ == "__main__":
+    # Usage: python Tablebase.py [max_tiles] [path]
+    max_tiles = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    path = sys.argv[2] if len(sys.argv) > 2 else f"endgame_{max_tiles}.dtb"
+    if not os.path.exists(path):
+        generate(path, max_tiles)
+
+    print("------------------------")
+    print("Testing Tablebase Class")
+    from EndgameSolver import EndgameSolver
+    import random
+    tablebase = Tablebase.open(path)
+    solver = EndgameSolver(max_tiles)
+    mismatches = 0
+    for _ in range(10000):
+        tiles = random.sample(ALL_TILES, max_tiles)
+        split = random.randint(0, max_tiles)
+        tails = (random.randint(0, 6), random.randint(0, 6))
+        if tablebase.lookup(tiles[:split], tiles[split:], tails) != solver.solve(tiles[:split], tiles[split:], tails):
+            mismatches += 1
+    print(f"Mismatches against EndgameSolver: {mismatches}")
+    print("------------------------")
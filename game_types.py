@@ -1,10 +1,91 @@
-from typing import Literal
+from typing import Literal, NamedTuple
 
 # Domino alias
 Domino = tuple[int, int]
 Tail = Literal[-1, 0]
 Move = tuple[Domino, Tail]
 
-# CONSTANTS 
-NUMBER_OF_TILES = 28
-ALL_TILES = [(0, 0), (0, 1), (0, 2), (0, 3), (0, 4), (0, 5), (0, 6), (1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6), (2, 2), (2, 3), (2, 4), (2, 5), (2, 6), (3, 3), (3, 4), (3, 5), (3, 6), (4, 4), (4, 5), (4, 6), (5, 5), (5, 6), (6, 6)]
\ No newline at end of file
+# DOMINO SETS
+class DominoSet():
+    """A double-N domino set: every tile (a, b) with 0 <= a <= b <= max_pip
+
+    Double-6 has 28 tiles, double-9 has 55 and double-12 has 91. Sets are shared
+    (see domino_set), so their lists must not be modified.
+    """
+
+    def __init__(self, max_pip : int = 6):
+        self.max_pip = max_pip
+        self.name = f"double-{max_pip}"
+        # Tiles in canonical orientation (low pip first), ordered by low pip then high pip
+        self.tiles : list[Domino] = [(a, b) for a in range(max_pip + 1) for b in range(a, max_pip + 1)]
+        self.number_of_tiles = len(self.tiles)
+        # Position of every tile in tiles, in both orientations (e.g. the bit of a tile in a hand bitmask)
+        self.index : dict[Domino, int] = {}
+        for i, tile in enumerate(self.tiles):
+            self.index[tile] = i
+            self.index[(tile[-1], tile[0])] = i
+        # Order in which tiles start a round: doubles first, then by pip sum
+        self.priority_order : list[Domino] = sorted(self.tiles, key = lambda tile: (tile[0] + tile[-1]) + (100 if tile[0] == tile[-1] else 1), reverse=True)
+
+    def __repr__(self) -> str:
+        return f"DominoSet({self.max_pip})"
+
+    def __deepcopy__(self, memo):
+        # Sets are shared: copies of a boneyard or a player keep the same set
+        return self
+
+    def __reduce__(self):
+        # Pickled by size, so that another process gets its own shared set (e.g. DOUBLE_SIX stays DOUBLE_SIX)
+        return (domino_set, (self.max_pip,))
+
+DOMINO_SETS : dict[int, DominoSet] = {}
+
+def domino_set(max_pip : int) -> DominoSet:
+    # Shared set of the given size
+    if max_pip not in DOMINO_SETS:
+        DOMINO_SETS[max_pip] = DominoSet(max_pip)
+    return DOMINO_SETS[max_pip]
+
+DOUBLE_SIX = domino_set(6)
+DOUBLE_NINE = domino_set(9)
+DOUBLE_TWELVE = domino_set(12)
+HAND_SIZE = 7
+
+# CONSTANTS (double-6 set)
+NUMBER_OF_TILES = DOUBLE_SIX.number_of_tiles
+ALL_TILES = DOUBLE_SIX.tiles
+
+# MATCH EVENTS
+# Published by the Match to its observers (both players, plus any subscriber) as the round unfolds
+class RoundStarted(NamedTuple):
+    # Hands have been dealt (each player only sees their own hand) from a double-max_pip set
+    players : tuple[str, str]
+    hand_size : int
+    boneyard_size : int
+    max_pip : int = 6
+
+class TilePlaced(NamedTuple):
+    # A player placed a tile on an end of the board (the starting tile is the first one)
+    player : str
+    tile : Domino
+    tail : Tail
+
+class Drew(NamedTuple):
+    # A player drew a tile because no tile in their hand matched the tails
+    # The tile is only revealed to the player who drew it (None for everyone else)
+    player : str
+    tile : Domino | None
+    tails : tuple[int, int]
+    boneyard_size : int
+
+class Passed(NamedTuple):
+    # A player passed: no matching tile and an empty boneyard
+    player : str
+    tails : tuple[int, int]
+
+class RoundEnded(NamedTuple):
+    # Winner of the round (None for a tie) and points won
+    winner : str | None
+    points : int
+
+MatchEvent = RoundStarted | TilePlaced | Drew | Passed | RoundEnded
@@ -1,9 +1,10 @@
 from Player import Player
-from MonteCarloPlayer import MonteCarloPlayer
-from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer
-from HumanPlayer import HumanPlayer
-from Match import Match
-import numpy as np
+from SPRT import SPRT
+from Profiler import Profiler
+from GameRecord import GameRecordWriter
+from Evaluation import Evaluation
+from SweepScheduler import SweepScheduler
+from game_types import domino_set
 import json
 from functools import partial
 
@@ -12,166 +13,230 @@ games_default = 100 # Default number of games for standard evaluations against R
 games_exploration = 30 # Number of games for hyperparameter exploration evaluations
 games_comparison = 50 # Number of games for comparison evaluations between two intelligent agents
 
+# Sequential testing: stop an evaluation as soon as the winner (or a draw between the agents) is statistically decided
+# The number of games above then becomes the maximum number of games
+use_sprt = False
+sprt_delta = 0.15 # Smallest difference from a 50% game win rate worth detecting
+sprt_alpha = 0.05 # Probability of declaring a stronger agent when they are equal
+sprt_beta = 0.05 # Probability of missing a difference of sprt_delta
+
+# Successive halving for the exploratory evaluations: configurations play in rounds and only the
+# best 1/sweep_eta survive each round, within the budget of games_exploration games per configuration
+use_sweep = True
+sweep_eta = 2
+sweep_metric = "win_ratio" # or "win_ratio_per_second" to also penalize slow configurations
+
+# Profiling of the agents and the match engine: None, "sampling" (collapsed stacks for flamegraphs)
+# or "deterministic" (cProfile .pstats files), written to profiles/ with a summary of the top functions
+profile_mode = None
+profile_interval = 0.001 # Seconds of CPU time between samples in sampling mode
+
+# Print every round and game result during the evaluations
+verbose = True
+
+# Binary log of every round played in the evaluations and sweeps (see GameRecord.py), None to disable. Rounds played
+# by distributed workers (distributed_address) are not logged
+game_log = None # e.g. "games.dgr"
+
+# Persistent position value cache shared by the agents across runs (see PositionCache.py), None to disable
+position_cache = None # e.g. "position_cache.sqlite"
+
+# Agents search ahead during the human player's turn (see Ponderer.py)
+ponder_vs_human = True
+
+# Distributed evaluations: the games are played by workers on any number of hosts (see DistributedEvaluation.py), started with
+# python DistributedEvaluation.py worker COORDINATOR_HOST 6100 (same code and DOMINOES_AUTHKEY on every host). None plays them here
+# Other hosts need this host's address on a private network and a secret DOMINOES_AUTHKEY (the messages are pickles)
+distributed_address = None # e.g. ("127.0.0.1", 6100) for workers on this host, ("192.168.1.10", 6100) for a private network
+distributed_batch_games = 5 # Games per batch handed to a worker
+distributed_lease_timeout = 600.0 # Seconds without news from a worker before its batch is handed to another one
+distributed_idle_timeout = 300.0 # Seconds without any worker connected before the games are played here (None to wait forever)
+
+# Domino set (6 for double-6, 9 for double-9, 12 for double-12) and number of tiles dealt to each player
+max_pip = 6
+hand_size = 7
+
 def save_dict_to_file(data_dict, filename):
     with open("stats/" + filename, 'w') as f:
         json.dump(data_dict, f, indent=4)
 
 
-def full_game_evaluation(p1_class : type['Player'], p2_class : type['Player'], games : int, score_to_win: int = 200):
-    p1_match = 0
-    p2_match = 0
-    p1_game = 0
-    p2_game = 0
-    matches = 0
-    full_match_move_times_p1 = []
-    full_match_move_times_p2 = []
-
-    for j in range(games):
-        p1 = p1_class()
-        p2 = p2_class()
-        m = Match(p1, p2, False)
-        i = 1
-        print(f"\nGame #{j+1}")
-        while p1.score < score_to_win and p2.score < score_to_win:
-            matches += 1
-            print(f"\nMatch #{i}")
-
-            result, p1_times, p2_times  = m.play()
-            full_match_move_times_p1 += p1_times
-            full_match_move_times_p2 += p2_times
-
-            print(f"Result: {result}")
-            m.boneyard.print_boneyard_tiles()
-            print(f"{p1.name}: {m.player_1.hand}, Score: {m.player_1.score}")
-            print(f"{p2.name}: {m.player_2.hand}, Score: {m.player_2.score}")
-            if result == p1.name:
-                p1_match += 1
-            if result == p2.name:
-                p2_match += 1
-            i += 1
-
-        print()
-        if p1.score >= score_to_win:
-            print(f"{p1.name} is the winner")
-            p1_game += 1
-        else:
-            print(f"{p2.name} is the winner")
-            p2_game += 1
-        
-    print("\n Match Stats")
-    print(f"{p1.name} Match Winning Ratio: {p1_match / matches} after playing {matches} matches")
-    print(f"{p2.name} Match Winning Ratio: {p2_match / matches} after playing {matches} matches")
-
-    print("\n Game Stats")
-    print(f"{p1.name} Game Winning Ratio: {p1_game / games} after playing {games} games")
-    print(f"{p2.name} Game Winning Ratio: {p2_game / games} after playing {games} games")
-
-    print("\n Move Time Stats")
-    print(f"{p1.name} Move Time: Mean = {np.mean(full_match_move_times_p1)}s, Std = {np.std(full_match_move_times_p1)}s, Max = {np.max(full_match_move_times_p1)}s, Min = {np.min(full_match_move_times_p1)}s")
-    print(f"{p2.name} Move Time: Mean = {np.mean(full_match_move_times_p2)}s, Std = {np.std(full_match_move_times_p2)}s, Max = {np.max(full_match_move_times_p2)}s, Min = {np.min(full_match_move_times_p2)}s")
-
-    stats = {
-        "p1_match_win_ratio": p1_match / matches,
-        "p2_match_win_ratio": p2_match / matches,
-        "p1_game_win_ratio": p1_game / games,
-        "p2_game_win_ratio": p2_game / games,
-        "p1_move_time_mean": np.mean(full_match_move_times_p1),
-        "p1_move_time_std": np.std(full_match_move_times_p1),
-        "p1_move_time_max": np.max(full_match_move_times_p1),
-        "p1_move_time_min": np.min(full_match_move_times_p1),
-        "p2_move_time_mean": np.mean(full_match_move_times_p2),
-        "p2_move_time_std": np.std(full_match_move_times_p2),
-        "p2_move_time_max": np.max(full_match_move_times_p2),
-        "p2_move_time_min": np.min(full_match_move_times_p2),
-        "matches_played": matches,
-        "games_played": games
-    }
-
-    return stats
+def new_sprt() -> SPRT | None:
+    # Sequential test for an evaluation, if enabled
+    if use_sprt:
+        return SPRT(sprt_delta, sprt_alpha, sprt_beta)
+    return None
+
+
+def distributed_play(evaluation : Evaluation, games : int) -> int:
+    # Play more games of an evaluation with the distributed workers. The batches are seeded from the games already
+    # played (at least one per batch), so that the games of a later call are new games
+    from DistributedEvaluation import DistributedEvaluation
+    coordinator = DistributedEvaluation(evaluation, distributed_address, batch_games=distributed_batch_games, lease_timeout=distributed_lease_timeout, seed=evaluation.games,
+                                        idle_timeout=distributed_idle_timeout)
+    return coordinator.play(games)
+
+
+def full_game_evaluation(p1_class : type['Player'], p2_class : type['Player'], games : int, score_to_win: int = 200, sprt: SPRT | None = None, profile: str | None = None):
+    """Play games to score_to_win points between two agents and collect statistics
+
+    With a sequential test (sprt), games is the maximum number of games: the evaluation stops
+    as soon as the test is decided. With profiling enabled (profile_mode), the profile is written
+    to profiles/ under the name profile. With distributed_address set, the games are played by the
+    distributed workers (without profiling or game log, which only cover games played here).
+    """
+    profiler = Profiler(profile_mode, profile_interval) if profile_mode and profile and not distributed_address else None
+    recorder = GameRecordWriter(game_log) if game_log and not distributed_address else None
+    evaluation = Evaluation(p1_class, p2_class, score_to_win, sprt, profiler, recorder, verbose, domino_set(max_pip), hand_size)
+    if distributed_address:
+        distributed_play(evaluation, games)
+    else:
+        evaluation.play(games)
+    if recorder:
+        recorder.close()
+    evaluation.print_stats()
+    if profiler:
+        profiler.print_summary()
+        paths = profiler.write("profiles/" + profile)
+        print(f"\nProfile written to {', '.join(paths)}")
+    return evaluation.stats()
+
 
+def sweep_evaluation(configs : dict[str, type['Player']], opponent : type['Player'], games : int, prefix : str, summary_filename : str, profile : str | None = None):
+    """Successive halving sweep over configurations against the same opponent (see SweepScheduler.py)
+
+    Saves the statistics of the configurations that reach the final round as prefix_label.json
+    and the elimination rounds as summary_filename. With profiling enabled (profile_mode), the
+    profile of every configuration is written to profiles/ under the name profile_label. The rounds
+    of every configuration are appended to game_log. With distributed_address set, the games of every
+    round are played by the distributed workers (without profiling or game log).
+    """
+    play = distributed_play if distributed_address else None
+    profilers = {label: Profiler(profile_mode, profile_interval) for label in configs} if profile_mode and profile and not distributed_address else {}
+    recorder = GameRecordWriter(game_log) if game_log and not distributed_address else None
+    scheduler = SweepScheduler(configs, opponent, games * len(configs), sweep_eta, sweep_metric, verbose=verbose, domino_set=domino_set(max_pip), hand_size=hand_size, play=play,
+                               profilers=profilers, recorder=recorder)
+    try:
+        results = scheduler.run()
+    finally:
+        if recorder:
+            recorder.close()
+    for label, stats in results.items():
+        save_dict_to_file(stats, f"{prefix}_{label}.json")
+    summary = scheduler.summary()
+    save_dict_to_file(summary, summary_filename)
+    print(f"\nSweep winner: {summary['winner']} after {summary['games_played']} games")
+    for label, profiler in profilers.items():
+        print(f"\nProfile of {label}")
+        profiler.print_summary()
+        paths = profiler.write(f"profiles/{profile}_{label}")
+        print(f"\nProfile written to {', '.join(paths)}")
 
 
 if __name__ == "__main__":
     print("Main Program for Dominos Game")
     options = input("Options: \n1. Run Full Game Evaluations\n2. Run Default Evaluations\n3. Run Exploratory Evaluations\n4. Run Comparison Evaluations\n5. Human Player (one game of 50 points) \nSelect Option #: ")
 
+    # The agents are imported once an option is chosen, so that the menu shows at once
+    if options in ["1", "2", "3", "4"]:
+        from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer
+        from MonteCarloPlayer import MonteCarloPlayer
+
     if options == "1" or options == "2":
         # ExpectiMinimax Agent Evaluation (Against Random Player)
-        p1 = ExpectiMinimaxPlayer
+        p1 = partial(ExpectiMinimaxPlayer, cache=position_cache)
         p2 = Player
 
         print("\nEvaluating ExpectiMinimax Player vs Random Player")
-        results = full_game_evaluation(p1, p2, games_default)
+        results = full_game_evaluation(p1, p2, games_default, sprt=new_sprt(), profile="expectiminimax_vs_random_default")
         save_dict_to_file(results, "expectiminimax_vs_random_stats_default.json")
 
         # Monte Carlo Agent Evaluation (Against Random Player)
-        p1 = MonteCarloPlayer
+        p1 = partial(MonteCarloPlayer, cache=position_cache)
         p2 = Player
 
         print("\nEvaluating Monte Carlo Player vs Random Player")
-        results = full_game_evaluation(p1, p2, games_default)
+        results = full_game_evaluation(p1, p2, games_default, sprt=new_sprt(), profile="montecarlo_vs_random_default")
         save_dict_to_file(results, "montecarlo_vs_random_stats_default.json")
 
     if options == "1" or options == "3":
         # ExpectiMinimax - Hyperparameter Exploration
         depths = [4, 5, 6, 7]
-        for depth in depths:
-            p1 = partial(ExpectiMinimaxPlayer, depth=depth)
-            p2 = Player
-
-            print(f"\nEvaluating ExpectiMinimax Player (Depth={depth}) vs Random Player")
-            results = full_game_evaluation(p1, p2, games_exploration)
-            save_dict_to_file(results, f"expectiminimax_vs_random_stats_depth_{depth}.json")
-        
         # Monte Carlo - Hyperparameter Exploration (Iterations)
         iterations_list = [1000, 2000, 3000, 4000]
-        for iterations in iterations_list:
-            p1 = partial(MonteCarloPlayer, n=iterations)
-            p2 = Player
-
-            print(f"\nEvaluating Monte Carlo Player (Iterations={iterations}) vs Random Player")
-            results = full_game_evaluation(p1, p2, games_exploration)
-            save_dict_to_file(results, f"montecarlo_vs_random_stats_iterations_{iterations}.json")
-        
         # Monte Carlo - Hyperparameter Exploration (Exploration Constant)
         exploration_constants = [0.5, 0.7, 0.9]
-        for c in exploration_constants:
-            p1 = partial(MonteCarloPlayer, c=c)
-            p2 = Player
 
-            print(f"\nEvaluating Monte Carlo Player (Exploration Constant={c}) vs Random Player")
-            results = full_game_evaluation(p1, p2, games_exploration)
-            save_dict_to_file(results, f"montecarlo_vs_random_stats_exploration_{c}.json")
+        if use_sweep:
+            print("\nSweeping ExpectiMinimax Player depths vs Random Player")
+            configs = {f"depth_{depth}": partial(ExpectiMinimaxPlayer, depth=depth, cache=position_cache) for depth in depths}
+            sweep_evaluation(configs, Player, games_exploration, "expectiminimax_vs_random_stats", "expectiminimax_vs_random_sweep_depth.json",
+                             profile="expectiminimax_vs_random_sweep")
+
+            print("\nSweeping Monte Carlo Player iterations vs Random Player")
+            configs = {f"iterations_{iterations}": partial(MonteCarloPlayer, n=iterations, cache=position_cache) for iterations in iterations_list}
+            sweep_evaluation(configs, Player, games_exploration, "montecarlo_vs_random_stats", "montecarlo_vs_random_sweep_iterations.json",
+                             profile="montecarlo_vs_random_sweep")
+
+            print("\nSweeping Monte Carlo Player exploration constants vs Random Player")
+            configs = {f"exploration_{c}": partial(MonteCarloPlayer, c=c, cache=position_cache) for c in exploration_constants}
+            sweep_evaluation(configs, Player, games_exploration, "montecarlo_vs_random_stats", "montecarlo_vs_random_sweep_exploration.json",
+                             profile="montecarlo_vs_random_sweep")
+        else:
+            for depth in depths:
+                p1 = partial(ExpectiMinimaxPlayer, depth=depth, cache=position_cache)
+                p2 = Player
+
+                print(f"\nEvaluating ExpectiMinimax Player (Depth={depth}) vs Random Player")
+                results = full_game_evaluation(p1, p2, games_exploration, sprt=new_sprt(), profile=f"expectiminimax_vs_random_depth_{depth}")
+                save_dict_to_file(results, f"expectiminimax_vs_random_stats_depth_{depth}.json")
+
+            for iterations in iterations_list:
+                p1 = partial(MonteCarloPlayer, n=iterations, cache=position_cache)
+                p2 = Player
+
+                print(f"\nEvaluating Monte Carlo Player (Iterations={iterations}) vs Random Player")
+                results = full_game_evaluation(p1, p2, games_exploration, sprt=new_sprt(), profile=f"montecarlo_vs_random_iterations_{iterations}")
+                save_dict_to_file(results, f"montecarlo_vs_random_stats_iterations_{iterations}.json")
+
+            for c in exploration_constants:
+                p1 = partial(MonteCarloPlayer, c=c, cache=position_cache)
+                p2 = Player
+
+                print(f"\nEvaluating Monte Carlo Player (Exploration Constant={c}) vs Random Player")
+                results = full_game_evaluation(p1, p2, games_exploration, sprt=new_sprt(), profile=f"montecarlo_vs_random_exploration_{c}")
+                save_dict_to_file(results, f"montecarlo_vs_random_stats_exploration_{c}.json")
 
     if options == "1" or options == "4":
         # Comparison between ExpectiMinimax and Monte Carlo
-        p1 = partial(ExpectiMinimaxPlayer, depth=5)
-        p2 = partial(MonteCarloPlayer, n=1000)
+        p1 = partial(ExpectiMinimaxPlayer, depth=5, cache=position_cache)
+        p2 = partial(MonteCarloPlayer, n=1000, cache=position_cache)
 
         print("\nEvaluating ExpectiMinimax Player (Depth = 5) vs Monte Carlo Player (Iterations = 1000)")
-        results = full_game_evaluation(p1, p2, games_comparison)
+        results = full_game_evaluation(p1, p2, games_comparison, sprt=new_sprt(), profile="expectiminimax(d5)_vs_montecarlo(n1000)")
         save_dict_to_file(results, "expectiminimax(d5)_vs_montecarlo(n1000)_stats.json")
 
         # Comparison between ExpectiMinimax and Monte Carlo
-        p1 = partial(ExpectiMinimaxPlayer, depth=5)
-        p2 = partial(MonteCarloPlayer, n=2000)
+        p1 = partial(ExpectiMinimaxPlayer, depth=5, cache=position_cache)
+        p2 = partial(MonteCarloPlayer, n=2000, cache=position_cache)
 
         print("\nEvaluating ExpectiMinimax Player (Depth = 5) vs Monte Carlo Player (Iterations = 2000)")
-        results = full_game_evaluation(p1, p2, games_comparison)
+        results = full_game_evaluation(p1, p2, games_comparison, sprt=new_sprt(), profile="expectiminimax(d5)_vs_montecarlo(n2000)")
         save_dict_to_file(results, "expectiminimax(d5)_vs_montecarlo(n2000)_stats.json")
 
         # Comparison between ExpectiMinimax and Monte Carlo
-        p1 = partial(ExpectiMinimaxPlayer, depth=6)
-        p2 = partial(MonteCarloPlayer, n=4000)
+        p1 = partial(ExpectiMinimaxPlayer, depth=6, cache=position_cache)
+        p2 = partial(MonteCarloPlayer, n=4000, cache=position_cache)
 
         print("\nEvaluating ExpectiMinimax Player (Depth = 6) vs Monte Carlo Player (Iterations = 4000)")
-        results = full_game_evaluation(p1, p2, games_comparison)
+        results = full_game_evaluation(p1, p2, games_comparison, sprt=new_sprt(), profile="expectiminimax(d6)_vs_montecarlo(n4000)")
         save_dict_to_file(results, "expectiminimax(d6)_vs_montecarlo(n4000)_stats.json")
 
     if options == "5":
         opponent_type = input("Select Opponent Type: \n1. Random Player\n2. ExpectiMinimax Player\n3. Monte Carlo Player\nSelect Option #: ")
         
         # Human Player vs Agent
+        from HumanPlayer import HumanPlayer
         p1 = HumanPlayer
         if opponent_type == "1":
             p2 = Player
@@ -179,12 +244,14 @@ if __name__ == "__main__":
             results = full_game_evaluation(p1, p2, 1, score_to_win=50)
             save_dict_to_file(results, "human_vs_random_stats.json")
         elif opponent_type == "2":
-            p2 = partial(ExpectiMinimaxPlayer, depth=5)
+            from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer
+            p2 = partial(ExpectiMinimaxPlayer, depth=5, cache=position_cache, ponder=ponder_vs_human)
             print("\nHuman Player vs ExpectiMinimax Player (Depth = 5)")
             results = full_game_evaluation(p1, p2, 1, score_to_win=50)
             save_dict_to_file(results, "human_vs_expectiminimax_stats.json")
         elif opponent_type == "3":
-            p2 = partial(MonteCarloPlayer, n=1000)
+            from MonteCarloPlayer import MonteCarloPlayer
+            p2 = partial(MonteCarloPlayer, n=1000, cache=position_cache, ponder=ponder_vs_human)
             print("\nHuman Player vs Monte Carlo Player (Iterations = 1000)")
             results = full_game_evaluation(p1, p2, 1, score_to_win=50)
             save_dict_to_file(results, "human_vs_montecarlo_stats.json")
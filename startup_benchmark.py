@@ -0,0 +1,94 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Startup cost of each entry point, measured in a fresh interpreter (like a spawned worker process or a short
+# analysis call): time to import it, time of its first move and whether NumPy was loaded along the way
+
+# Entry point: (imports, first move). The first move runs in the position dealt by SETUP
+ENTRY_POINTS = {
+    "main.py": ("import main", "from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer\nagent(ExpectiMinimaxPlayer()).move(board, boneyard_size)"),
+    "Match": ("from Match import Match\nfrom Player import Player", "Player().move(board, boneyard_size)"),
+    "ExpectiMinimaxPlayer": ("from ExpectiMinimaxPlayer import ExpectiMinimaxPlayer", "agent(ExpectiMinimaxPlayer()).move(board, boneyard_size)"),
+    "MonteCarloPlayer": ("from MonteCarloPlayer import MonteCarloPlayer", "agent(MonteCarloPlayer()).move(board, boneyard_size)"),
+    "GameServer worker": ("import GameServer", "GameServer.search_position('expectiminimax', {}, hand, line, boneyard_size, [])"),
+    "OpeningBook worker": ("import OpeningBook", "OpeningBook.search_position((hand, line, boneyard_size, 6))"),
+}
+
+SETUP = """
+import random
+from Boneyard import Boneyard
+from Board import Board
+# First deal (in seed order) where the agent has a choice of moves, so that it searches
+seed = 0
+while True:
+    random.seed(seed)
+    boneyard = Boneyard()
+    hand = boneyard.generate_random_hand()
+    opponent_hand = boneyard.generate_random_hand()
+    board = Board()
+    board.add_to_board((opponent_hand.pop(), 0))
+    if sum(board.get_tails(0) in tile for tile in hand) >= 2:
+        break
+    seed += 1
+line = board.get_board_tiles()
+boneyard_size = len(boneyard.boneyard)
+
+def agent(player):
+    player.set_hand(list(hand))
+    return player
+"""
+
+TEMPLATE = """
+import sys, time, json
+start = time.perf_counter()
+{imports}
+imported = time.perf_counter()
+numpy_at_import = "numpy" in sys.modules
+{setup}
+set_up = time.perf_counter()
+{move}
+moved = time.perf_counter()
+print(json.dumps([imported - start, moved - set_up, numpy_at_import, "numpy" in sys.modules]))
+"""
+
+
+def measure(imports : str, move : str, runs : int = 5) -> dict:
+    """Import and first move time of an entry point, each run in a new interpreter
+
+    Args:
+        imports (str): Code importing the entry point
+        move (str): Code playing the first move
+        runs (int, optional): Number of interpreters started (the median is reported). Defaults to 5.
+
+    Returns:
+        dict: Median seconds of the whole process (interpreter start included), import and first move, and whether NumPy was imported by the import / by the first move
+    """
+    code = TEMPLATE.format(imports=imports, setup=SETUP, move=move)
+    results = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]) + [time.perf_counter() - start])
+    return {
+        "process_seconds": statistics.median(result[4] for result in results),
+        "import_seconds": statistics.median(result[0] for result in results),
+        "first_move_seconds": statistics.median(result[1] for result in results),
+        "numpy_at_import": results[0][2],
+        "numpy_after_move": results[0][3],
+    }
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print("------------------------")
+    print(f"Startup benchmark (median of {runs} fresh interpreters)")
+    print(f"{'Entry point':<22}{'process':>10}{'import':>10}{'first move':>12}  numpy")
+    for name, (imports, move) in {"(empty interpreter)": ("pass", "None"), **ENTRY_POINTS}.items():
+        result = measure(imports, move, runs)
+        numpy = "at import" if result["numpy_at_import"] else "first move" if result["numpy_after_move"] else "no"
+        print(f"{name:<22}{result['process_seconds'] * 1000:>8.1f}ms{result['import_seconds'] * 1000:>8.1f}ms{result['first_move_seconds'] * 1000:>10.1f}ms  {numpy}")
+    print("------------------------")